@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Reports recall@k and latency of nearest neighbour search with `IVFIndex` (with and without product quantization)
+against exact brute-force search, over embeddings (e.g., a memory map directory of GloVe vectors) or random
+clustered vectors. Queries are embeddings of random words."""
+
+import argparse
+import time
+
+import numpy as np
+
+from jack.io.embeddings import load_embeddings
+from jack.util.ann import METRICS, IVFIndex, normalize, search, similarities, top_k
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark approximate nearest neighbour search')
+    parser.add_argument("--embeddings", help="embeddings to index, random vectors if not given")
+    parser.add_argument("--embeddings_format", default="memory_map_dir",
+                        choices=["glove", "word2vec", "fasttext", "memory_map_dir"])
+    parser.add_argument("--nb_vectors", type=int, default=500000, help="number of random vectors")
+    parser.add_argument("--dim", type=int, default=300, help="dimension of random vectors")
+    parser.add_argument("--metric", default="cosine", choices=METRICS)
+    parser.add_argument("--nb_partitions", type=int, default=1024)
+    parser.add_argument("--nb_subspaces", type=int, default=50)
+    parser.add_argument("--nprobe", type=int, nargs='+', default=[4, 16, 64])
+    parser.add_argument("--rerank", type=int, default=10)
+    parser.add_argument("--nb_queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(1337)
+    if args.embeddings:
+        vectors = load_embeddings(args.embeddings, args.embeddings_format).lookup
+    else:
+        centers = rng.randn(args.nb_vectors // 100, args.dim).astype(np.float32)
+        vectors = centers[rng.randint(0, len(centers), args.nb_vectors)]
+        vectors += 0.5 * rng.randn(*vectors.shape).astype(np.float32)
+    queries = np.asarray(vectors[np.sort(rng.choice(len(vectors), args.nb_queries, replace=False))], dtype=np.float32)
+    print("{} vectors of dimension {}, {} queries, {} metric, k={}".format(
+        vectors.shape[0], vectors.shape[1], len(queries), args.metric, args.k))
+
+    # brute-force search of one query at a time, with all vectors (normalized for cosine similarities) in memory
+    dense = normalize(np.asarray(vectors, dtype=np.float32)) if args.metric == 'cosine' else np.asarray(vectors)
+    dense_metric = 'dot' if args.metric == 'cosine' else args.metric
+    t0 = time.time()
+    expected = np.concatenate([top_k(similarities(q[None], dense, dense_metric), args.k)[0] for q in queries])
+    exact_latency = (time.time() - t0) / len(queries)
+    del dense
+    t0 = time.time()
+    assert search(queries[:20], vectors, args.k, args.metric)[0].tolist() == expected[:20].tolist()
+    blocked_latency = (time.time() - t0) / 20
+    print("{:32s} {:8.2f} ms/query (blocked over the vectors: {:.2f} ms/query)".format(
+        "exact", exact_latency * 1000, blocked_latency * 1000))
+
+    for nb_subspaces in [0, args.nb_subspaces]:
+        t0 = time.time()
+        index = IVFIndex.build(vectors, args.nb_partitions, args.metric, nb_subspaces)
+        name = "IVF-PQ{}".format(nb_subspaces) if nb_subspaces else "IVF"
+        size = index.ids.nbytes + index.centroids.nbytes
+        if index.quantizer is not None:
+            size += index.codes.nbytes + index.quantizer.codebooks.nbytes
+        print("{} index of {} partitions built in {:.1f} s, {:.1f} MB (vectors: {:.1f} MB)".format(
+            name, args.nb_partitions, time.time() - t0, size / 2 ** 20, vectors.shape[0] * vectors.shape[1] / 2 ** 18))
+        for rerank in ([0, args.rerank] if nb_subspaces else [0]):
+            for nprobe in args.nprobe:
+                t0 = time.time()
+                ids = index.search(queries, args.k, nprobe=nprobe, rerank=rerank)[0]
+                latency = (time.time() - t0) / len(queries)
+                recall = np.mean([len(set(i) & set(e)) / args.k for i, e in zip(ids.tolist(), expected.tolist())])
+                setting = "{} nprobe={}{}".format(name, nprobe, " rerank={}".format(rerank) if rerank else "")
+                print("{:32s} {:8.2f} ms/query ({:.0f}x), recall@{} {:.3f}".format(
+                    setting, latency * 1000, exact_latency / latency, args.k, recall))
+
+
+if __name__ == "__main__":
+    main()
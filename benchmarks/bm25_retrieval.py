@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Reports queries per second and recall@k of BM25 retrieval on a QA dataset (e.g., SQuAD dev), whose distinct
+supports are indexed and whose questions are searched. A question is counted as recalled if its own support is among
+the retrieved paragraphs."""
+
+import argparse
+import math
+import tempfile
+import time
+from collections import Counter
+
+import numpy as np
+
+from jack.io.load import loaders
+from jack.util.bm25 import BM25Index, build_bm25_index, corpus_paragraphs, tokenize
+
+
+def brute_force_bm25(query, paragraphs, k1=1.2, b=0.75):
+    """Reference implementation: BM25 scores of all paragraphs computed from their tokens."""
+    tokenized = [Counter(tokenize(p)) for p in paragraphs]
+    lengths = [sum(c.values()) for c in tokenized]
+    avg_length = sum(lengths) / len(lengths)
+    df = Counter(t for c in tokenized for t in c)
+    scores = np.zeros([len(paragraphs)])
+    for term, count in Counter(tokenize(query)).items():
+        if term not in df:
+            continue
+        idf = math.log(1.0 + (len(paragraphs) - df[term] + 0.5) / (df[term] + 0.5))
+        for i, c in enumerate(tokenized):
+            if term in c:
+                norm = k1 * (1.0 - b + b * lengths[i] / avg_length)
+                scores[i] += count * idf * c[term] * (k1 + 1.0) / (c[term] + norm)
+    return scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark BM25 retrieval')
+    parser.add_argument("dataset", help="dataset whose supports are indexed and whose questions are searched")
+    parser.add_argument("--loader", default="jack", choices=sorted(loaders))
+    parser.add_argument("--batch_size", type=int, default=1000)
+    parser.add_argument("-k", type=int, nargs='+', default=[1, 5, 10, 20, 50])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    dataset = loaders[args.loader](args.dataset)
+    paragraphs = corpus_paragraphs(dataset)
+    paragraph_ids = {p: i for i, p in enumerate(paragraphs)}
+    questions = [q.question for q, _ in dataset]
+    gold = [set(paragraph_ids[s] for s in q.support) for q, _ in dataset]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index_dir = tmp_dir + '/index'
+        t0 = time.time()
+        build_bm25_index(index_dir, paragraphs)
+        build_time = time.time() - t0
+        index = BM25Index(index_dir)
+
+        for question, hits in zip(questions[:10], index.search(questions[:10], 10)):
+            expected = brute_force_bm25(question, paragraphs)
+            assert np.allclose([s for _, s in hits], np.sort(expected)[::-1][:len(hits)], rtol=1e-4)
+            assert np.allclose(expected[[i for i, _ in hits]], [s for _, s in hits], rtol=1e-4)
+
+        def run():
+            results = []
+            for start in range(0, len(questions), args.batch_size):
+                results.extend(index.search(questions[start:start + args.batch_size], max(args.k)))
+            return results
+
+        times = []
+        for _ in range(args.repeats):
+            t0 = time.time()
+            results = run()
+            times.append(time.time() - t0)
+
+    print("{} paragraphs, {} questions, index built in {:.2f} s".format(len(paragraphs), len(questions), build_time))
+    print("{:.1f} queries/s (batches of {})".format(len(questions) / min(times), args.batch_size))
+    for k in args.k:
+        recall = np.mean([bool(g & set(i for i, _ in hits[:k])) for g, hits in zip(gold, results)])
+        print("recall@{}: {:.3f}".format(k, recall))
+
+
+if __name__ == "__main__":
+    main()
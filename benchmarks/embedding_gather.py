@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Compares per-token embedding lookup with the batched gather used in input modules on SQuAD-shaped batches."""
+
+import argparse
+import timeit
+
+import numpy as np
+
+from jack.util.map import gather_embeddings
+
+
+def per_token_embeddings(ids, lookup, max_length):
+    """Reference implementation: the per-token `_get_emb` loop previously used by `XQAInputModule`."""
+    default_vec = np.zeros([lookup.shape[1]])
+    embedded = np.zeros([len(ids), max_length, lookup.shape[1]])
+    for i, seq in enumerate(ids):
+        for j, idx in enumerate(seq):
+            embedded[i, j] = lookup[idx] if idx < lookup.shape[0] else default_vec
+    return embedded
+
+
+def squad_shaped_batch(rng, batch_size, vocab_size, oov_rate=0.02):
+    """Samples question and support id lists with SQuAD-like length statistics."""
+    question_lengths = np.clip(rng.normal(11, 3.5, batch_size), 3, 40).astype(int)
+    support_lengths = np.clip(rng.lognormal(4.85, 0.45, batch_size), 20, 700).astype(int)
+
+    def ids(length):
+        seq = rng.randint(0, vocab_size, length)
+        seq[rng.rand(length) < oov_rate] = vocab_size  # unknown words
+        return seq.tolist()
+
+    return [ids(l) for l in question_lengths], [ids(l) for l in support_lengths]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark embedding gathering for input modules')
+    parser.add_argument("--batch_size", type=int, default=64)
+    parser.add_argument("--vocab_size", type=int, default=400000)
+    parser.add_argument("--dim", type=int, default=300)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(1337)
+    lookup = rng.randn(args.vocab_size, args.dim).astype(np.float32)
+    questions, supports = squad_shaped_batch(rng, args.batch_size, args.vocab_size)
+    max_q, max_s = max(len(q) for q in questions), max(len(s) for s in supports)
+
+    assert np.allclose(per_token_embeddings(supports, lookup, max_s), gather_embeddings(supports, lookup, max_s))
+
+    def run(f):
+        f(questions, lookup, max_q)
+        f(supports, lookup, max_s)
+
+    loop_time = min(timeit.repeat(lambda: run(per_token_embeddings), number=1, repeat=args.repeats))
+    gather_time = min(timeit.repeat(lambda: run(gather_embeddings), number=1, repeat=args.repeats))
+    num_tokens = sum(len(x) for x in questions + supports)
+    print("batch of {} questions, {} tokens, dim {}".format(args.batch_size, num_tokens, args.dim))
+    print("per-token loop: {:8.2f} ms".format(loop_time * 1000))
+    print("batched gather: {:8.2f} ms ({:.1f}x)".format(gather_time * 1000, loop_time / gather_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Reports the size and accuracy impact of storing embeddings as float16 or per-row-scaled int8.
+
+Reconstruction error and nearest-neighbour agreement are always reported. If a saved reader and a dataset are given
+(e.g., a FastQA reader with SQuAD dev or an ESIM reader with SNLI dev), the reader is additionally evaluated with the
+embeddings of its vocabulary replaced by their quantized versions.
+"""
+
+import argparse
+
+import numpy as np
+
+from jack.io.embeddings import load_embeddings
+from jack.io.embeddings.quantization import DTYPES, quantize_embeddings
+
+
+def reconstruction_report(emb, quantized, num_queries=1000, k=10, rng=None):
+    """Returns the mean relative L2 error, mean cosine similarity and top-k neighbour overlap of `quantized`."""
+    rng = rng or np.random.RandomState(1337)
+    rows = rng.choice(emb.shape[0], min(num_queries, emb.shape[0]), replace=False)
+    original = np.asarray(emb.lookup[rows], dtype=np.float32)
+    restored = np.asarray(quantized.lookup[rows], dtype=np.float32)
+    norms = np.maximum(np.linalg.norm(original, axis=1), 1e-8)
+    relative_error = np.linalg.norm(original - restored, axis=1) / norms
+    cosine = (original * restored).sum(1) / norms / np.maximum(np.linalg.norm(restored, axis=1), 1e-8)
+
+    def neighbours(lookup, queries):
+        scores = np.zeros([len(queries), emb.shape[0]], dtype=np.float32)
+        for start in range(0, emb.shape[0], 1 << 16):
+            block = np.asarray(lookup[start:start + (1 << 16)], dtype=np.float32)
+            block /= np.maximum(np.linalg.norm(block, axis=1, keepdims=True), 1e-8)
+            scores[:, start:start + len(block)] = queries.dot(block.T)
+        return np.argpartition(-scores, k, axis=1)[:, :k + 1]
+
+    queries = original[:100] / norms[:100, None]
+    overlap = np.mean([len(set(a) & set(b)) / (k + 1) for a, b in
+                       zip(neighbours(emb.lookup, queries), neighbours(quantized.lookup, queries))])
+    return relative_error.mean(), cosine.mean(), overlap
+
+
+def evaluate_with_embeddings(save_dir, dataset, batch_size, quantized):
+    from jack.eval import evaluate_reader
+    from jack.readers import reader_from_file
+    reader = reader_from_file(save_dir)
+    reader.shared_resources.vocab.emb = quantized
+    return evaluate_reader(reader, dataset, batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report the impact of quantized embeddings')
+    parser.add_argument("embedding_file")
+    parser.add_argument("-f", "--embedding_format", default="glove")
+    parser.add_argument("--save_dir", help="directory of a saved reader to evaluate")
+    parser.add_argument("--dataset", help="dataset to evaluate the reader on")
+    parser.add_argument("--loader", default="jack", help="name of the loader of the dataset")
+    parser.add_argument("--batch_size", type=int, default=64)
+    parser.add_argument("--max_examples", type=int)
+    args = parser.parse_args()
+
+    emb = load_embeddings(args.embedding_file, args.embedding_format)
+    dataset = None
+    if args.save_dir is not None and args.dataset is not None:
+        from jack.io.load import loaders
+        dataset = loaders[args.loader](args.dataset, args.max_examples)
+
+    print("{} embeddings of dim {}".format(*emb.shape))
+    print("{:8s} {:>10s} {:>10s} {:>10s} {:>12s}".format("dtype", "size (MB)", "rel. L2", "cosine", "10-NN overlap"))
+    results = dict()
+    for dtype in DTYPES:
+        quantized = quantize_embeddings(emb, dtype)
+        num_bytes = emb.shape[0] * emb.shape[1] * np.dtype(dtype).itemsize
+        if dtype == 'int8':
+            num_bytes += 4 * emb.shape[0]  # row scales
+        error, cosine, overlap = reconstruction_report(emb, quantized)
+        print("{:8s} {:10.1f} {:10.5f} {:10.5f} {:12.3f}".format(dtype, num_bytes / 2 ** 20, error, cosine, overlap))
+        if dataset is not None:
+            results[dtype] = evaluate_with_embeddings(args.save_dir, dataset, args.batch_size, quantized)
+
+    for dtype, result in results.items():
+        print("{}: {}".format(dtype, ", ".join("{}={}".format(k, v) for k, v in sorted(result.items())
+                                              if isinstance(v, (int, float)))))
+
+
+if __name__ == "__main__":
+    main()
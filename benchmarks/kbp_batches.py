@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Compares how fast link prediction training batches are generated from input-answer pairs, as done before by
+`KnowledgeGraphEmbeddingInputModule` (split questions, per-triple negative sampling), and from a `TripleDataset` with
+`corrupt_triples`, on a random FB15k-shaped knowledge graph."""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from jack.core.data_structures import QASetting, Answer
+from jack.io.triples import TripleDataset
+from jack.util.batch import shuffle_and_batch
+
+
+def reference_batches(triples, nb_entities, batch_size, num_negative, rng):
+    """Reference implementation: negatives are sampled triple by triple, as in the former `create_batch`."""
+    for batch in shuffle_and_batch(triples, batch_size, rng):
+        batch = list(batch)
+        target = [1] * len(batch)
+        for i in range(len(batch)):
+            s, p, o = batch[i]
+            for _ in range(num_negative):
+                batch.append([rng.randint(0, nb_entities - 1), p, o])
+                batch.append([s, p, rng.randint(0, nb_entities - 1)])
+                target.append(0)
+                target.append(0)
+        yield np.array(batch), np.array(target)
+
+
+def reference_preprocess(dataset, entity_to_index, predicate_to_index):
+    """Reference implementation: questions are split into triples, as by `preprocess`."""
+    triples = []
+    for qa_setting, _ in dataset:
+        s, p, o = qa_setting.question.split()
+        triples.append([entity_to_index.get(s, len(entity_to_index)), predicate_to_index[p],
+                        entity_to_index.get(o, len(entity_to_index))])
+    return triples
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark generation of link prediction training batches')
+    parser.add_argument("--nb_entities", type=int, default=14951)
+    parser.add_argument("--nb_predicates", type=int, default=1345)
+    parser.add_argument("--nb_triples", type=int, default=483142)
+    parser.add_argument("--batch_size", type=int, default=1024)
+    parser.add_argument("--num_negative", type=int, default=1)
+    args = parser.parse_args()
+
+    # imported here, as the module requires TensorFlow
+    from jack.core.shared_resources import SharedResources
+    from jack.core.tensorport import Ports
+    from jack.readers.link_prediction.models import KnowledgeGraphEmbeddingInputModule
+
+    rng = np.random.RandomState(1337)
+    names = np.stack([rng.randint(0, args.nb_entities, args.nb_triples).astype(str),
+                      np.char.add('p', rng.randint(0, args.nb_predicates, args.nb_triples).astype(str)),
+                      rng.randint(0, args.nb_entities, args.nb_triples).astype(str)], axis=1)
+    dataset = [(QASetting(" ".join(t)), [Answer("True")]) for t in names.tolist()]
+
+    t0 = time.time()
+    triples = TripleDataset.from_qa_settings(dataset)
+    conversion_time = time.time() - t0
+
+    input_module = KnowledgeGraphEmbeddingInputModule(SharedResources(config={'num_negative': args.num_negative}))
+    input_module.setup_from_data(triples)
+    entity_to_index = input_module.shared_resources.entity_to_index
+    predicate_to_index = input_module.shared_resources.predicate_to_index
+
+    t0 = time.time()
+    preprocessed = reference_preprocess(dataset, entity_to_index, predicate_to_index)
+    preprocessing_time = time.time() - t0
+    assert preprocessed == triples.to_ids(entity_to_index, predicate_to_index).tolist()
+
+    # preprocessed triples were cached after the first epoch, so only batching is timed
+    t0 = time.time()
+    nb_reference = 0
+    for batch, target in reference_batches(preprocessed, len(entity_to_index), args.batch_size, args.num_negative,
+                                           random.Random(123)):
+        nb_reference += len(target)
+    reference_time = time.time() - t0
+
+    batches = input_module.batch_generator(triples, args.batch_size, is_eval=False)
+    t0 = time.time()
+    nb_native = 0
+    for batch in batches:
+        assert batch[Ports.Input.question].shape == (len(batch[Ports.Target.target_index]), 3)
+        nb_native += len(batch[Ports.Target.target_index])
+    native_time = time.time() - t0
+    assert nb_native == nb_reference == len(dataset) * (1 + 2 * args.num_negative)
+
+    print("{} triples, {} entities, batches of {} with {} negatives per triple".format(
+        len(dataset), len(entity_to_index), args.batch_size, 2 * args.num_negative))
+    print("split questions:          {:8.2f} s (first epoch)".format(preprocessing_time))
+    print("TripleDataset conversion: {:8.2f} s (once)".format(conversion_time))
+    print("per-triple batches:       {:8.2f} s/epoch, {:10.0f} triples/s".format(
+        reference_time, len(dataset) / reference_time))
+    print("TripleDataset batches:    {:8.2f} s/epoch, {:10.0f} triples/s ({:.0f}x)".format(
+        native_time, len(dataset) / native_time, reference_time / native_time))
+
+
+if __name__ == "__main__":
+    main()
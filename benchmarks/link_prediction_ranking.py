@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Compares the per-candidate `compute_ranks` with `compute_ranks_batched`, which scores all entities of a batch of
+queries natively, on a random WN18-shaped knowledge graph."""
+
+import argparse
+import time
+
+import numpy as np
+
+from jack.eval.link_prediction import compute_ranks, compute_ranks_batched, ranking_summary, triples_to_ids
+from jack.readers.link_prediction.entity_scores import get_scorer
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark link prediction ranking evaluation')
+    parser.add_argument("--model", default="DistMult", choices=["DistMult", "ComplEx", "TransE"])
+    parser.add_argument("--nb_entities", type=int, default=40943)
+    parser.add_argument("--nb_predicates", type=int, default=18)
+    parser.add_argument("--nb_true_triples", type=int, default=151442)
+    parser.add_argument("--nb_test_triples", type=int, default=5000)
+    parser.add_argument("--nb_reference_triples", type=int, default=20,
+                        help="number of test triples ranked by the reference implementation")
+    parser.add_argument("--dim", type=int, default=200)
+    parser.add_argument("--batch_size", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(1337)
+    entities = ['e%d' % i for i in range(args.nb_entities)]
+    entity_to_index = {e: i for i, e in enumerate(entities)}
+    predicate_to_index = {'p%d' % i: i for i in range(args.nb_predicates)}
+    true_ids = np.unique(np.stack([rng.randint(0, args.nb_entities, args.nb_true_triples),
+                                   rng.randint(0, args.nb_predicates, args.nb_true_triples),
+                                   rng.randint(0, args.nb_entities, args.nb_true_triples)], axis=1), axis=0)
+    test_ids = true_ids[rng.choice(len(true_ids), args.nb_test_triples, replace=False)]
+    true_triples = {(entities[s], 'p%d' % p, entities[o]) for s, p, o in true_ids}
+    test_triples = [(entities[s], 'p%d' % p, entities[o]) for s, p, o in test_ids]
+    scorer = get_scorer(args.model, rng.randn(args.nb_entities + 1, args.dim) / np.sqrt(args.dim),
+                        rng.randn(args.nb_predicates, args.dim))
+
+    def scoring_function(triples):
+        """Reference scoring: triples are joined into questions and split again in batches, as by the reader."""
+        scores = []
+        for i in range(0, len(triples), args.batch_size):
+            questions = [" ".join(t) for t in triples[i:i + args.batch_size]]
+            ids = triples_to_ids([q.split() for q in questions], entity_to_index, predicate_to_index)
+            scores.extend(scorer.score(*ids.T))
+        return scores
+
+    reference = test_triples[:args.nb_reference_triples]
+    t0 = time.time()
+    expected = compute_ranks(scoring_function, reference, entities, true_triples)
+    reference_time = (time.time() - t0) / len(reference)
+
+    t0 = time.time()
+    ranks, filtered_ranks = compute_ranks_batched(scorer, test_ids, args.nb_entities, true_ids, args.batch_size)
+    batched_time = (time.time() - t0) / len(test_ids)
+
+    n = len(reference)
+    assert [list(r[:n]) for r in ranks] == [list(r) for r in expected[0]]
+    assert [list(r[:n]) for r in filtered_ranks] == [list(r) for r in expected[1]]
+
+    print("{}: {} entities, {} test triples, dim {}".format(args.model, args.nb_entities, len(test_ids), args.dim))
+    print("compute_ranks:         {:10.2f} ms/triple, {:8.1f} s for all test triples".format(
+        reference_time * 1000, reference_time * len(test_ids)))
+    print("compute_ranks_batched: {:10.2f} ms/triple, {:8.1f} s for all test triples ({:.0f}x)".format(
+        batched_time * 1000, batched_time * len(test_ids), reference_time / batched_time))
+    summary = ranking_summary(filtered_ranks)['all']
+    print("filtered: MRR {:.4f}, hits@1 {:.4f}, hits@10 {:.4f}".format(
+        summary['mrr'], summary['hits@1'], summary['hits@10']))
+
+
+if __name__ == "__main__":
+    main()
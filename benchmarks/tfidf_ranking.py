@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Compares per-question fitting of a `TfidfVectorizer` with the cached `TfidfRanker` for ranking the paragraphs of
+TriviaQA-shaped questions, of which several share a document."""
+
+import argparse
+import timeit
+
+import numpy as np
+import spacy
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics import pairwise_distances
+
+from jack.util.tfidf import TfidfRanker
+
+
+def sort_by_tfidf(question, paragraphs):
+    """Reference implementation: `sort_by_tfidf` as previously used by `XQAInputModule`."""
+    tfidf = TfidfVectorizer(strip_accents="unicode", stop_words=list(spacy.en.STOP_WORDS), decode_error='replace')
+    try:
+        para_features = tfidf.fit_transform(paragraphs)
+        q_features = tfidf.transform([question])
+    except ValueError:
+        return [(i, 0.0) for i in range(len(paragraphs))]
+
+    dists = pairwise_distances(q_features, para_features, "cosine").ravel()
+    sorted_ix = np.lexsort((paragraphs, dists))  # in case of ties, use the earlier paragraph
+
+    return [(i, 1.0 - dists[i]) for i in sorted_ix]
+
+
+def triviaqa_shaped_data(rng, num_questions, questions_per_document, num_paragraphs, vocab_size=50000):
+    """Samples questions and documents of Zipf-distributed words, each document split into paragraphs."""
+    words = ['w%d' % i for i in range(vocab_size)]
+
+    def text(length):
+        return ' '.join(words[i] for i in np.minimum(rng.zipf(1.3, length), vocab_size) - 1)
+
+    num_documents = max(1, num_questions // questions_per_document)
+    documents = [[text(int(l)) for l in np.clip(rng.lognormal(4.5, 0.5, num_paragraphs), 10, 400)]
+                 for _ in range(num_documents)]
+    questions = [text(int(l)) for l in np.clip(rng.normal(14, 4, num_questions), 4, 40)]
+    return questions, [documents[i % num_documents] for i in range(num_questions)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark TF-IDF ranking of paragraphs')
+    parser.add_argument("--num_questions", type=int, default=200)
+    parser.add_argument("--questions_per_document", type=int, default=2)
+    parser.add_argument("--num_paragraphs", type=int, default=40)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(1337)
+    questions, documents = triviaqa_shaped_data(rng, args.num_questions, args.questions_per_document,
+                                                args.num_paragraphs)
+
+    expected = [sort_by_tfidf(q, d) for q, d in zip(questions, documents)]
+    result = TfidfRanker().rank(questions, documents)
+    assert [[i for i, _ in r] for r in expected] == [[i for i, _ in r] for r in result]
+    assert np.allclose([s for r in expected for _, s in r], [s for r in result for _, s in r])
+
+    def run_old():
+        for q, d in zip(questions, documents):
+            sort_by_tfidf(q, d)
+
+    def run_new():
+        TfidfRanker().rank(questions, documents)
+
+    ranker = TfidfRanker()
+    ranker.rank(questions, documents)
+    old_time = min(timeit.repeat(run_old, number=1, repeat=args.repeats))
+    new_time = min(timeit.repeat(run_new, number=1, repeat=args.repeats))
+    cached_time = min(timeit.repeat(lambda: ranker.rank(questions, documents), number=1, repeat=args.repeats))
+    print("{} questions, {} paragraphs per document, {} questions per document".format(
+        args.num_questions, args.num_paragraphs, args.questions_per_document))
+    print("vectorizer per question: {:8.2f} ms".format(old_time * 1000))
+    print("ranker:                  {:8.2f} ms ({:.1f}x)".format(new_time * 1000, old_time / new_time))
+    print("ranker, cached:          {:8.2f} ms ({:.1f}x)".format(cached_time * 1000, old_time / cached_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Compares two-pass tokenization and token offset computation with the single-pass `tokenize_with_offsets` and
+answer span mapping by linear scan with binary search on long, TriviaQA-sized documents."""
+
+import argparse
+import re
+import timeit
+
+import numpy as np
+
+from jack.util.preprocessing import tokenize_with_offsets
+
+_pattern = re.compile('\w+|[^\w\s]')
+
+
+def two_pass_offsets(text):
+    """Reference implementation: `findall` followed by `str.index` per token, as previously used by `prepare_data`."""
+    tokens = _pattern.findall(text)
+    offsets = []
+    offset = 0
+    for t in tokens:
+        offset = text.index(t, offset)
+        offsets.append(offset)
+        offset += len(t)
+    return tokens, offsets
+
+
+def scan_spans(offsets, spans):
+    """Reference implementation: linear scan of token offsets per answer span."""
+    result = []
+    for span in spans:
+        start = 0
+        while start < len(offsets) and offsets[start] < span[0]:
+            start += 1
+        end = start
+        while end + 1 < len(offsets) and offsets[end + 1] < span[1]:
+            end += 1
+        result.append((start, end))
+    return result
+
+
+def search_spans(offsets, spans):
+    result = []
+    for span in spans:
+        start = int(np.searchsorted(offsets, span[0]))
+        result.append((start, max(start, int(np.searchsorted(offsets, span[1])) - 1)))
+    return result
+
+
+def triviaqa_like_document(rng, num_words, vocab_size=50000):
+    """Samples a document of Zipf-distributed words with punctuation, roughly like a TriviaQA Wikipedia page."""
+    words = ['w%d' % i for i in range(vocab_size)]
+    ids = np.minimum(rng.zipf(1.2, num_words), vocab_size) - 1
+    punctuation = rng.choice(['', '', '', '', '', ',', '.', "'s", ' (', ')'], num_words)
+    return ' '.join(words[i] + p for i, p in zip(ids, punctuation))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark token offset computation on long documents')
+    parser.add_argument("--num_documents", type=int, default=10)
+    parser.add_argument("--num_words", type=int, default=10000)
+    parser.add_argument("--num_answers", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(1337)
+    documents = [triviaqa_like_document(rng, args.num_words) for _ in range(args.num_documents)]
+    answer_spans = []
+    for doc in documents:
+        starts = np.sort(rng.randint(0, len(doc) - 20, args.num_answers))
+        answer_spans.append([(int(s), int(s) + 15) for s in starts])
+
+    for doc, spans in zip(documents, answer_spans):
+        tokens, offsets = two_pass_offsets(doc)
+        new_tokens, new_offsets = tokenize_with_offsets(doc)
+        assert tokens == new_tokens and offsets == new_offsets.tolist()
+        assert scan_spans(offsets, spans) == search_spans(new_offsets, spans)
+
+    def run_old():
+        for doc, spans in zip(documents, answer_spans):
+            scan_spans(two_pass_offsets(doc)[1], spans)
+
+    def run_new():
+        for doc, spans in zip(documents, answer_spans):
+            search_spans(tokenize_with_offsets(doc)[1], spans)
+
+    old_time = min(timeit.repeat(run_old, number=1, repeat=args.repeats))
+    new_time = min(timeit.repeat(run_new, number=1, repeat=args.repeats))
+    num_chars = sum(len(doc) for doc in documents)
+    print("{} documents, {} characters, {} answers each".format(len(documents), num_chars, args.num_answers))
+    print("two passes + scan:      {:8.2f} ms".format(old_time * 1000))
+    print("single pass + search:   {:8.2f} ms ({:.1f}x)".format(new_time * 1000, old_time / new_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Compares the load time of the block-based word2vec reader with the previous byte-by-byte reader."""
+
+import argparse
+import gzip
+import os
+import tempfile
+import timeit
+
+import numpy as np
+
+from jack.io.embeddings.word_to_vec import load_word2vec
+
+
+def per_byte_load_word2vec(filename, normalise=True):
+    """Reference implementation: the previous `load_word2vec`, reading words byte by byte."""
+    with gzip.open(filename, 'rb') as f:
+        vec_n, vec_size = map(int, f.readline().split())
+        byte_size = vec_size * 4
+        lookup = np.empty([vec_n, vec_size], dtype=np.float32)
+        word2idx = {}
+        for idx in range(vec_n):
+            word = b''
+            while True:
+                c = f.read(1)
+                if c == b' ':
+                    break
+                else:
+                    word += c
+            vector = np.frombuffer(f.read(byte_size), dtype=np.float32)
+            word2idx[word.decode('utf-8')] = idx
+            lookup[idx] = (1.0 / np.linalg.norm(vector, ord=2)) * vector if normalise else vector
+    return word2idx, lookup
+
+
+def write_word2vec(path, num_words, dim, rng):
+    """Writes random vectors of words with GoogleNews-like lengths to a gzipped word2vec file."""
+    lengths = np.clip(rng.lognormal(2.2, 0.5, num_words), 1, 40).astype(int)
+    vectors = rng.randn(num_words, dim).astype(np.float32)
+    with gzip.open(path, 'wb', compresslevel=1) as f:
+        f.write(('%d %d\n' % (num_words, dim)).encode('utf-8'))
+        for i, length in enumerate(lengths):
+            word = ('w%d_' % i + 'x' * length)[:max(length, len(str(i)) + 2)]
+            f.write(word.encode('utf-8') + b' ' + vectors[i].tobytes())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark loading of word2vec embeddings')
+    parser.add_argument("--file", help="word2vec file (.bin.gz) to load, random vectors are generated otherwise")
+    parser.add_argument("--num_words", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=300)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = args.file
+        if filename is None:
+            filename = os.path.join(tmp_dir, "vectors.bin.gz")
+            write_word2vec(filename, args.num_words, args.dim, np.random.RandomState(1337))
+
+        old_vocab, old_lookup = per_byte_load_word2vec(filename)
+        new_vocab, new_lookup = load_word2vec(filename)
+        assert old_vocab == new_vocab and np.allclose(old_lookup, new_lookup)
+        del old_lookup, new_lookup
+
+        def load_memory_map():
+            load_word2vec(filename, memory_map=os.path.join(tmp_dir, "memory_map"))
+
+        per_byte_time = min(timeit.repeat(lambda: per_byte_load_word2vec(filename), number=1, repeat=args.repeats))
+        block_time = min(timeit.repeat(lambda: load_word2vec(filename), number=1, repeat=args.repeats))
+        mem_map_time = min(timeit.repeat(load_memory_map, number=1, repeat=args.repeats))
+        print("{} vectors of dim {}".format(len(new_vocab), args.dim))
+        print("per-byte reader:      {:8.2f} s".format(per_byte_time))
+        print("block reader:         {:8.2f} s ({:.1f}x)".format(block_time, per_byte_time / block_time))
+        print("block reader, memmap: {:8.2f} s ({:.1f}x)".format(mem_map_time, per_byte_time / mem_map_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import os
+import sys
+
+from jack.io.load import loaders
+from jack.util.bm25 import BM25Index, build_bm25_index, corpus_paragraphs
+
+logger = logging.getLogger(os.path.basename(sys.argv[0]))
+logging.basicConfig(level=logging.INFO)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Build a BM25 paragraph index or retrieve supports with it')
+    subparsers = parser.add_subparsers(dest='command')
+
+    build = subparsers.add_parser('build', help='index the distinct supports of a dataset')
+    build.add_argument("dataset", help="dataset whose supports are indexed")
+    build.add_argument("index_dir", help="directory to create for the index")
+    build.add_argument("--loader", default="jack", choices=sorted(loaders), help="name of the loader of the dataset")
+    build.add_argument("--k1", type=float, default=1.2, help="BM25 term frequency saturation")
+    build.add_argument("--b", type=float, default=0.75, help="BM25 length normalization")
+
+    search = subparsers.add_parser('search', help='print the top-k paragraphs for the questions of a dataset')
+    search.add_argument("index_dir", help="directory of the index")
+    search.add_argument("dataset", help="dataset whose questions are searched")
+    search.add_argument("--loader", default="jack", choices=sorted(loaders), help="name of the loader of the dataset")
+    search.add_argument("-k", type=int, default=10, help="number of paragraphs per question")
+    search.add_argument("--batch_size", type=int, default=1000, help="number of questions searched at once")
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        paragraphs = corpus_paragraphs(loaders[args.loader](args.dataset))
+        logger.info("Indexing {} paragraphs of {}".format(len(paragraphs), args.dataset))
+        build_bm25_index(args.index_dir, paragraphs, k1=args.k1, b=args.b)
+        logger.info("Stored index to {}".format(args.index_dir))
+    elif args.command == 'search':
+        index = BM25Index(args.index_dir)
+        questions = [q for q, _ in loaders[args.loader](args.dataset)]
+        for start in range(0, len(questions), args.batch_size):
+            batch = questions[start:start + args.batch_size]
+            for q, hits in zip(batch, index.search([q.question for q in batch], args.k)):
+                print(json.dumps({'id': q.id, 'question': q.question, 'paragraphs': [i for i, _ in hits],
+                                  'scores': [s for _, s in hits]}))
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Runs data-parallel training with jack-train.py on localhost, with parameter servers and workers in separate
+processes, for each given number of workers, and reports the training throughput and scaling efficiency (throughput
+relative to the number of workers times the throughput of a single process) of each run. Arguments after `--` are
+passed on to jack-train.py, e.g.:
+
+    bin/jack-train-distributed.py --num_workers 1 2 4 -- with config=conf/qa/squad/fastqa.yaml epochs=1
+
+PyTorch readers average their gradients without parameter servers (--num_ps 0), e.g.:
+
+    bin/jack-train-distributed.py --num_ps 0 --num_workers 1 4 -- with config=conf/qa/squad/fastqa.yaml \
+        reader=fastqa_reader_torch epochs=1
+"""
+
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+
+logger = logging.getLogger(os.path.basename(sys.argv[0]))
+logging.basicConfig(level=logging.INFO)
+
+JACK_TRAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jack-train.py')
+
+
+def free_ports(n):
+    sockets = [socket.socket() for _ in range(n)]
+    for s in sockets:
+        s.bind(('localhost', 0))
+    ports = [s.getsockname()[1] for s in sockets]
+    for s in sockets:
+        s.close()
+    return ports
+
+
+def start(train_args, options, log_path, env):
+    """Starts jack-train.py with the given configuration options, logging to `log_path`."""
+    args = [sys.executable, JACK_TRAIN] + train_args + ['{}={}'.format(k, v) for k, v in options.items()]
+    with open(log_path, 'w') as log:
+        return subprocess.Popen(args, stdout=log, stderr=subprocess.STDOUT, env=env)
+
+
+def run(train_args, num_workers, num_ps, num_threads, log_dir):
+    """Trains with `num_workers` workers (in a single process without a cluster if 1) and returns the throughputs
+    reported by the workers."""
+    run_dir = os.path.join(log_dir, 'workers_{}'.format(num_workers))
+    os.makedirs(run_dir, exist_ok=True)
+    throughput_file = os.path.join(run_dir, 'throughput.jsonl')
+    if os.path.exists(throughput_file):
+        os.remove(throughput_file)
+
+    def process_env(name):
+        env = dict(os.environ)
+        # jack-train.py removes its JACK_TEMP directory when it is done, so processes must not share it
+        if 'JACK_TEMP' in env:
+            env['JACK_TEMP'] = os.path.join(env['JACK_TEMP'], 'workers_{}'.format(num_workers), name)
+        return env
+
+    if num_workers == 1:
+        options = {'throughput_file': throughput_file}
+        workers = [start(train_args, options, os.path.join(run_dir, 'worker_0.log'), process_env('worker_0'))]
+        parameter_servers = []
+    else:
+        ports = free_ports(num_ps + num_workers)
+        cluster = {'worker_hosts': ','.join('localhost:{}'.format(p) for p in ports[num_ps:])}
+        if num_ps > 0:
+            cluster['ps_hosts'] = ','.join('localhost:{}'.format(p) for p in ports[:num_ps])
+        if num_threads is None:
+            # workers share the cores of this host
+            num_threads = max(1, os.cpu_count() // num_workers)
+        parameter_servers = []
+        for i in range(num_ps):
+            options = dict(cluster, job_name='ps', task_index=i, experiments_db=None)
+            parameter_servers.append(start(train_args, options, os.path.join(run_dir, 'ps_{}.log'.format(i)),
+                                           process_env('ps_{}'.format(i))))
+        workers = []
+        for i in range(num_workers):
+            options = dict(cluster, job_name='worker', task_index=i, num_threads=num_threads,
+                           throughput_file=throughput_file)
+            if i > 0:
+                # only the chief records the experiment
+                options['experiments_db'] = None
+            workers.append(start(train_args, options, os.path.join(run_dir, 'worker_{}.log'.format(i)),
+                                 process_env('worker_{}'.format(i))))
+    logger.info("Training with {} worker(s), logs in {}".format(num_workers, run_dir))
+    try:
+        exit_codes = [w.wait() for w in workers]
+    finally:
+        for p in workers + parameter_servers:
+            if p.poll() is None:
+                p.terminate()
+    if any(exit_codes):
+        raise RuntimeError('Training with {} worker(s) failed, see logs in {}'.format(num_workers, run_dir))
+    with open(throughput_file) as f:
+        return [json.loads(line)['examples_per_sec'] for line in f]
+
+
+def main():
+    import argparse
+    if '--' in sys.argv:
+        split = sys.argv.index('--')
+        argv, train_args = sys.argv[1:split], sys.argv[split + 1:]
+    else:
+        argv, train_args = sys.argv[1:], []
+    parser = argparse.ArgumentParser(description='Data-parallel training on localhost, arguments after -- are passed '
+                                                 'on to jack-train.py')
+    parser.add_argument("--num_workers", type=int, nargs='+', default=[1, 2],
+                        help="numbers of workers to train with, one run each; 1 trains in a single process")
+    parser.add_argument("--num_ps", type=int, default=1,
+                        help="number of parameter servers of TensorFlow readers, 0 for PyTorch readers")
+    parser.add_argument("--num_threads", type=int,
+                        help="threads per worker, defaults to the number of cores divided by the number of workers")
+    parser.add_argument("--log_dir", help="directory of the logs of all processes, a temporary directory if not given")
+    args = parser.parse_args(argv)
+    if 'with' not in train_args:
+        train_args = ['with'] + train_args
+    log_dir = args.log_dir or tempfile.mkdtemp(prefix='jack-distributed-')
+
+    results = []
+    for num_workers in args.num_workers:
+        throughputs = run(train_args, num_workers, args.num_ps, args.num_threads, log_dir)
+        results.append((num_workers, sum(throughputs), throughputs))
+
+    single = next((total for n, total, _ in results if n == 1), None)
+    print("{:>8s} {:>12s} {:>8s} {:>11s}   {}".format("workers", "examples/s", "speedup", "efficiency", "per worker"))
+    for num_workers, total, throughputs in results:
+        speedup = "{:.2f}x".format(total / single) if single else "-"
+        efficiency = "{:.1%}".format(total / single / num_workers) if single else "-"
+        print("{:>8d} {:>12.1f} {:>8s} {:>11s}   {}".format(
+            num_workers, total, speedup, efficiency, " ".join("{:.1f}".format(t) for t in throughputs)))
+
+
+if __name__ == "__main__":
+    main()
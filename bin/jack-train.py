@@ -20,6 +20,7 @@ from jack import train as jtrain
 from jack.core.shared_resources import SharedResources
 from jack.io.embeddings.embeddings import load_embeddings, Embeddings
 from jack.io.load import loaders
+from jack.util.preprocessing import dataset_tokens
 from jack.util.vocab import Vocab
 
 logger = logging.getLogger(os.path.basename(sys.argv[0]))
@@ -72,6 +73,9 @@ def main(config,
          debug_examples,
          embedding_file,
          embedding_format,
+         embedding_cache,
+         embedding_cache_verify,
+         restrict_embeddings,
          experiments_db,
          reader,
          train,
@@ -96,6 +100,11 @@ def main(config,
     if not os.path.exists(jack_temp):
         os.makedirs(jack_temp)
 
+    if ex.current_run.config.get('job_name') == 'ps' and ex.current_run.config.get('worker_hosts'):
+        # parameter servers of data-parallel training only serve the variables of the workers
+        from jack.core.tensorflow import TFCluster
+        TFCluster.from_config(ex.current_run.config).join()
+
     if experiments_db is not None:
         ex.observers.append(SqlObserver.create('sqlite:///%s' % experiments_db))
 
@@ -121,7 +130,11 @@ def main(config,
 
         logger.info('loaded train/dev/test data')
         if embedding_file is not None and embedding_format is not None:
-            embeddings = load_embeddings(embedding_file, embedding_format)
+            restrict_to = None
+            if restrict_embeddings:
+                restrict_to = dataset_tokens(d for d in [train_data, dev_data, test_data] if d is not None)
+            embeddings = load_embeddings(embedding_file, embedding_format, cache=embedding_cache, vocab=restrict_to,
+                                         verify_cache=embedding_cache_verify)
             logger.info('loaded pre-trained embeddings ({})'.format(embedding_file))
             ex.current_run.config["repr_dim_input"] = embeddings.lookup[0].shape[0]
         else:
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import os
+import sys
+
+from jack.core.data_structures import QASetting
+from jack.readers import reader_from_file
+from jack.readers.link_prediction.completion import EntityPredictor
+
+logger = logging.getLogger(os.path.basename(sys.argv[0]))
+logging.basicConfig(level=logging.INFO)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Answer "subject predicate ?" and "? predicate object" queries, '
+                                                 'read line by line from stdin, with a link prediction reader')
+    parser.add_argument("reader_dir", help="directory of the stored reader")
+    parser.add_argument("-k", type=int, default=10, help="number of entities per query")
+    parser.add_argument("--nb_partitions", type=int, default=0,
+                        help="number of partitions of the entities for approximate search, 0 for exact search")
+    parser.add_argument("--nprobe", type=int, default=8, help="number of partitions searched per query")
+    parser.add_argument("--nb_subspaces", type=int, default=0,
+                        help="number of product quantization subspaces of the entity index, 0 for none")
+    parser.add_argument("--rerank", type=int, default=0,
+                        help="number of candidates per result re-ranked exactly with product quantization")
+    parser.add_argument("--index_dir", help="directory of an entity index that is loaded, or stored once built")
+    args = parser.parse_args()
+
+    reader = reader_from_file(args.reader_dir)
+    predictor = EntityPredictor(reader, nb_partitions=args.nb_partitions, nprobe=args.nprobe,
+                                nb_subspaces=args.nb_subspaces, rerank=args.rerank, index_dir=args.index_dir)
+    logger.info("Loaded reader with {} entities from {}".format(len(predictor.entities), args.reader_dir))
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            answers, = predictor([QASetting(line.strip())], args.k)
+        except (ValueError, KeyError) as e:
+            logger.error("Invalid query {}: {}".format(line.strip(), e))
+            continue
+        print(json.dumps({'query': line.strip(), 'entities': [a.text for a in answers],
+                          'scores': [a.score for a in answers]}), flush=True)
+
+
+if __name__ == "__main__":
+    main()
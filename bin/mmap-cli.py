@@ -5,7 +5,9 @@ import os
 import sys
 
 from jack.io.embeddings import load_embeddings
-from jack.io.embeddings.memory_map import save_as_memory_map_dir
+from jack.io.embeddings.memory_map import save_as_memory_map_dir, save_word2vec_as_memory_map_dir, build_ann_index
+from jack.io.embeddings.quantization import DTYPES
+from jack.util.ann import METRICS
 
 import logging
 logger = logging.getLogger(os.path.basename(sys.argv[0]))
@@ -19,14 +21,29 @@ def main():
                         help="The name of the directory to store the memory map in. Will be created if it doesn't "
                              "exist.")
     parser.add_argument("-f", "--input_format", help="Format of input embeddings.", default="glove",
-                        choices=["glove", "word2vec", "memory_map_dir"])
+                        choices=["glove", "word2vec", "fasttext", "memory_map_dir"])
+    parser.add_argument("-d", "--dtype", help="Type of stored vectors, int8 vectors are scaled per row.",
+                        default="float32", choices=DTYPES)
+    parser.add_argument("--ann_partitions", type=int, default=0,
+                        help="Number of partitions of a nearest neighbour index stored with the embeddings, "
+                             "0 for none.")
+    parser.add_argument("--ann_subspaces", type=int, default=0,
+                        help="Number of product quantization subspaces of the nearest neighbour index, 0 for none.")
+    parser.add_argument("--ann_metric", default="cosine", choices=METRICS,
+                        help="Similarity of the nearest neighbour index.")
     args = parser.parse_args()
     input_name = args.input_file
     output_dir = args.output_dir
-    embeddings = load_embeddings(input_name, typ=args.input_format)
-    logging.info("Loaded embeddings from {}".format(input_name))
-    save_as_memory_map_dir(output_dir, embeddings)
+    if args.input_format == "word2vec" and args.dtype == "float32":
+        save_word2vec_as_memory_map_dir(output_dir, input_name)
+    else:
+        embeddings = load_embeddings(input_name, typ=args.input_format)
+        logging.info("Loaded embeddings from {}".format(input_name))
+        save_as_memory_map_dir(output_dir, embeddings, dtype=args.dtype)
     logging.info("Stored embeddings to {}".format(output_dir))
+    if args.ann_partitions:
+        build_ann_index(output_dir, args.ann_partitions, args.ann_metric, args.ann_subspaces)
+        logging.info("Stored nearest neighbour index to {}".format(output_dir))
 
 
 if __name__ == "__main__":
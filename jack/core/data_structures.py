@@ -4,6 +4,7 @@
 Here we define light data structures to store the input to jack readers, and their output.
 """
 
+from itertools import islice
 from typing import Tuple, Sequence
 
 
@@ -86,12 +87,26 @@ def jack_to_qasetting(jtr_data, max_count=None):
     Returns:
         list of QASetting
     """
+    return list(iter_jack_to_qasetting(jtr_data, max_count))
+
+
+def iter_jack_to_qasetting(jtr_data, max_count=None):
+    """
+    Lazily converts a python dictionary in Jack format to QASettings. Its instances can be any iterable, e.g., a
+    generator that streams them from file, and are only consumed up to `max_count` QASettings.
+    Args:
+        jtr_data: dictionary extracted from jack json file.
+        max_count: maximal number of instances to load.
+
+    Returns:
+        iterator over pairs of QASetting and answers
+    """
 
     def value(c, key="text", default=None):
         return c.get(key, default) if isinstance(c, dict) else c if key == 'text' else default
 
     global_candidates = [value(c) for c in jtr_data['globals']['candidates']] if 'globals' in jtr_data else None
 
-    ans = [(inp, answer) for i in jtr_data["instances"]
-           for inp, answer in _jack_to_qasetting(i, value, global_candidates)][:max_count]
-    return ans
+    ans = ((inp, answer) for i in jtr_data["instances"]
+           for inp, answer in _jack_to_qasetting(i, value, global_candidates))
+    return islice(ans, max_count)
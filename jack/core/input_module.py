@@ -1,11 +1,14 @@
 # -*- coding: utf-8 -*-
 
 import logging
+import multiprocessing
 import os
 import random
 import tempfile
+from collections import deque
+from itertools import islice
 from abc import abstractmethod
-from typing import Iterable, Tuple, List, Mapping, TypeVar, Generic, Optional
+from typing import Iterable, Tuple, List, Mapping, TypeVar, Generic, Optional, Sequence
 
 import diskcache as dc
 import numpy as np
@@ -13,7 +16,11 @@ import numpy as np
 from jack.core.data_structures import QASetting, Answer
 from jack.core.shared_resources import SharedResources
 from jack.core.tensorport import TensorPort
-from jack.util.batch import shuffle_and_batch, GeneratorWithRestart
+from jack.util.batch import shuffle_and_batch, bucket_and_batch, batch_by_tokens, GeneratorWithRestart
+from jack.util.batch import padding_efficiency
+from jack.util.columnar import fingerprint, store_columnar, load_columnar
+from jack.util.map import gather_embeddings
+from jack.util.vocab import Vocab
 
 logger = logging.getLogger(__name__)
 
@@ -119,9 +126,16 @@ class OnlineInputModule(InputModule, Generic[AnnotationType]):
     for your annotation, in order to get stronger typing.
     """
 
+    # configuration keys that influence `preprocess`, used to key persistent caches of preprocessed data;
+    # `None` means that the entire configuration is taken into account
+    _preprocessing_config_keys = None
+    # number of batches that are read at once from streamed datasets, see `_stream_batches`
+    _stream_window = 100
+
     def __init__(self, shared_resources: SharedResources, seed=None):
         self.shared_resources = shared_resources
         self._rng = random.Random(seed or random.randint(0, 9999))
+        self._lengths_cache = None
 
     @abstractmethod
     def preprocess(self, questions: List[QASetting], answers: Optional[List[List[Answer]]] = None,
@@ -170,10 +184,66 @@ class OnlineInputModule(InputModule, Generic[AnnotationType]):
             - annotations: List of annotations to shuffle & batch.
             - is_eval: Whether batches are generated for evaluation.
 
+        If the `bucket_window` option is set, shuffled training instances are sorted by `instance_length` within
+        windows of `bucket_window` batches to reduce padding. If the `max_batch_tokens` option is set, batches are
+        formed up to that many padded support tokens (see `num_padded_supports`) instead of `batch_size` instances.
+
         Returns: Batch iterator
         """
         rng = self._rng if self._shuffle(is_eval) else None
-        return shuffle_and_batch(questions, batch_size, rng)
+        config = self.shared_resources.config
+        window = config.get('bucket_window') if rng is not None else None
+        max_tokens = config.get('max_batch_tokens')
+        if not window and not max_tokens:
+            return shuffle_and_batch(questions, batch_size, rng)
+
+        if self._lengths_cache is None or self._lengths_cache[0] is not questions:
+            self._lengths_cache = (questions, [self.instance_length(q) for q, _ in questions])
+        lengths = self._lengths_cache[1]
+        indices = list(range(len(questions)))
+        if max_tokens:
+            num_rows = [self.num_padded_supports(q, is_eval) for q, _ in questions]
+            if window:
+                # sorted windows in random order, each of which is split into batches
+                groups = bucket_and_batch(indices, window * batch_size, lengths, rng, window=1)
+            else:
+                groups = shuffle_and_batch(indices, max(len(indices), 1), rng)
+            batches = [b for g in groups
+                       for b in batch_by_tokens(g, max_tokens, [lengths[i][0] for i in g], [num_rows[i] for i in g])]
+            if window:
+                rng.shuffle(batches)
+        else:
+            batches = list(bucket_and_batch(indices, batch_size, lengths, rng, window))
+        logger.info("%d batches, %.1f%% of padded support tokens are real tokens." %
+                    (len(batches), 100 * padding_efficiency([lengths[i][0] for i in b] for b in batches)))
+        return ([questions[i] for i in b] for b in batches)
+
+    def instance_length(self, question: QASetting) -> Tuple[int, int]:
+        """Approximate length of an instance, used to batch instances of similar length together.
+
+        Returns:
+            Number of whitespace separated tokens of the longest support (supports are padded to a common length)
+            and of the question.
+        """
+        support_length = max((len(s.split()) for s in question.support or ()), default=0)
+        return support_length, len(question.question.split())
+
+    def num_padded_supports(self, question: QASetting, is_eval: bool) -> int:
+        """Number of padded support rows an instance contributes to a batch, used for token-budget batching."""
+        return 1
+
+    def _embed(self, ids: List[List[int]], max_length: int = None) -> np.ndarray:
+        """Embeds id sequences with the pre-trained embeddings of the shared vocab.
+
+        Args:
+            ids: list of vocab id sequences.
+            max_length: optional length of the padded time dimension, defaults to the longest sequence.
+
+        Returns:
+            float32 tensor of shape [len(ids), max_length, emb_length]; padding and ids without pre-trained embedding
+            are embedded as zero vectors.
+        """
+        return gather_embeddings(ids, self.shared_resources.vocab.emb.lookup, max_length)
 
     def _shuffle(self, is_eval: bool) -> bool:
         """Whether to shuffle the dataset in batch_annotations(). Default is noe is_eval."""
@@ -188,6 +258,26 @@ class OnlineInputModule(InputModule, Generic[AnnotationType]):
     def batch_generator(self, dataset: List[Tuple[QASetting, List[Answer]]], batch_size: int, is_eval: bool) \
             -> Iterable[Mapping[TensorPort, np.ndarray]]:
         """Preprocesses all instances, batches & shuffles them and generates batches in dicts."""
+        num_workers = self.shared_resources.config.get('num_preprocessing_workers', 0) or 0
+        vocab = self.shared_resources.vocab
+        if num_workers > 0 and vocab is not None and not vocab.frozen:
+            logger.warning("Preprocessing in worker processes requires a frozen vocabulary, preprocessing inline.")
+            num_workers = 0
+
+        if not isinstance(dataset, Sequence):
+            return self._stream_batches(dataset, batch_size, is_eval, num_workers)
+
+        cache_dir = self.shared_resources.config.get('preprocessed_cache_dir')
+        if cache_dir is not None:
+            annotations = self._load_or_preprocess(dataset, cache_dir, batch_size, num_workers)
+            position = {id(q): i for i, (q, _) in enumerate(dataset)}
+
+            def make_cached_generator():
+                for batch in self._batch_questions(dataset, batch_size, is_eval):
+                    yield self.create_batch([annotations[position[id(q)]] for q, _ in batch], is_eval, True)
+
+            return GeneratorWithRestart(make_cached_generator)
+
         logger.info("OnlineInputModule pre-processes data on-the-fly in first epoch and caches results for subsequent "
                     "epochs! That means, first epoch might be slower.")
         # only cache training data on file
@@ -203,10 +293,11 @@ class OnlineInputModule(InputModule, Generic[AnnotationType]):
         preprocessed = set()
         def make_generator():
             running_idx = 0
-            for i, batch in enumerate(self._batch_questions(dataset, batch_size, is_eval)):
-                questions, answers = zip(*batch)
-                if questions[0].id not in preprocessed:
-                    annots = self.preprocess(questions, answers)
+            batches = self._batch_questions(dataset, batch_size, is_eval)
+            # no need for workers once everything has been preprocessed
+            workers = num_workers if len(preprocessed) < len(dataset) else 0
+            for questions, answers, annots in self._preprocess_batches(batches, preprocessed, workers):
+                if annots is not None:
                     if questions[0].id is None:  # make sure there is an id, if not we set it here
                         for q in questions:
                             if q.id is None:
@@ -221,3 +312,129 @@ class OnlineInputModule(InputModule, Generic[AnnotationType]):
                 yield self.create_batch(annots, is_eval, True)
 
         return GeneratorWithRestart(make_generator)
+
+    def _stream_batches(self, dataset: Iterable[Tuple[QASetting, List[Answer]]], batch_size: int, is_eval: bool,
+                        num_workers: int = 0) -> Iterable[Mapping[TensorPort, np.ndarray]]:
+        """Batches and preprocesses a stream of instances without materializing it.
+
+        Instances are read in windows of `_stream_window` batches, which are shuffled and batched by
+        `_batch_questions`. Nothing is cached, so every pass through the batches reads and preprocesses `dataset`
+        anew; for more than one pass, `dataset` has to be re-iterable (e.g., a `GeneratorWithRestart`).
+        """
+        logger.info("OnlineInputModule streams the dataset and pre-processes it on-the-fly in every epoch.")
+
+        def batch_windows():
+            instances = iter(dataset)
+            window = list(islice(instances, self._stream_window * batch_size))
+            while window:
+                yield from self._batch_questions(window, batch_size, is_eval)
+                window = list(islice(instances, self._stream_window * batch_size))
+
+        def make_generator():
+            for _, _, annots in self._preprocess_batches(batch_windows(), set(), num_workers):
+                yield self.create_batch(annots, is_eval, True)
+
+        return GeneratorWithRestart(make_generator)
+
+    def _load_or_preprocess(self, dataset: List[Tuple[QASetting, List[Answer]]], cache_dir: str, batch_size: int,
+                            num_workers: int = 0) -> Sequence[AnnotationType]:
+        """Loads the annotations of a dataset from a persistent columnar cache, preprocessing it if necessary.
+
+        The cache is keyed by a fingerprint of the dataset, the vocabularies and the preprocessing configuration,
+        so it can be shared by repeated training runs and processes that use the same preprocessing.
+
+        Args:
+            dataset: list of input-answer pairs.
+            cache_dir: directory of the persistent cache.
+            batch_size: number of instances preprocessed at once.
+            num_workers: number of worker processes used for preprocessing.
+
+        Returns:
+            Memory-mapped sequence of annotations in the order of `dataset`.
+        """
+        path = os.path.join(cache_dir, self._preprocessing_fingerprint(dataset))
+        if not os.path.exists(path):
+            logger.info("Preprocessing %d instances into %s..." % (len(dataset), path))
+            batches = (dataset[i:i + batch_size] for i in range(0, len(dataset), batch_size))
+            annotations = []
+            for _, _, annots in self._preprocess_batches(batches, set(), num_workers):
+                annotations.extend(annots)
+            store_columnar(path, annotations)
+        else:
+            logger.info("Loading preprocessed data from %s." % path)
+        return load_columnar(path)
+
+    def _preprocessing_fingerprint(self, dataset: List[Tuple[QASetting, List[Answer]]]) -> str:
+        """Fingerprint of everything the annotations of `dataset` depend on. Datasets loaded from file by
+        `jack.io.load` are identified by their `source` (file, modification time and size), other datasets by their
+        full content."""
+        config = self.shared_resources.config
+        keys = self._preprocessing_config_keys
+        keys = sorted(config) if keys is None else keys
+        resources = []
+        for k, v in sorted(self.shared_resources.__dict__.items()):
+            if isinstance(v, Vocab):
+                resources.append((k, v.fingerprint()))
+            elif isinstance(v, dict) and k != 'config':
+                resources.append((k, sorted(v.items(), key=repr)))
+        instances = getattr(dataset, 'source', None)
+        if instances is None:
+            instances = [(sorted((k, v) for k, v in vars(q).items() if k != 'id'),
+                          [sorted(vars(a).items()) for a in answers] if answers is not None else None)
+                         for q, answers in dataset]
+        return fingerprint(type(self).__module__, type(self).__name__,
+                           [(k, config.get(k)) for k in keys], resources, instances)
+
+    def _preprocess_batches(self, batches: Iterable[List[Tuple[QASetting, List[Answer]]]], preprocessed: set,
+                            num_workers: int = 0):
+        """Preprocesses batches that have not been preprocessed before.
+
+        Args:
+            batches: iterable of batches of input-answer pairs.
+            preprocessed: ids of questions that have already been preprocessed.
+            num_workers: if > 0, upcoming batches are preprocessed in a pool of that many worker processes.
+
+        Returns:
+            Generator of `(questions, answers, annotations)` in the order of `batches`, where annotations are `None`
+            for batches that were already preprocessed.
+        """
+        batches = (tuple(zip(*batch)) for batch in batches)
+        if num_workers <= 0:
+            for questions, answers in batches:
+                if questions[0].id not in preprocessed:
+                    yield questions, answers, self.preprocess(questions, answers)
+                else:
+                    yield questions, answers, None
+            return
+
+        # forked workers inherit this module (and its shared resources) instead of receiving a pickled copy
+        pool = multiprocessing.get_context('fork').Pool(
+            num_workers, initializer=_set_worker_input_module, initargs=(self,))
+        try:
+            pending = deque()
+            for questions, answers in batches:
+                result = None
+                if questions[0].id not in preprocessed:
+                    result = pool.apply_async(_preprocess_in_worker, (questions, answers))
+                pending.append((questions, answers, result))
+                # keep a bounded window of batches in flight, results are returned in order
+                if len(pending) > 2 * num_workers:
+                    questions, answers, result = pending.popleft()
+                    yield questions, answers, result.get() if result is not None else None
+            while pending:
+                questions, answers, result = pending.popleft()
+                yield questions, answers, result.get() if result is not None else None
+        finally:
+            pool.terminate()
+
+
+_worker_input_module = None
+
+
+def _set_worker_input_module(input_module: OnlineInputModule):
+    global _worker_input_module
+    _worker_input_module = input_module
+
+
+def _preprocess_in_worker(questions: List[QASetting], answers: List[List[Answer]]):
+    return _worker_input_module.preprocess(questions, answers)
@@ -7,15 +7,15 @@ using a TensorFlow model into other tensors, and one that converts these tensors
 """
 
 import logging
-import math
 import os
 import shutil
-from typing import Iterable, List
+from itertools import islice
+from typing import Iterable, List, Sequence
 
 import progressbar
 
 from jack.core.data_structures import *
-from jack.core.input_module import InputModule
+from jack.core.input_module import InputModule, OnlineInputModule
 from jack.core.model_module import ModelModule
 from jack.core.output_module import OutputModule
 from jack.core.shared_resources import SharedResources
@@ -86,36 +86,64 @@ class JTReader:
         answers = self.output_module(inputs, *[output_module_input[p] for p in self.output_module.input_ports])
         return answers
 
-    def process_dataset(self, dataset: Sequence[Tuple[QASetting, Answer]], batch_size: int, silent=True):
+    def process_dataset(self, dataset: Iterable[Tuple[QASetting, Answer]], batch_size: int, silent=True,
+                        chunk_size: int = 100):
         """
         Similar to the call method, only that it works on a labeled dataset and applies batching. However, assumes
         that batches in input_module.batch_generator are processed in order and do not get shuffled during with
         flag is_eval set to true.
 
         Args:
-            dataset:
+            dataset: a list of instances, or an iterable (e.g., a stream from `jack.io.load`) that is processed in
+            chunks, so that it is never held in memory entirely.
             batch_size: note this information is needed here, but does not set the batch_size the model is using.
             This has to happen during setup/configuration.
             silent: if true, no output
+            chunk_size: number of batches per chunk of an iterable dataset
 
         Returns:
             predicted outputs/answers to a given (labeled) dataset
         """
+        if not isinstance(dataset, Sequence):
+            answers = list()
+            instances = iter(dataset)
+            chunk = list(islice(instances, chunk_size * batch_size))
+            while chunk:
+                answers.extend(self.process_dataset(chunk, batch_size, silent))
+                chunk = list(islice(instances, chunk_size * batch_size))
+            return answers
+
+        order = None
+        if self.shared_resources.config.get('bucket_window') and isinstance(self.input_module, OnlineInputModule):
+            # process instances sorted by length to reduce padding, answers are restored to the original order below
+            lengths = [self.input_module.instance_length(q) for q, _ in dataset]
+            order = sorted(range(len(dataset)), key=lambda i: lengths[i])
+            dataset = [dataset[i] for i in order]
+        if self.shared_resources.config.get('max_batch_tokens') and isinstance(self.input_module, OnlineInputModule):
+            # batches vary in size, so we let the input module form them exactly as in its batch generator
+            question_batches = [[q for q, _ in b]
+                                for b in self.input_module._batch_questions(dataset, batch_size, is_eval=True)]
+        else:
+            question_batches = [[q for q, _ in dataset[i:i + batch_size]] for i in range(0, len(dataset), batch_size)]
         batches = self.input_module.batch_generator(dataset, batch_size, is_eval=True)
         answers = list()
         enumerator = enumerate(batches)
         if not silent:
             logger.info("Start answering...")
             bar = progressbar.ProgressBar(
-                max_value=math.ceil(len(dataset) / batch_size),
+                max_value=len(question_batches),
                 widgets=[' [', progressbar.Timer(), '] ', progressbar.Bar(), ' (', progressbar.ETA(), ') '])
             enumerator = bar(enumerator)
         for j, batch in enumerator:
             output_module_input = self.model_module(batch, self.output_module.input_ports)
-            questions = [q for q, a in dataset[j * batch_size:(j + 1) * batch_size]]
+            questions = question_batches[j]
             answers.extend(a[0] for a in self.output_module(
                 questions, *[output_module_input[p] for p in self.output_module.input_ports]))
 
+        if order is not None:
+            sorted_answers, answers = answers, [None] * len(answers)
+            for i, a in zip(order, sorted_answers):
+                answers[i] = a
         return answers
 
     def train(self, optimizer, training_set: Iterable[Tuple[QASetting, List[Answer]]], batch_size: int,
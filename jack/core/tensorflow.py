@@ -3,6 +3,7 @@
 import logging
 import os
 import sys
+import time
 from abc import abstractmethod
 from functools import reduce
 from typing import Iterable, Tuple, List, Mapping, Sequence
@@ -12,6 +13,18 @@ import tensorflow as tf
 
 from jack.core import JTReader, QASetting, Answer, Ports, ModelModule, SharedResources, TensorPort
 from jack.core.reader import logger
+from jack.util.batch import BatchPrefetcher, GeneratorWithRestart
+from jack.util.distributed import parse_hosts, shard
+
+
+def session_config(num_threads: int = None) -> tf.ConfigProto:
+    """Returns the configuration of TensorFlow sessions, which run ops with `num_threads` threads if given."""
+    config = tf.ConfigProto(allow_soft_placement=True)
+    config.gpu_options.allow_growth = True
+    if num_threads:
+        config.intra_op_parallelism_threads = num_threads
+        config.inter_op_parallelism_threads = num_threads
+    return config
 
 
 class TFModelModule(ModelModule):
@@ -23,10 +36,11 @@ class TFModelModule(ModelModule):
     def __init__(self, shared_resources: SharedResources, sess=None):
         self.shared_resources = shared_resources
         if sess is None:
-            session_config = tf.ConfigProto(allow_soft_placement=True)
-            session_config.gpu_options.allow_growth = True
-            sess = tf.Session(config=session_config)
+            sess = tf.Session(config=session_config(shared_resources.config.get('num_threads')))
         self.tf_session = sess
+        # only the chief initializes (or restores) variables, which are shared by all workers in data-parallel
+        # training, see `TFCluster`
+        self.is_chief = True
         # will be set in setup
         self._tensors = None
         self._placeholders = None
@@ -117,11 +131,12 @@ class TFModelModule(ModelModule):
         self._training_variables = [v for v in tf.trainable_variables() if v not in old_train_variables]
         self._saver = tf.train.Saver(self._training_variables, max_to_keep=1)
         self._variables = [v for v in tf.global_variables() if v not in old_variables]
-        self.tf_session.run([v.initializer for v in self.variables])
+        if self.is_chief:
+            self.tf_session.run([v.initializer for v in self.variables])
 
         # Sometimes we want to initialize (partially) with a pre-trained model
         load_dir = self.shared_resources.config.get('load_dir')
-        if is_training and load_dir is not None:
+        if is_training and load_dir is not None and self.is_chief:
             if not load_dir.endswith('model_module'):
                 # path to a reader was provided
                 load_dir = os.path.join(load_dir, 'model_module')
@@ -197,7 +212,7 @@ class TFReader(JTReader):
     def train(self, optimizer,
               training_set: Iterable[Tuple[QASetting, List[Answer]]],
               batch_size: int, max_epochs=10, hooks=tuple(),
-              l2=0.0, clip=None, clip_op=tf.clip_by_value, summary_writer=None, **kwargs):
+              l2=0.0, clip=None, clip_op=tf.clip_by_value, summary_writer=None, cluster=None, **kwargs):
         """
         This method trains the reader (and changes its state).
 
@@ -211,18 +226,28 @@ class TFReader(JTReader):
             clip: whether to apply gradient clipping and at which value
             clip_op: operation to perform for clipping
             summary_writer: summary writer
+            cluster: `TFCluster` of data-parallel training, which the reader must have joined before being set up;
+                the reader then trains on the cluster's shard of the training set
         """
         batches, loss, min_op, summaries = self._setup_training(
-            batch_size, clip, optimizer, training_set, summary_writer, l2, clip_op, **kwargs)
+            batch_size, clip, optimizer, training_set, summary_writer, l2, clip_op, cluster=cluster, **kwargs)
 
         self._train_loop(min_op, loss, batches, hooks, max_epochs, summaries, summary_writer, **kwargs)
 
-    def _setup_training(self, batch_size, clip, optimizer, training_set, summary_writer, l2, clip_op, **kwargs):
+    def _setup_training(self, batch_size, clip, optimizer, training_set, summary_writer, l2, clip_op, cluster=None,
+                        **kwargs):
+        if cluster is not None and self.shared_resources.config.get('max_batch_tokens'):
+            # the number of batches would differ between workers, which then wait for each other forever
+            raise ValueError('Data-parallel training requires batches of batch_size instances, unset max_batch_tokens')
         global_step = tf.train.create_global_step()
         if not self._is_setup:
             # First setup shared resources, e.g., vocabulary. This depends on the input module.
             logger.info("Setting up model...")
             self.setup_from_data(training_set, is_training=True)
+        if cluster is not None:
+            # vocabularies are built from the whole training set, so they are the same for all workers
+            training_set = cluster.shard(training_set)
+            optimizer = cluster.optimizer(optimizer)
         logger.info("Preparing training data...")
         batches = self.input_module.batch_generator(training_set, batch_size, is_eval=False)
         logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
@@ -278,23 +303,149 @@ class TFReader(JTReader):
             logging.error(err)
 
         # initialize non model variables like learning rate, optimizer vars ...
-        self.session.run([v.initializer for v in tf.global_variables() if v not in self.model_module.variables])
+        non_model_variables = [v for v in tf.global_variables() if v not in self.model_module.variables]
+        if cluster is not None:
+            cluster.start(self.session, non_model_variables)
+        else:
+            self.session.run([v.initializer for v in non_model_variables])
         return batches, loss, min_op, summaries
 
     def _train_loop(self, optimization_op, loss_op, batches, hooks, max_epochs, summaries, summary_writer, **kwargs):
         logger.info("Start training...")
+        to_feed_dict = self.model_module.convert_to_feed_dict
+        prefetch_depth = self.shared_resources.config.get('prefetch_depth', 0) or 0
+        if prefetch_depth > 0:
+            # batches are created and converted in the background while the session runs
+            feed_dicts = BatchPrefetcher(batches, prefetch_depth, transform=to_feed_dict)
+        else:
+            feed_dicts = GeneratorWithRestart(lambda: map(to_feed_dict, batches))
         for i in range(1, max_epochs + 1):
-            for j, batch in enumerate(batches):
-                feed_dict = self.model_module.convert_to_feed_dict(batch)
+            for j, feed_dict in enumerate(feed_dicts):
                 if summaries is not None:
                     step, sums, current_loss, _ = self.session.run(
                         [tf.train.get_global_step(), summaries, loss_op, optimization_op], feed_dict=feed_dict)
                     summary_writer.add_summary(sums, step)
                 else:
                     current_loss, _ = self.session.run([loss_op, optimization_op], feed_dict=feed_dict)
-                for hook in hooks:
-                    hook.at_iteration_end(i, current_loss, set_name='train')
+                if prefetch_depth > 0:
+                    # hooks may use the input module (e.g., for evaluation), which must not create batches meanwhile
+                    with feed_dicts.paused():
+                        for hook in hooks:
+                            hook.at_iteration_end(i, current_loss, set_name='train')
+                else:
+                    for hook in hooks:
+                        hook.at_iteration_end(i, current_loss, set_name='train')
+
+            if prefetch_depth > 0:
+                feed_dicts.log_stats()
 
             # calling post-epoch hooks
             for hook in hooks:
                 hook.at_epoch_end(i)
+
+
+class TFCluster:
+    """Data-parallel training with between-graph replication: every worker process builds the graph, with variables
+    placed on the parameter servers (ps), and trains on its own shard of the training set. Workers either average their
+    gradients for each update (`tf.train.SyncReplicasOptimizer`), so that an update is computed from `num_workers`
+    batches, or update the parameters asynchronously. The first worker, the chief, initializes all variables, and is
+    expected to be the only one that evaluates and stores the reader.
+
+    Processes of the parameter server job only serve the variables, see `join`.
+    """
+
+    def __init__(self, ps_hosts: Sequence[str], worker_hosts: Sequence[str], job_name: str = 'worker',
+                 task_index: int = 0, sync_replicas: bool = True, num_threads: int = None):
+        """
+        Args:
+            ps_hosts: host:port addresses of the parameter servers.
+            worker_hosts: host:port addresses of the workers.
+            job_name: job of this process, 'ps' or 'worker'.
+            task_index: index of this process among the hosts of its job.
+            sync_replicas: whether gradients of all workers are averaged for each update.
+            num_threads: number of threads for running ops in this process, see `session_config`.
+        """
+        if job_name not in ('ps', 'worker'):
+            raise ValueError('Unknown job: {}'.format(job_name))
+        if not ps_hosts:
+            raise ValueError('Data-parallel training of TensorFlow readers requires parameter servers (ps_hosts)')
+        self.spec = tf.train.ClusterSpec({'ps': list(ps_hosts), 'worker': list(worker_hosts)})
+        self.job_name = job_name
+        self.task_index = task_index
+        self.sync_replicas = sync_replicas
+        self.session_config = session_config(num_threads)
+        self.server = tf.train.Server(self.spec, job_name=job_name, task_index=task_index,
+                                      config=self.session_config)
+        self._sync_optimizer = None
+        self._coordinator = None
+
+    @staticmethod
+    def from_config(config: Mapping) -> 'TFCluster':
+        """Returns the cluster given by the `ps_hosts`, `worker_hosts`, `job_name`, `task_index`, `sync_replicas` and
+        `num_threads` options of the configuration, or None if no workers are configured."""
+        worker_hosts = parse_hosts(config.get('worker_hosts'))
+        if not worker_hosts:
+            return None
+        return TFCluster(parse_hosts(config.get('ps_hosts')), worker_hosts, config.get('job_name') or 'worker',
+                         config.get('task_index') or 0, config.get('sync_replicas', True), config.get('num_threads'))
+
+    @property
+    def num_workers(self) -> int:
+        return self.spec.num_tasks('worker')
+
+    @property
+    def is_chief(self) -> bool:
+        return self.job_name == 'worker' and self.task_index == 0
+
+    def join(self):
+        """Serves variables to the workers, which blocks forever."""
+        self.server.join()
+
+    def device_setter(self):
+        """Device function under which workers create the graph, placing variables on the parameter servers."""
+        return tf.train.replica_device_setter(
+            worker_device='/job:worker/task:{}'.format(self.task_index), cluster=self.spec)
+
+    def join_reader(self, reader: TFReader):
+        """Makes the reader of this worker run its model in a session of the cluster. Must be called before the
+        reader is set up."""
+        if reader._is_setup:
+            raise RuntimeError('Reader must join the cluster before it is set up')
+        reader.model_module.tf_session.close()
+        reader.model_module.tf_session = tf.Session(self.server.target, config=self.session_config)
+        reader.model_module.is_chief = self.is_chief
+
+    def shard(self, training_set: Sequence) -> Sequence:
+        """Returns the shard of the training set of this worker."""
+        return shard(training_set, self.num_workers, self.task_index)
+
+    def optimizer(self, optimizer: tf.train.Optimizer) -> tf.train.Optimizer:
+        """Returns the optimizer that workers use to update the shared variables."""
+        if not self.sync_replicas:
+            return optimizer
+        self._sync_optimizer = tf.train.SyncReplicasOptimizer(
+            optimizer, replicas_to_aggregate=self.num_workers, total_num_replicas=self.num_workers)
+        return self._sync_optimizer
+
+    def start(self, session: tf.Session, variables: Sequence[tf.Variable]):
+        """Prepares training once the training ops are created. The chief initializes the given variables (the
+        model variables are initialized when the model module is set up), the other workers wait until all variables
+        are initialized. With synchronous updates, the chief then starts aggregating gradients."""
+        if self.is_chief:
+            session.run([v.initializer for v in variables])
+        else:
+            uninitialized = tf.report_uninitialized_variables(tf.global_variables())
+            while session.run(uninitialized).size > 0:
+                logger.info("Waiting for the chief to initialize variables...")
+                time.sleep(1.0)
+        if self._sync_optimizer is None:
+            return
+        if self.is_chief:
+            init_tokens_op = self._sync_optimizer.get_init_tokens_op()
+            session.run(self._sync_optimizer.chief_init_op)
+            session.run(init_tokens_op)
+            self._coordinator = tf.train.Coordinator()
+            self._sync_optimizer.get_chief_queue_runner().create_threads(
+                session, coord=self._coordinator, daemon=True, start=True)
+        else:
+            session.run(self._sync_optimizer.local_step_init_op)
@@ -1,17 +1,21 @@
 import logging
 import sys
 from abc import abstractmethod
-from typing import Mapping, List, Iterable, Tuple
+from typing import Mapping, List, Iterable, Tuple, Sequence
 
 import numpy as np
 import torch
+import torch.distributed as dist
 from torch import nn
+from torch.autograd import Variable
 
 from jack.core import ModelModule, SharedResources, TensorPort
 from jack.core import reader
 from jack.core.data_structures import Answer
 from jack.core.data_structures import QASetting
 from jack.core.tensorport import Ports
+from jack.util.batch import BatchPrefetcher, GeneratorWithRestart
+from jack.util.distributed import parse_hosts, shard
 
 logger = reader.logger
 
@@ -109,7 +113,7 @@ class PyTorchReader(reader.JTReader):
 
     def train(self, optimizer,
               training_set: Iterable[Tuple[QASetting, List[Answer]]],
-              batch_size: int, max_epochs=10, hooks=tuple(), **kwargs):
+              batch_size: int, max_epochs=10, hooks=tuple(), cluster=None, **kwargs):
         """This method trains the reader (and changes its state).
 
         Args:
@@ -118,23 +122,43 @@ class PyTorchReader(reader.JTReader):
             batch_size: size of training batches
             max_epochs: maximum number of epochs
             hooks: TrainingHook implementations that are called after epochs and batches
+            cluster: `TorchCluster` of data-parallel training, the reader then trains on the shard of the training
+                set of its rank
         """
         logger.info("Setting up data and model...")
         if not self._is_setup:
             # First setup shared resources, e.g., vocabulary. This depends on the input module.
             self.setup_from_data(training_set, is_training=True)
-        batches = self.input_module.batch_generator(training_set, batch_size, is_eval=False)
+        p_module = self.model_module.prediction_module
+        l_module = self.model_module.loss_module
+        if cluster is not None:
+            if self.shared_resources.config.get('max_batch_tokens'):
+                # the number of batches would differ between ranks, which then wait for each other forever
+                raise ValueError('Data-parallel training requires batches of batch_size instances, unset '
+                                 'max_batch_tokens')
+            # vocabularies are built from the whole training set, so they are the same for all ranks
+            training_set = cluster.shard(training_set)
+            params = cluster.trainable_parameters(p_module, l_module)
+            cluster.broadcast_parameters(params)
+        input_batches = self.input_module.batch_generator(training_set, batch_size, is_eval=False)
         logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
         loss_idx = self.model_module.training_output_ports.index(Ports.loss)
 
+        def to_torch(batch):
+            for p, v in batch.items():
+                batch[p] = p.create_torch_variable(batch[p], gpu=torch.cuda.device_count() > 0)
+            return batch
+
+        prefetch_depth = self.shared_resources.config.get('prefetch_depth', 0) or 0
+        if prefetch_depth > 0:
+            # batches are created and converted in the background while the model computes
+            batches = BatchPrefetcher(input_batches, prefetch_depth, transform=to_torch)
+        else:
+            batches = GeneratorWithRestart(lambda: map(to_torch, input_batches))
+
         logger.info("Start training...")
-        p_module = self.model_module.prediction_module
-        l_module = self.model_module.loss_module
         for i in range(1, max_epochs + 1):
             for j, batch in enumerate(batches):
-                for p, v in batch.items():
-                    batch[p] = p.create_torch_variable(batch[p], gpu=torch.cuda.device_count() > 0)
-
                 # zero the parameter gradients
                 optimizer.zero_grad()
                 pred_outputs = p_module.forward(
@@ -144,11 +168,104 @@ class PyTorchReader(reader.JTReader):
                     *(batch[p] for p in self.model_module.training_input_ports))
                 current_loss = train_outputs[loss_idx]
                 current_loss.backward()
+                if cluster is not None:
+                    cluster.broadcast_learning_rates(optimizer)
+                    cluster.average_gradients(params)
                 optimizer.step()
 
-                for hook in hooks:
-                    hook.at_iteration_end(i, current_loss.data[0], set_name='train')
+                if prefetch_depth > 0:
+                    # hooks may use the input module (e.g., for evaluation), which must not create batches meanwhile
+                    with batches.paused():
+                        for hook in hooks:
+                            hook.at_iteration_end(i, current_loss.data[0], set_name='train')
+                else:
+                    for hook in hooks:
+                        hook.at_iteration_end(i, current_loss.data[0], set_name='train')
+
+            if prefetch_depth > 0:
+                batches.log_stats()
 
             # calling post-epoch hooks
             for hook in hooks:
                 hook.at_epoch_end(i)
+
+
+class TorchCluster:
+    """Data-parallel training in several processes (ranks), which train on their own shards of the training set and
+    average their gradients with all-reduce before each update, so that all ranks keep the same parameters. An update
+    is thus computed from one batch per rank. Rank 0, the chief, is expected to be the only one that evaluates and
+    stores the reader; the learning rates of its optimizer, e.g., after decay, are broadcast to the other ranks before
+    each update.
+
+    All ranks must run the same number of updates, which holds for the equally sized shards of `shard` as long as
+    batches have `batch_size` instances, so `PyTorchReader.train` rejects `max_batch_tokens`.
+    """
+
+    def __init__(self, init_method: str, world_size: int, rank: int, backend: str = 'gloo'):
+        """
+        Args:
+            init_method: URL at which the ranks find each other, e.g., "tcp://localhost:2222".
+            world_size: number of ranks.
+            rank: rank of this process.
+            backend: `torch.distributed` backend, gloo works on CPUs.
+        """
+        dist.init_process_group(backend, init_method=init_method, world_size=world_size, rank=rank)
+        self.world_size = world_size
+        self.rank = rank
+
+    @staticmethod
+    def from_config(config: Mapping) -> 'TorchCluster':
+        """Returns the cluster of the `worker_hosts` and `task_index` options of the configuration, whose first worker
+        address serves to initialize the process group, or None if no workers are configured."""
+        worker_hosts = parse_hosts(config.get('worker_hosts'))
+        if not worker_hosts:
+            return None
+        return TorchCluster('tcp://' + worker_hosts[0], len(worker_hosts), config.get('task_index') or 0)
+
+    @property
+    def is_chief(self) -> bool:
+        return self.rank == 0
+
+    def shard(self, training_set: Sequence) -> Sequence:
+        """Returns the shard of the training set of this rank."""
+        return shard(training_set, self.world_size, self.rank)
+
+    @staticmethod
+    def trainable_parameters(*modules: nn.Module) -> List[nn.Parameter]:
+        """Returns the parameters of the modules that require gradients, in the same order on all ranks."""
+        params, seen = [], set()
+        for module in modules:
+            for p in module.parameters():
+                if p.requires_grad and id(p) not in seen:
+                    seen.add(id(p))
+                    params.append(p)
+        return params
+
+    def broadcast_parameters(self, params: Sequence[nn.Parameter]):
+        """Sets the parameters of all ranks to those of rank 0."""
+        for p in params:
+            dist.broadcast(p.data, 0)
+
+    def broadcast_learning_rates(self, optimizer: torch.optim.Optimizer):
+        """Sets the learning rates of the optimizers of all ranks to those of rank 0."""
+        learning_rates = torch.DoubleTensor([group['lr'] for group in optimizer.param_groups])
+        dist.broadcast(learning_rates, 0)
+        for group, lr in zip(optimizer.param_groups, learning_rates.tolist()):
+            group['lr'] = lr
+
+    def average_gradients(self, params: Sequence[nn.Parameter]):
+        """Averages the gradients of the parameters over all ranks, with a single all-reduce of the flattened
+        gradients. Parameters without gradient, e.g., embeddings not used by the batch of this rank, contribute
+        zeros."""
+        grads = [p.grad.data if p.grad is not None else p.data.new(p.data.size()).zero_() for p in params]
+        flat = torch.cat([g.contiguous().view(-1) for g in grads])
+        dist.all_reduce(flat)
+        flat /= self.world_size
+        offset = 0
+        for p, g in zip(params, grads):
+            averaged = flat[offset:offset + g.numel()].view_as(g)
+            offset += g.numel()
+            if p.grad is None:
+                p.grad = Variable(averaged.clone())
+            else:
+                g.copy_(averaged)
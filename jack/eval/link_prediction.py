@@ -7,44 +7,150 @@ import progressbar
 
 from jack.core import QASetting
 from jack.io.load import loaders
+from jack.io.triples import TripleDataset
 
 logger = logging.getLogger(__name__)
 
 
 def evaluate(reader, dataset, batch_size):
-    triples = {tuple(q.question.split()) for q, a in dataset if a[0].text == "True"}
+    conf = reader.shared_resources.config
+    reference_datasets = [loaders[conf['loader']](conf[split]) for split in ['train', 'dev', 'test'] if conf.get(split)]
     entity_set = reader.shared_resources.entity_to_index
 
-    conf = reader.shared_resources.config
-    all_triples = set()
-    if conf.get('train'):
-        all_triples.update(tuple(qa.question.split()) for qa, a in loaders[conf['loader']](conf['train'])
-                           if a[0].text == "True")
-    if conf.get('dev'):
-        all_triples.update(tuple(qa.question.split()) for qa, a in loaders[conf['loader']](conf['dev'])
-                           if a[0].text == "True")
-    if conf.get('test'):
-        all_triples.update(tuple(qa.question.split()) for qa, a in loaders[conf['loader']](conf['test'])
-                           if a[0].text == "True")
-
-    def scoring_function(triples):
-        scores = []
-        for i in range(0, len(triples), batch_size):
-            batch_qas = [
-                QASetting(" ".join(triples[k]))
-                for k in range(i, min(len(triples), (i + batch_size)))]
-            if batch_qas:
-                for a in reader(batch_qas):
-                    scores.append(a.score)
-        return scores
-
-    ranks, filtered_ranks = compute_ranks(scoring_function, triples, entity_set, all_triples)
+    from jack.readers.link_prediction.entity_scores import get_scorer, has_scorer
+    model_module = reader.model_module
+    if has_scorer(getattr(model_module, 'model_name', None)) and hasattr(model_module, 'embeddings'):
+        # score all entities natively with the embedding matrices of the model
+        scorer = get_scorer(model_module.model_name, *model_module.embeddings())
+        predicate_to_index = reader.shared_resources.predicate_to_index
+        ranks, filtered_ranks = compute_ranks_batched(
+            scorer, _true_triple_ids(dataset, entity_set, predicate_to_index), len(entity_set),
+            np.concatenate([np.zeros([0, 3], dtype=np.int32)] +
+                           [_true_triple_ids(d, entity_set, predicate_to_index) for d in reference_datasets]),
+            batch_size)
+    else:
+        triples = _true_triples(dataset)
+        all_triples = set()
+        for d in reference_datasets:
+            all_triples.update(_true_triples(d))
+
+        def scoring_function(triples):
+            scores = []
+            for i in range(0, len(triples), batch_size):
+                batch_qas = [
+                    QASetting(" ".join(triples[k]))
+                    for k in range(i, min(len(triples), (i + batch_size)))]
+                if batch_qas:
+                    for a in reader(batch_qas):
+                        scores.append(a.score)
+            return scores
+
+        ranks, filtered_ranks = compute_ranks(scoring_function, triples, entity_set, all_triples)
     results = dict()
     results['Unfiltered Results'] = ranking_summary(ranks)
     results['Filtered Results'] = ranking_summary(filtered_ranks)
     return results
 
 
+def _true_triples(dataset):
+    return {tuple(q.question.split()) for q, a in dataset if a[0].text == "True"}
+
+
+def _true_triple_ids(dataset, entity_to_index, predicate_to_index) -> np.ndarray:
+    """Distinct true triples of the dataset as ids; those of a `TripleDataset` are taken from its id array directly."""
+    if isinstance(dataset, TripleDataset):
+        distinct = TripleDataset(np.unique(dataset.triples, axis=0), dataset.entities, dataset.predicates)
+        return distinct.to_ids(entity_to_index, predicate_to_index)
+    return triples_to_ids(sorted(_true_triples(dataset)), entity_to_index, predicate_to_index)
+
+
+def triples_to_ids(triples, entity_to_index, predicate_to_index) -> np.ndarray:
+    """Maps (subject, predicate, object) string triples to an int64 array of shape (len(triples), 3). Unknown entities
+    are mapped to `len(entity_to_index)`, as in `KnowledgeGraphEmbeddingInputModule`."""
+    unknown = len(entity_to_index)
+    ids = np.zeros([len(triples), 3], dtype=np.int64)
+    for i, (s, p, o) in enumerate(triples):
+        ids[i] = entity_to_index.get(s, unknown), predicate_to_index[p], entity_to_index.get(o, unknown)
+    return ids
+
+
+def compute_ranks_batched(scorer, triples: np.ndarray, nb_entities: int,
+                          true_triples: np.ndarray = None, batch_size: int = 1000):
+    """Ranks the subject and object of each triple among all entities, like `compute_ranks`, but scores all entities
+    of a batch of (?, p, o) and (s, p, ?) queries with one matrix operation of the scorer, and filters true triples
+    by precomputed index arrays.
+
+    Args:
+        scorer: `jack.readers.link_prediction.entity_scores.EntityScorer` that scores triples and all entities for
+            queries.
+        triples: (nb_triples, 3) array of (subject, predicate, object) ids to rank.
+        nb_entities: entities with ids `0..nb_entities - 1` are ranked, larger ids denote unknown entities.
+        true_triples: (nb_true_triples, 3) array of known true triples, which are not counted when they are ranked
+            above a triple in the filtered ranks.
+        batch_size: number of triples ranked at once.
+
+    Returns:
+        (subject ranks, object ranks), (filtered subject ranks, filtered object ranks). The rank of a triple is 1 plus
+        the number of other triples with a strictly higher score.
+    """
+    triples = np.asarray(triples, dtype=np.int64).reshape([-1, 3])
+    if true_triples is None:
+        true_triples = np.zeros([0, 3], dtype=np.int64)
+    true_triples = np.asarray(true_triples, dtype=np.int64).reshape([-1, 3])
+    true_triples = true_triples[(true_triples[:, 0] < nb_entities) & (true_triples[:, 2] < nb_entities)]
+    nb_predicates = int(max(triples[:, 1].max(initial=0), true_triples[:, 1].max(initial=0))) + 1
+    # true subjects per (predicate, object) and true objects per (subject, predicate)
+    subject_filter = _FilterIndex(true_triples[:, 2] * nb_predicates + true_triples[:, 1], true_triples[:, 0])
+    object_filter = _FilterIndex(true_triples[:, 0] * nb_predicates + true_triples[:, 1], true_triples[:, 2])
+
+    ranks = [[], []]
+    filtered_ranks = [[], []]
+    for start in range(0, len(triples), batch_size):
+        s, p, o = triples[start:start + batch_size].T
+        for side, (scores, targets, filter_index, keys) in enumerate([
+            (scorer.score_subjects(p, o), s, subject_filter, o * nb_predicates + p),
+            (scorer.score_objects(s, p), o, object_filter, s * nb_predicates + p)
+        ]):
+            scores = scores[:, :nb_entities]
+            rows = np.arange(len(targets))
+            known = targets < nb_entities
+            # scores of known targets are taken from the same computation as the scores of the other entities
+            target_scores = np.empty([len(targets)], dtype=scores.dtype)
+            target_scores[known] = scores[rows[known], targets[known]]
+            if not known.all():
+                target_scores[~known] = scorer.score(s[~known], p[~known], o[~known])
+            ranks[side].extend(1 + (scores > target_scores[:, None]).sum(axis=1))
+            filter_rows, filter_entities = filter_index.lookup(keys)
+            scores[filter_rows, filter_entities] = - np.inf
+            filtered_ranks[side].extend(1 + (scores > target_scores[:, None]).sum(axis=1))
+
+    return (ranks[0], ranks[1]), (filtered_ranks[0], filtered_ranks[1])
+
+
+class _FilterIndex:
+    """Maps integer keys to the sorted values they occur with, stored as flat arrays of unique keys, offsets and
+    values."""
+
+    def __init__(self, keys: np.ndarray, values: np.ndarray):
+        order = np.lexsort((values, keys))
+        keys, self.values = keys[order], values[order]
+        self.keys, starts = np.unique(keys, return_index=True)
+        self.offsets = np.append(starts, len(keys))
+
+    def lookup(self, keys: np.ndarray):
+        """Returns (row, value) index arrays of all values of each of the given keys."""
+        if len(self.keys) == 0:
+            return np.zeros([0], dtype=np.int64), np.zeros([0], dtype=self.values.dtype)
+        positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = self.keys[positions] == keys
+        starts = np.where(found, self.offsets[positions], 0)
+        lengths = np.where(found, self.offsets[positions + 1] - starts, 0)
+        rows = np.repeat(np.arange(len(keys)), lengths)
+        # position of each value within the values of its key
+        within = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return rows, self.values[np.repeat(starts, lengths) + within]
+
+
 def compute_ranks(scoring_function, triples, entity_set, true_triples=None):
     subject_ranks, object_ranks = [], []
     subject_ranks_filtered, object_ranks_filtered = [], []
@@ -10,7 +10,7 @@ __candidate_labels = ['entailment', 'neutral', 'contradiction']
 __candidates = [{'text': cl} for cl in __candidate_labels]
 
 
-def convert_snli(snli_file_jsonl):
+def convert_snli(snli_file_jsonl, lazy=False):
     """ io SNLI files into jack format.
     Data source: http://nlp.stanford.edu/projects/snli/snli_1.0.zip
     Files to be converted: snli_1.0_dev.jsonl, snli_1.0_train.jsonl, snli_1.0_test.jsonl
@@ -21,14 +21,19 @@ def convert_snli(snli_file_jsonl):
         - question = the hypothesis = 'sentence2' in original SNLI data
     Notes:
         - instances with gold labels '-' are removed from the corpus
+        - if `lazy` is true, instances are a generator that reads the file line by line instead of a list
     """
-    with open(snli_file_jsonl, 'r') as f:
-        data = [__convert_snli_instance(json.loads(line.strip())) for line in f.readlines()]
-
-        return {'meta': 'SNLI',
-                'globals': {'candidates': __candidates},
-                'instances': [d for d in data if d]  # filter out invalid ones
-                }
+    def read_instances():
+        with open(snli_file_jsonl, 'r') as f:
+            for line in f:
+                d = __convert_snli_instance(json.loads(line.strip()))
+                if d:  # filter out invalid ones
+                    yield d
+
+    return {'meta': 'SNLI',
+            'globals': {'candidates': __candidates},
+            'instances': read_instances() if lazy else list(read_instances())
+            }
 
 
 def __convert_snli_instance(instance):
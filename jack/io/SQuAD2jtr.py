@@ -13,6 +13,8 @@ JTR download script: data/SQuAD/download.sh
 import argparse
 import json
 
+from jack.io.json_stream import stream_json_array
+
 
 def create_snippet(file_path):
     """
@@ -53,12 +55,13 @@ def create_jtr_snippet(jtr_dict, num_instances=1):
     return out
 
 
-def convert_squad(file_path):
+def convert_squad(file_path, lazy=False):
     """
     Converts SQuAD dataset to jack format.
 
     Args:
         file_path: path to the SQuAD json file (train-v1.1.json and dev-v1.1.json in data/SQuAD/)
+        lazy: if true, instances are a generator that parses the file incrementally instead of a list
 
     Returns: dictionary in jack format
     """
@@ -68,21 +71,18 @@ def convert_squad(file_path):
     else:
         filename = file_path
     # data
-    question_sets = []
-    with open(file_path) as data_file:
-        data = json.load(data_file)['data']
-        for article in data:
-            for paragraph in article['paragraphs']:
-                qa_set = {
-                    'support': [__parse_support(paragraph)],
-                    'questions': [__parse_question(qa_dict) for qa_dict in paragraph['qas']]
-                }
-                question_sets.append(qa_set)
+    _, data = stream_json_array(file_path, 'data')
+    question_sets = (
+        {
+            'support': [__parse_support(paragraph)],
+            'questions': [__parse_question(qa_dict) for qa_dict in paragraph['qas']]
+        }
+        for article in data for paragraph in article['paragraphs'])
     corpus_dict = {
         'meta': {
             'source': filename
         },
-        'instances': question_sets
+        'instances': question_sets if lazy else list(question_sets)
     }
     return corpus_dict
 
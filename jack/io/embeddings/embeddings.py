@@ -1,10 +1,21 @@
 # -*- coding: utf-8 -*-
 
+import json
+import logging
+import os
+import shutil
+import tempfile
 import zipfile
+from typing import List, Tuple
+
+import numpy as np
 
 from jack.io.embeddings.fasttext import load_fasttext
 from jack.io.embeddings.glove import load_glove
 from jack.io.embeddings.word_to_vec import load_word2vec
+from jack.util.ann import search
+
+logger = logging.getLogger(__name__)
 
 
 class Embeddings:
@@ -21,6 +32,9 @@ class Embeddings:
         self.vocabulary = vocabulary
         self.lookup = lookup
         self.emb_format = emb_format
+        # optional `jack.util.ann.IVFIndex` of the lookup matrix, used by `nearest_neighbours`
+        self.index = None
+        self._words = None
 
     def get(self, word, default=None):
         _id = None
@@ -36,39 +50,169 @@ class Embeddings:
     def shape(self):
         return self.lookup.shape
 
+    def word(self, i: int) -> str:
+        """The word of row `i` of the lookup matrix."""
+        if self._words is None:
+            self._words = [None] * self.shape[0]
+            for w, j in self.vocabulary.items():
+                self._words[j] = w
+        return self._words[i]
+
+    def nearest_neighbours(self, queries, k: int = 10, metric: str = 'cosine', nprobe: int = 8,
+                           rerank: int = 0) -> List[List[Tuple[str, float]]]:
+        """Finds the words whose embeddings are most similar to the queries, approximately with `self.index` if the
+        embeddings have an index (e.g., built by `jack.io.embeddings.memory_map.build_ann_index`), otherwise exactly.
+
+        Args:
+            queries: words, or a (nb_queries, dim) matrix of vectors.
+            k: number of words per query.
+            metric: see `jack.util.ann.similarities`, only used for exact search; the index has its own metric.
+            nprobe: number of partitions of the index searched per query.
+            rerank: see `jack.util.ann.IVFIndex.search`.
+
+        Returns:
+            for each query, up to k (word, similarity) pairs sorted by decreasing similarity. Words without embedding
+            have no neighbours.
+        """
+        known = np.ones([len(queries)], dtype=bool)
+        if len(queries) and isinstance(queries[0], str):
+            known = np.array([self.vocabulary.get(w) is not None for w in queries], dtype=bool)
+            vectors = np.zeros([len(queries), self.shape[1]], dtype=np.float32)
+            if known.any():
+                vectors[known] = self.lookup[[self.vocabulary[w] for w, is_known in zip(queries, known) if is_known]]
+            queries = vectors
+        if self.index is not None:
+            ids, scores = self.index.search(queries, k, nprobe=nprobe, rerank=rerank)
+        else:
+            ids, scores = search(queries, self.lookup, k, metric)
+        return [[(self.word(i), float(score)) for i, score in zip(row_ids, row_scores) if i >= 0] if is_known else []
+                for row_ids, row_scores, is_known in zip(ids, scores, known)]
 
-def load_embeddings(file, typ='glove', **options):
+
+def load_embeddings(file, typ='glove', cache=False, vocab=None, verify_cache=False, **options):
     """
     Loads either GloVe or word2vec embeddings and wraps it into Embeddings
 
     Args:
         file: string, path to a file like "GoogleNews-vectors-negative300.bin.gz" or "glove.42B.300d.zip"
         typ: string, either "word2vec", "glove", "fasttext" or "mem_map"
+        cache: bool, if true, embeddings are converted to the memory map dir format on first load and stored next to
+            `file` (in `file + '.memory_map_dir'`), from where they are loaded as long as `file` does not change.
+        vocab: container of words (e.g., a set), if given only embeddings of these words are loaded into memory and
+            numbered consecutively. Restricted embeddings have no filename, so they are stored with the vocab that uses
+            them.
+        verify_cache: bool, if true, cached embeddings are checked against the checksum stored with them before they
+            are loaded, and converted again if they do not match.
         options: dict, other options.
     Returns:
         Embeddings object, wrapper class around Vocabulary embedding matrix.
     """
     assert typ in {"word2vec", "glove", "fasttext", "memory_map_dir"}, "so far only 'word2vec' and 'glove' foreseen"
 
+    if cache and typ.lower() != "memory_map_dir":
+        if vocab is None:
+            return _load_cached_embeddings(file, typ, verify_cache, **options)
+        elif _is_cached(file, typ, options, verify_cache):
+            return _restrict(load_embeddings(file + '.memory_map_dir', 'memory_map_dir'), vocab)
+
+    if vocab is not None:
+        if typ.lower() == "memory_map_dir":
+            return _restrict(load_embeddings(file, typ), vocab)
+        emb = Embeddings(*_load_embeddings(file, typ, vocab, **options), emb_format=typ)
+        logger.info('Loaded %d embeddings restricted to a vocabulary of %d words.' % (len(emb.vocabulary), len(vocab)))
+        return emb
+
     if typ.lower() == "word2vec":
-        return Embeddings(*load_word2vec(file, **options))
+        return Embeddings(*_load_embeddings(file, typ, **options))
+    elif typ.lower() == "memory_map_dir":
+        from jack.io.embeddings.memory_map import load_memory_map_dir
+        return load_memory_map_dir(file)
+    return Embeddings(*_load_embeddings(file, typ, **options), filename=file, emb_format=typ)
+
+
+def _load_embeddings(file, typ, vocab=None, **options):
+    """Loads the word2idx dict and lookup matrix of word2vec, glove or fasttext embeddings."""
+    if typ.lower() == "word2vec":
+        return load_word2vec(file, vocab=vocab, **options)
 
     elif typ.lower() == "glove":
         if file.endswith('.txt'):
             with open(file, 'rb') as f:
-                return Embeddings(*load_glove(f), filename=file, emb_format=typ)
+                return load_glove(f, vocab=vocab)
         elif file.endswith('.zip'):
             with zipfile.ZipFile(file) as zf:
                 txtfile = file.split('/')[-1][:-4] + '.txt'
                 with zf.open(txtfile, 'r') as f:
-                    return Embeddings(*load_glove(f), filename=file, emb_format=typ)
+                    return load_glove(f, vocab=vocab)
         else:
             raise NotImplementedError
 
     elif typ.lower() == "fasttext":
         with open(file, 'rb') as f:
-            return Embeddings(*load_fasttext(f), filename=file, emb_format=typ)
+            return load_fasttext(f, vocab=vocab)
 
-    elif typ.lower() == "memory_map_dir":
-        from jack.io.embeddings.memory_map import load_memory_map_dir
-        return load_memory_map_dir(file)
+
+def _restrict(emb: Embeddings, vocab) -> Embeddings:
+    """Copies the rows of the words in `vocab` into new, consecutively numbered in-memory embeddings."""
+    rows = sorted((emb.vocabulary[w], w) for w in vocab if w in emb.vocabulary)
+    lookup = np.asarray(emb.lookup[[i for i, _ in rows]], dtype=np.float32).reshape([len(rows), emb.shape[1]])
+    logger.info('Loaded %d embeddings restricted to a vocabulary of %d words.' % (len(rows), len(vocab)))
+    return Embeddings({w: j for j, (_, w) in enumerate(rows)}, lookup, emb_format=emb.emb_format)
+
+
+def _source_info(file, typ, options):
+    stat = os.stat(file)
+    return {'file': os.path.basename(file), 'format': typ, 'size': stat.st_size, 'mtime': stat.st_mtime,
+            'options': options}
+
+
+def _is_cached(file, typ, options, verify=False):
+    from jack.io.embeddings.memory_map import verify_memory_map_dir
+    cache_dir = file + '.memory_map_dir'
+    source_file = os.path.join(cache_dir, 'source.json')
+    if not os.path.exists(source_file):
+        return False
+    with open(source_file) as f:
+        if json.load(f) != _source_info(file, typ, options):
+            return False
+    if verify and not verify_memory_map_dir(cache_dir):
+        logger.warning('Cached embeddings in %s do not match their checksum.' % cache_dir)
+        return False
+    return True
+
+
+def _load_cached_embeddings(file, typ, verify=False, **options):
+    from jack.io.embeddings.memory_map import load_memory_map_dir, save_as_memory_map_dir
+    from jack.io.embeddings.memory_map import save_word2vec_as_memory_map_dir
+    cache_dir = file + '.memory_map_dir'
+    if _is_cached(file, typ, options, verify):
+        logger.info('Loading cached embeddings from %s.' % cache_dir)
+        return load_memory_map_dir(cache_dir)
+    elif os.path.exists(cache_dir):
+        logger.info('Cached embeddings in %s are outdated.' % cache_dir)
+
+    emb = None
+    tmp_dir = None
+    try:
+        tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(file)), prefix='.tmp_memory_map_dir_')
+        if typ.lower() == "word2vec":
+            # vectors are written straight into the memory map
+            save_word2vec_as_memory_map_dir(tmp_dir, file, **options)
+        else:
+            emb = load_embeddings(file, typ, **options)
+            save_as_memory_map_dir(tmp_dir, emb)
+        with open(os.path.join(tmp_dir, 'source.json'), 'w') as f:
+            json.dump(_source_info(file, typ, options), f)
+        if os.path.exists(cache_dir):
+            shutil.rmtree(cache_dir)
+        os.rename(tmp_dir, cache_dir)
+        logger.info('Cached embeddings in %s.' % cache_dir)
+        if emb is None:
+            emb = load_memory_map_dir(cache_dir)
+    except OSError as e:
+        logger.warning('Could not cache embeddings in %s: %s' % (cache_dir, e))
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        if emb is None:
+            emb = load_embeddings(file, typ, **options)
+    return emb
@@ -1,54 +1,169 @@
 # -*- coding: utf-8 -*-
 
+import hashlib
 import json
 import os
+import shutil
 
 import numpy as np
 
 from jack.io.embeddings import Embeddings
+from jack.io.embeddings.quantization import QuantizedMatrix, quantize
+from jack.io.embeddings.word_to_vec import load_word2vec
+from jack.util.ann import IVFIndex
+from jack.util.string_table import StringTable, store_string_table
 
+_ANN_INDEX_DIR = 'ann_index'
 
-def load_memory_map_dir(directory: str) -> Embeddings:
+
+def load_memory_map_dir(directory: str, mode: str = 'r') -> Embeddings:
     """
     Loads embeddings from a memory map directory to allow lazy loading (and reduce the memory usage).
     Args:
-        directory: a file prefix. This function loads two files in the directory: a meta json file with shape information
-        and the vocabulary, and the actual memory map file.
+        directory: a file prefix. This function loads the files in the directory: a meta json file with shape
+        information, the vocabulary as memory-mapped string table (or, for directories written by older versions,
+        as part of the meta file), the actual memory map file and, if present, the nearest neighbour index built by
+        `build_ann_index`.
+        mode: mode of the memory map, by default read-only, so that processes loading the same directory share a single
+        page-cached copy of the vectors and the vocabulary.
 
     Returns:
-        Embeddings object with a lookup matrix that is backed by a memory map.
+        Embeddings object with a lookup matrix and vocabulary that are backed by memory maps. The lookup matrix of
+        float16 or int8 embeddings is a `QuantizedMatrix` that dequantizes rows on access.
 
     """
     meta_file = os.path.join(directory, "meta.json")
-    mem_map_file = os.path.join(directory, "memory_map")
     with open(meta_file, "r") as f:
         meta = json.load(f)
-    shape = tuple(meta['shape'])
-    vocab = meta['vocab']
-    mem_map = np.memmap(mem_map_file, dtype='float32', mode='r+', shape=shape)
+    if 'vocab' in meta:
+        vocab = meta['vocab']
+    else:
+        vocab = StringTable(os.path.join(directory, meta['vocab_table']))
+    mem_map, scales = _open_memory_maps(directory, meta, mode)
+    if mem_map.dtype != np.float32:
+        mem_map = QuantizedMatrix(mem_map, scales)
     result = Embeddings(vocab, mem_map, filename=directory, emb_format="memory_map_dir")
+    if os.path.exists(os.path.join(directory, _ANN_INDEX_DIR)):
+        result.index = IVFIndex.load(os.path.join(directory, _ANN_INDEX_DIR), mem_map)
     return result
 
 
-def save_as_memory_map_dir(directory: str, emb: Embeddings):
+def save_as_memory_map_dir(directory: str, emb: Embeddings, dtype: str = 'float32', block_size=1 << 16):
     """
     Saves the given embeddings as memory map file and corresponding meta data in a directory.
     Args:
-        directory: the directory to store the memory map file in (called `memory_map`) and the meta file (called
-        `meta.json` that stores the shape of the memory map and the actual vocabulary.
+        directory: the directory to store the memory map file in (called `memory_map`), the vocabulary as string table
+        (called `vocab.table`) and the meta file (called `meta.json` that stores the shape, dtype and a checksum of the
+        memory map).
         emb: the embeddings to store.
+        dtype: one of 'float32', 'float16' or 'int8'. For int8, rows are scaled individually and their scales are
+        stored in an additional memory map file (called `scales`).
+        block_size: number of rows that are converted at once.
     """
     if not os.path.exists(directory):
         os.makedirs(directory)
 
-    meta_file = os.path.join(directory, "meta.json")
     mem_map_file = os.path.join(directory, "memory_map")
-    with open(meta_file, "w") as f:
+    mem_map = np.memmap(mem_map_file, dtype=dtype, mode='w+', shape=emb.shape)
+    scales = None
+    if dtype == 'int8':
+        scales = np.memmap(os.path.join(directory, "scales"), dtype='float32', mode='w+', shape=emb.shape[:1])
+    for start in range(0, emb.shape[0], block_size):
+        values, block_scales = quantize(emb.lookup[start:start + block_size], dtype)
+        mem_map[start:start + block_size] = values
+        if scales is not None:
+            scales[start:start + block_size] = block_scales
+    mem_map.flush()
+    if scales is not None:
+        scales.flush()
+    _write_meta(directory, emb.vocabulary, mem_map, scales)
+
+
+def save_word2vec_as_memory_map_dir(directory: str, filename: str, **options):
+    """
+    Converts a word2vec file into a memory map directory, writing the vectors straight into the memory map without
+    holding them in memory.
+    Args:
+        directory: the directory to store the memory map file and meta file in.
+        filename: the word2vec file.
+        options: further options of `load_word2vec`, e.g., `vocab` or `normalise`.
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    vocab, mem_map = load_word2vec(filename, memory_map=os.path.join(directory, "memory_map"), **options)
+    _write_meta(directory, vocab, mem_map)
+
+
+def build_ann_index(directory: str, nb_partitions: int, metric: str = 'cosine', nb_subspaces: int = 0,
+                    **options) -> IVFIndex:
+    """
+    Builds an approximate nearest neighbour index of the embeddings of a memory map directory and stores it in the
+    directory (called `ann_index`), from where `load_memory_map_dir` loads it. An existing index is replaced.
+    Args:
+        directory: the memory map directory.
+        nb_partitions: number of partitions of the index, e.g., about the square root of the number of embeddings.
+        metric: one of `jack.util.ann.METRICS`.
+        nb_subspaces: number of product quantization subspaces, which has to divide the embedding dimension; 0 to
+        search the memory-mapped embeddings directly.
+        options: further options of `IVFIndex.build`.
+
+    Returns:
+        The index.
+    """
+    emb = load_memory_map_dir(directory)
+    index = IVFIndex.build(emb.lookup, nb_partitions, metric, nb_subspaces, **options)
+    index_dir = os.path.join(directory, _ANN_INDEX_DIR)
+    if os.path.exists(index_dir):
+        shutil.rmtree(index_dir)
+    index.store(index_dir)
+    return index
+
+
+def _write_meta(directory, vocab, mem_map, scales=None):
+    # an index of previous embeddings in the directory is outdated
+    shutil.rmtree(os.path.join(directory, _ANN_INDEX_DIR), ignore_errors=True)
+    store_string_table(os.path.join(directory, "vocab.table"), vocab)
+    checksum = _checksum(mem_map, scales)
+    # meta data is written last, so directories of interrupted conversions are incomplete
+    with open(os.path.join(directory, "meta.json"), "w") as f:
         json.dump({
-            "vocab": emb.vocabulary,
-            "shape": emb.shape
+            "vocab_table": "vocab.table",
+            "shape": mem_map.shape,
+            "dtype": mem_map.dtype.name,
+            "checksum": checksum
         }, f)
-    mem_map = np.memmap(mem_map_file, dtype='float32', mode='w+', shape=emb.shape)
-    mem_map[:] = emb.lookup[:]
-    mem_map.flush()
-    del mem_map
+
+
+def _open_memory_maps(directory, meta, mode='r'):
+    shape = tuple(meta['shape'])
+    dtype = meta.get('dtype', 'float32')
+    mem_map = np.memmap(os.path.join(directory, "memory_map"), dtype=dtype, mode=mode, shape=shape)
+    scales = None
+    if dtype == 'int8':
+        scales = np.memmap(os.path.join(directory, "scales"), dtype='float32', mode=mode, shape=shape[:1])
+    return mem_map, scales
+
+
+def verify_memory_map_dir(directory: str) -> bool:
+    """
+    Checks the memory map of a memory map directory against the checksum stored in its meta data.
+    Args:
+        directory: the memory map directory.
+
+    Returns:
+        False if the checksum does not match, True otherwise (also for directories without checksum).
+    """
+    with open(os.path.join(directory, "meta.json"), "r") as f:
+        meta = json.load(f)
+    if 'checksum' not in meta:
+        return True
+    return _checksum(*_open_memory_maps(directory, meta)) == meta['checksum']
+
+
+def _checksum(matrix, scales=None, block_size=1 << 16) -> str:
+    h = hashlib.sha1()
+    for start in range(0, matrix.shape[0], block_size):
+        h.update(np.ascontiguousarray(matrix[start:start + block_size]).tobytes())
+    if scales is not None:
+        h.update(np.ascontiguousarray(scales).tobytes())
+    return h.hexdigest()
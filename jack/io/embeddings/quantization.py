@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from jack.io.embeddings.embeddings import Embeddings
+
+DTYPES = ('float32', 'float16', 'int8')
+
+
+def quantize(matrix, dtype: str):
+    """Quantizes the rows of a float matrix.
+
+    Args:
+        matrix: matrix of shape [num_rows, dim].
+        dtype: one of 'float32', 'float16' or 'int8'. For int8, each row is scaled by its maximum absolute value
+            divided by 127.
+    Returns:
+        values (matrix of `dtype`), scales (float32 vector of length num_rows for int8, None otherwise)
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if dtype != 'int8':
+        return matrix.astype(dtype), None
+    scales = np.abs(matrix).max(axis=1) / 127.0 if matrix.size else np.zeros([matrix.shape[0]], dtype=np.float32)
+    scales[scales == 0.0] = 1.0
+    values = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return values, scales.astype(np.float32)
+
+
+def quantize_embeddings(emb: Embeddings, dtype: str, block_size=1 << 16) -> Embeddings:
+    """Returns in-memory embeddings whose lookup matrix is quantized to `dtype`."""
+    values = np.empty(emb.shape, dtype=dtype)
+    scales = np.empty([emb.shape[0]], dtype=np.float32) if dtype == 'int8' else None
+    for start in range(0, emb.shape[0], block_size):
+        block_values, block_scales = quantize(emb.lookup[start:start + block_size], dtype)
+        values[start:start + block_size] = block_values
+        if scales is not None:
+            scales[start:start + block_size] = block_scales
+    lookup = values if dtype == 'float32' else QuantizedMatrix(values, scales)
+    return Embeddings(emb.vocabulary, lookup, emb_format=emb.emb_format)
+
+
+class QuantizedMatrix:
+    """Read-only float16 or int8 matrix (with float32 scales per row for int8), whose rows are dequantized to float32
+    on access. Supports indexing of rows (e.g., `m[i]`, `m[start:end]` or `m[ids]`) and `np.take` along the first axis,
+    so it can be used as lookup matrix of `Embeddings` and with `jack.util.map.gather_embeddings`."""
+
+    dtype = np.dtype(np.float32)
+    ndim = 2
+
+    def __init__(self, values, scales=None):
+        """
+        Args:
+            values: matrix of quantized values (may be a memory map).
+            scales: vector of row scales (may be a memory map), None if rows are not scaled.
+        """
+        self.values = values
+        self.scales = scales
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    def __getitem__(self, key):
+        rows = np.asarray(self.values[key], dtype=np.float32)
+        if self.scales is not None:
+            rows *= np.asarray(self.scales[key], dtype=np.float32)[..., None]
+        return rows
+
+    def take(self, indices, axis=0, out=None, mode='raise'):
+        if axis != 0:
+            raise ValueError('QuantizedMatrix only supports taking rows.')
+        rows = self[np.asarray(indices)]
+        if out is not None:
+            out[...] = rows
+            return out
+        return rows
+
+    def __array__(self, dtype=None, copy=None):
+        rows = self[:]
+        return rows if dtype is None else rows.astype(dtype)
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def load_text_vectors(stream, dim=None, vocab=None, num_rows=None, chunk_size=1 << 24):
+    """Loads embeddings stored as text, one word and its vector per line, into a float32 matrix.
+
+    Lines are read in chunks of roughly `chunk_size` bytes, and all vectors of a chunk are parsed at once directly
+    into float32 by numpy's text parser. Duplicate words keep their first vector.
+
+    Args:
+        stream: An opened binary filestream, positioned at the first vector (i.e., after the header, if any).
+        dim (int=None): Dimension of the vectors, inferred from the first line if not given.
+        vocab (container=None): If given, only words contained in it are loaded.
+        num_rows (int=None): Expected number of rows, used to preallocate the matrix.
+        chunk_size (int): Approximate number of bytes read at once.
+    Returns:
+        word2idx (dict), lookup (matrix): The dict is a word2idx dict and the float32 lookup matrix contains the
+        vectors of the words.
+    """
+    word2idx = {}
+    lookup = None
+    n = 0
+    while True:
+        lines = stream.readlines(chunk_size)
+        if not lines:
+            break
+        if dim is None:
+            dim = len(lines[0].split()) - 1
+        if lookup is None:
+            lookup = np.empty([num_rows or 500000, dim], dtype=np.float32)
+        words, vectors = _parse_lines(lines, dim)
+        keep = []
+        for i, word in enumerate(words):
+            if (vocab is None or word in vocab) and word not in word2idx:
+                word2idx[word] = n + len(keep)
+                keep.append(i)
+        if n + len(keep) > lookup.shape[0]:
+            lookup.resize([max(2 * lookup.shape[0], n + len(keep)), dim], refcheck=False)
+        lookup[n:n + len(keep)] = vectors if len(keep) == len(words) else vectors[keep]
+        n += len(keep)
+    if lookup is None:
+        lookup = np.empty([0, dim or 0], dtype=np.float32)
+    lookup.resize([n, lookup.shape[1]], refcheck=False)
+    return word2idx, lookup
+
+
+def _parse_lines(lines, dim):
+    """Parses lines of words and vectors, returns the list of words and a float32 matrix of vectors."""
+    words, vectors = [], []
+    for line in lines:
+        word, vector = line.rstrip().split(maxsplit=1)
+        words.append(word)
+        vectors.append(vector)
+    try:
+        parsed = np.loadtxt(vectors, dtype=np.float32, delimiter=' ', comments=None, ndmin=2)
+    except ValueError:
+        parsed = None
+    if parsed is None or parsed.shape != (len(lines), dim):
+        # e.g., words containing whitespace, parse line by line from the right
+        words, parsed = [], []
+        for line in lines:
+            parts = line.rstrip().rsplit(maxsplit=dim)
+            if len(parts) != dim + 1:
+                raise ValueError('Malformed embedding line: %s' % line[:100])
+            words.append(parts[0])
+            parsed.append(np.array(parts[1:], dtype=np.float32))
+        parsed = np.array(parsed, dtype=np.float32)
+    return [w.decode('utf-8') for w in words], parsed.reshape([len(lines), dim])
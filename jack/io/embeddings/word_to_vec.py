@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 
 import gzip
+import os
+
 import numpy as np
 
 import logging
@@ -8,49 +10,85 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-def load_word2vec(filename, vocab=None, normalise=True):
+def load_word2vec(filename, vocab=None, normalise=True, memory_map=None, block_size=1 << 24):
     """Loads a word2vec file and merges existing vocabulary.
 
+    The (decompressed) file is read in blocks of `block_size` bytes. Word boundaries are scanned within each block and
+    the vectors of all words of a block are copied at once into a preallocated float32 matrix.
+
     Args:
-        filename (string): Path to the word2vec file.
-        vocab (Vocabulary=None): Existing vocabulary to be merged.
+        filename (string): Path to the word2vec file, gzipped if it ends with `.gz`.
+        vocab (container=None): If given, only words contained in it are loaded.
         normalise (bool=True): If the word embeddings should be unit
                   normalized or not.
+        memory_map (string=None): If given, vectors are written into a new memory map file at this path instead of
+                  into memory, and the returned lookup matrix is backed by this file.
+        block_size (int): Number of bytes read at once.
     Returns:
         return_vocab (dict), lookup (matrix): The dict is a word2idx dict and
         the lookup matrix is the matrix of embedding vectors.
     """
     logger.info("Loading word2vec vectors ..")
-    with gzip.open(filename, 'rb') as f:
+    with (gzip.open(filename, 'rb') if filename.endswith('.gz') else open(filename, 'rb')) as f:
         vec_n, vec_size = map(int, f.readline().split())
         byte_size = vec_size * 4
-        lookup = np.empty([vocab.get_size() if vocab is not None else vec_n, vec_size], dtype=np.float32)
+        num_rows = min(len(vocab), vec_n) if vocab is not None else vec_n
+        if memory_map is not None:
+            lookup = np.memmap(memory_map, dtype=np.float32, mode='w+', shape=(num_rows, vec_size))
+        else:
+            lookup = np.empty([num_rows, vec_size], dtype=np.float32)
         word2idx = {}
         idx = 0
-        for n in range(vec_n):
-            word = b''
-            while True:
-                c = f.read(1)
-                if c == b' ':
+        n = 0
+        buf = b''
+        eof = False
+        while n < vec_n:
+            chunk = f.read(block_size)
+            eof = not chunk
+            buf += chunk
+            view = memoryview(buf)
+            offsets = []
+            pos = 0
+            while n < vec_n:
+                # words of files written by the original word2vec tool are preceded by a newline
+                while buf[pos:pos + 1] == b'\n':
+                    pos += 1
+                end = buf.find(b' ', pos)
+                if end < 0 or end + 1 + byte_size > len(buf):
                     break
-                else:
-                    word += c
-
-            word = word.decode('utf-8')
-            vector = np.fromstring(f.read(byte_size), dtype=np.float32)
-            if vocab is None or vocab.contains_word(word):
-                word2idx[word] = idx
-                lookup[idx] = _normalise(vector) if normalise else vector
-                idx += 1
+                word = buf[pos:end].decode('utf-8')
+                if (vocab is None or word in vocab) and word not in word2idx:
+                    word2idx[word] = idx + len(offsets)
+                    offsets.append(end + 1)
+                pos = end + 1 + byte_size
+                n += 1
+            if offsets:
+                vectors = np.frombuffer(b''.join([view[o:o + byte_size] for o in offsets]), dtype=np.float32)
+                vectors = vectors.reshape([len(offsets), vec_size])
+                if normalise:
+                    vectors = _normalise(vectors)
+                lookup[idx:idx + len(offsets)] = vectors
+                idx += len(offsets)
+            view.release()
+            buf = buf[pos:]
+            if eof and n < vec_n:
+                raise ValueError('Unexpected end of word2vec file %s after %d of %d vectors.' % (filename, n, vec_n))
 
-    lookup.resize([idx, vec_size])
+    if memory_map is not None:
+        lookup.flush()
+        if idx < num_rows:
+            del lookup
+            os.truncate(memory_map, idx * byte_size)
+            lookup = np.memmap(memory_map, dtype=np.float32, mode='r+', shape=(idx, vec_size))
+    else:
+        lookup.resize([idx, vec_size])
     logger.info('Loading word2vec vectors completed.')
     return word2idx, lookup
 
 
 def _normalise(x):
-    """Unit normalize x with L2 norm."""
-    return (1.0 / np.linalg.norm(x, ord=2)) * x
+    """Unit normalize the rows of x with L2 norm."""
+    return (1.0 / np.linalg.norm(x, ord=2, axis=-1, keepdims=True)) * x
 
 
 def get_word2vec_vocabulary(fname):
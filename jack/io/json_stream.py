@@ -0,0 +1,121 @@
+"""Incremental parsing of large JSON files."""
+
+import json
+import re
+from typing import Tuple, Iterator, Any
+
+_WHITESPACE = re.compile(r'\s*')
+
+
+def stream_json_array(path: str, key: str, chunk_size: int = 1 << 20) -> Tuple[dict, Iterator[Any]]:
+    """Incrementally parses a JSON file consisting of a single object, streaming the array stored under `key`.
+
+    Only the elements of the array that are currently consumed are held in memory, so arbitrarily large files can be
+    read with bounded memory. Top-level entries that precede the array are parsed eagerly, entries following it are
+    added to the returned dict once the generator is exhausted.
+
+    Args:
+        path: path of the JSON file.
+        key: top-level key of the array to stream.
+        chunk_size: number of characters read from file at once.
+
+    Returns:
+        A dict of the top-level entries preceding `key` (and following it, after the generator is exhausted), and a
+        generator over the elements of the array. The generator is empty if the file has no entry `key`.
+    """
+    reader = _JSONReader(open(path), chunk_size)
+    header = dict()
+    found = False
+    try:
+        reader.expect('{')
+        while reader.peek() not in ('}', ''):
+            k = reader.decode()
+            reader.expect(':')
+            if k == key:
+                reader.expect('[')
+                found = True
+                break
+            header[k] = reader.decode()
+            if reader.peek() == ',':
+                reader.expect(',')
+    except BaseException:
+        reader.close()
+        raise
+    if not found:
+        reader.close()
+
+    def elements():
+        with reader:
+            while reader.peek() != ']':
+                yield reader.decode()
+                if reader.peek() == ',':
+                    reader.expect(',')
+            reader.expect(']')
+            while reader.peek() == ',':
+                reader.expect(',')
+                k = reader.decode()
+                reader.expect(':')
+                header[k] = reader.decode()
+
+    return header, elements() if found else iter(())
+
+
+class _JSONReader:
+    """Decodes consecutive JSON values from a text file while keeping only a small window of it in memory."""
+
+    def __init__(self, f, chunk_size: int):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self._f.close()
+
+    def _fill(self):
+        # read at least as much as is buffered, which keeps re-decoding of very large values linear overall
+        chunk = self._f.read(max(self._chunk_size, len(self._buf) - self._pos))
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        self._eof = not chunk
+
+    def _skip_whitespace(self):
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf) or self._eof:
+                return
+            self._fill()
+
+    def peek(self) -> str:
+        """Returns the next non-whitespace character, or '' at the end of the file."""
+        self._skip_whitespace()
+        return self._buf[self._pos] if self._pos < len(self._buf) else ''
+
+    def expect(self, c: str):
+        if self.peek() != c:
+            raise ValueError("Expected '%s' at character %d of the buffered input, found '%s'." %
+                             (c, self._pos, self.peek()))
+        self._pos += 1
+
+    def decode(self) -> Any:
+        """Decodes the next JSON value."""
+        while True:
+            self._skip_whitespace()
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                # a value that ends with the buffer (e.g., a number) might continue in the next chunk
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
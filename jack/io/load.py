@@ -1,14 +1,31 @@
 """Implementation of loaders for common datasets."""
 
 import json
+import os
 
 from jack.core.data_structures import *
 from jack.io.SNLI2jtr import convert_snli
 from jack.io.SQuAD2jtr import convert_squad
+from jack.io.json_stream import stream_json_array
+from jack.io.triples import TripleDataset, load_triples as _load_triples
 
 loaders = dict()
 
 
+class LoadedDataset(list):
+    """List of input-answer pairs loaded from a file. Its `source` identifies the file (path, modification time and
+    size) and how it was loaded, which lets input modules fingerprint the dataset without hashing its content."""
+
+    def __init__(self, instances, source):
+        super().__init__(instances)
+        self.source = source
+
+
+def _loaded(loader, path, max_count, instances):
+    stat = os.stat(path)
+    return LoadedDataset(instances, (loader, os.path.abspath(path), stat.st_mtime_ns, stat.st_size, max_count))
+
+
 def _register(name):
     def _decorator(f):
         loaders[name] = f
@@ -29,11 +46,7 @@ def load_jack(path, max_count=None):
         A list of input-answer pairs.
 
     """
-    # We load json directly instead
-    with open(path) as f:
-        jtr_data = json.load(f)
-
-    return jack_to_qasetting(jtr_data, max_count)
+    return _loaded('jack', path, max_count, stream_jack(path, max_count))
 
 
 @_register('squad')
@@ -47,9 +60,7 @@ def load_squad(path, max_count=None):
     Returns:
         A list of input-answer pairs.
     """
-    # We load to jtr dict and convert to qa settings for now
-    jtr_data = convert_squad(path)
-    return jack_to_qasetting(jtr_data, max_count)
+    return _loaded('squad', path, max_count, stream_squad(path, max_count))
 
 
 @_register('snli')
@@ -63,6 +74,151 @@ def load_snli(path, max_count=None):
     Returns:
         A list of input-answer pairs.
     """
-    # We load to jtr dict and convert to qa settings for now
-    jtr_data = convert_snli(path)
-    return jack_to_qasetting(jtr_data, max_count)
+    return _loaded('snli', path, max_count, stream_snli(path, max_count))
+
+
+@_register('triples')
+def load_triples(path, max_count=None) -> TripleDataset:
+    """
+    This function loads a file of whitespace separated knowledge graph triples from a specific location.
+    Args:
+        path: the location to load from.
+        max_count: how many triples to load at most
+
+    Returns:
+        A `TripleDataset` of input-answer pairs.
+    """
+    return _load_triples(path, max_count)
+
+
+def stream_jack(path, max_count=None):
+    """
+    Streams input-answer pairs from a jack json file, or from a jack jsonl file with one instance per line. Files are
+    parsed incrementally and only up to `max_count` instances. In json files, "globals" that follow "instances" are
+    looked up when the candidates of a QASetting are first accessed, which takes an additional pass over the file only
+    if not all instances were parsed by then; in jsonl files, they can be given by a first line of the form
+    `{"globals": {...}}`.
+    Args:
+        path: the location to load from.
+        max_count: how many instances to load at most
+
+    Returns:
+        An iterator over input-answer pairs.
+    """
+    if path.endswith('.jsonl'):
+        return iter_jack_to_qasetting(_read_jack_jsonl(path), max_count)
+    jtr_data, instances = stream_json_array(path, 'instances')
+    if 'globals' in jtr_data:
+        jtr_data['instances'] = instances
+        return iter_jack_to_qasetting(jtr_data, max_count)
+    trailing_globals = _TrailingGlobals(path, jtr_data)
+
+    def all_instances():
+        yield from instances
+        trailing_globals.complete()
+
+    return ((_StreamedQASetting(q, trailing_globals), a)
+            for q, a in iter_jack_to_qasetting({'instances': all_instances()}, max_count))
+
+
+def stream_squad(path, max_count=None):
+    """
+    Streams input-answer pairs from a squad json file, which is parsed incrementally and only up to `max_count`
+    instances.
+    Args:
+        path: the location to load from.
+        max_count: how many instances to load at most
+
+    Returns:
+        An iterator over input-answer pairs.
+    """
+    return iter_jack_to_qasetting(convert_squad(path, lazy=True), max_count)
+
+
+def stream_snli(path, max_count=None):
+    """
+    Streams input-answer pairs from a snli jsonl file, which is read line by line and only up to `max_count`
+    instances.
+    Args:
+        path: the location to load from.
+        max_count: how many instances to load at most
+
+    Returns:
+        An iterator over input-answer pairs.
+    """
+    return iter_jack_to_qasetting(convert_snli(path, lazy=True), max_count)
+
+
+def _read_jack_jsonl(path):
+    with open(path) as f:
+        first = f.readline()
+    first = json.loads(first) if first.strip() else None
+    jtr_data = dict()
+    skip_first = first is not None and 'globals' in first and 'questions' not in first
+    if skip_first:
+        jtr_data['globals'] = first['globals']
+
+    def instances():
+        with open(path) as f:
+            if skip_first:
+                f.readline()
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    jtr_data['instances'] = instances()
+    return jtr_data
+
+
+class _TrailingGlobals:
+    """Candidates of the "globals" that follow the "instances" of a jack json file. They are taken from the entries
+    of `header` that follow the instances once all instances are parsed, or else read by an additional pass over the
+    file."""
+
+    def __init__(self, path, header):
+        self._path = path
+        self._header = header
+        self._complete = False
+        self._candidates = None
+        self._resolved = False
+
+    def complete(self):
+        self._complete = True
+
+    def candidates(self):
+        if not self._resolved:
+            header = self._header
+            if not self._complete:
+                header, instances = stream_json_array(self._path, 'instances')
+                for _ in instances:
+                    pass
+            if 'globals' in header:
+                self._candidates = [c.get('text') if isinstance(c, dict) else c
+                                    for c in header['globals']['candidates']]
+            self._header = None
+            self._resolved = True
+        return self._candidates
+
+
+class _StreamedQASetting(QASetting):
+    """QASetting of a streamed jack json file whose global candidates, if any, replace its own candidates when they
+    are first accessed."""
+
+    def __init__(self, setting, trailing_globals):
+        super().__init__(setting.question, setting.support, id=setting.id, candidates=setting.candidates,
+                         candidate_spans=setting.candidate_spans)
+        self._trailing_globals = trailing_globals
+
+    @property
+    def candidates(self):
+        if self._trailing_globals is not None:
+            global_candidates = self._trailing_globals.candidates()
+            if global_candidates is not None:
+                self._candidates = global_candidates
+            self._trailing_globals = None
+        return self._candidates
+
+    @candidates.setter
+    def candidates(self, candidates):
+        self._candidates = candidates
+        self._trailing_globals = None
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+"""Knowledge graph triples held as integer arrays, e.g., for training link prediction readers on large graphs."""
+
+from itertools import islice
+from typing import Iterable, List, Mapping, Sequence, Tuple
+
+import numpy as np
+
+from jack.core.data_structures import Answer, QASetting
+
+
+class TripleDataset(Sequence):
+    """(subject, predicate, object) triples as an int32 array of shape (n, 3), together with the names of the entities
+    and predicates that the ids refer to.
+
+    As a sequence, it yields input-answer pairs like the jack loaders do for link prediction data, i.e., questions of
+    the form "subject predicate object" answered by "True", so it can be used wherever such datasets are expected.
+    Link prediction input modules use the id array directly instead.
+    """
+
+    def __init__(self, triples: np.ndarray, entities: List[str], predicates: List[str]):
+        self.triples = np.asarray(triples, dtype=np.int32).reshape([-1, 3])
+        self.entities = list(entities)
+        self.predicates = list(predicates)
+
+    @staticmethod
+    def from_names(triples: Iterable[Tuple[str, str, str]]) -> 'TripleDataset':
+        """Creates a dataset from (subject, predicate, object) name triples. Ids are assigned to the sorted names.
+        Names are kept as python strings, each distinct name once (fixed-width string arrays would pad every name to
+        the longest one)."""
+        triples = list(triples)
+        entities = sorted({s for s, _, _ in triples} | {o for _, _, o in triples})
+        predicates = sorted({p for _, p, _ in triples})
+        entity_to_index = {entity: index for index, entity in enumerate(entities)}
+        predicate_to_index = {predicate: index for index, predicate in enumerate(predicates)}
+        ids = np.fromiter((i for s, p, o in triples for i in (entity_to_index[s], predicate_to_index[p],
+                                                              entity_to_index[o])),
+                          dtype=np.int32, count=3 * len(triples))
+        return TripleDataset(ids, entities, predicates)
+
+    @staticmethod
+    def from_qa_settings(dataset: Iterable[Tuple[QASetting, List[Answer]]]) -> 'TripleDataset':
+        """Creates a dataset from input-answer pairs whose questions are "subject predicate object" triples."""
+        return TripleDataset.from_names(q.question.split() for q, _ in dataset)
+
+    @property
+    def entity_to_index(self) -> Mapping[str, int]:
+        return {entity: index for index, entity in enumerate(self.entities)}
+
+    @property
+    def predicate_to_index(self) -> Mapping[str, int]:
+        return {predicate: index for index, predicate in enumerate(self.predicates)}
+
+    def to_ids(self, entity_to_index: Mapping[str, int], predicate_to_index: Mapping[str, int]) -> np.ndarray:
+        """Maps the triples to the ids of other vocabularies, looking up each distinct name only once. Unknown entities
+        are mapped to `len(entity_to_index)`, as in `KnowledgeGraphEmbeddingInputModule`; unknown predicates raise a
+        `KeyError`.
+
+        Returns:
+            int32 array of shape (len(self), 3).
+        """
+        unknown = len(entity_to_index)
+        entity_ids = np.array([entity_to_index.get(e, unknown) for e in self.entities], dtype=np.int32)
+        predicate_ids = np.array([predicate_to_index[p] for p in self.predicates], dtype=np.int32)
+        return np.stack([entity_ids[self.triples[:, 0]], predicate_ids[self.triples[:, 1]],
+                         entity_ids[self.triples[:, 2]]], axis=1)
+
+    def __len__(self):
+        return len(self.triples)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return TripleDataset(self.triples[item], self.entities, self.predicates)
+        s, p, o = self.triples[item]
+        question = " ".join([self.entities[s], self.predicates[p], self.entities[o]])
+        return QASetting(question=question), [Answer("True")]
+
+
+def load_triples(path, max_count=None) -> TripleDataset:
+    """
+    Loads triples from a file with one whitespace separated "subject predicate object" triple per line, like the
+    original WN18 and FB15k files.
+    Args:
+        path: the location to load from.
+        max_count: how many triples to load at most
+
+    Returns:
+        A `TripleDataset`.
+    """
+    with open(path, 'r') as f:
+        lines = (line.split() for line in f)
+        triples = list(islice((t for t in lines if t), max_count))
+    for t in triples:
+        if len(t) != 3:
+            raise ValueError('Expected a triple in {}, found: {}'.format(path, ' '.join(t)))
+    return TripleDataset.from_names(triples)
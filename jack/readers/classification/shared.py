@@ -116,6 +116,7 @@ MCAnnotation = NamedTuple('MCAnnotation', [
 
 
 class ClassificationSingleSupportInputModule(OnlineInputModule[MCAnnotation]):
+    _preprocessing_config_keys = ['lowercase']
 
     @property
     def training_ports(self) -> List[TensorPort]:
@@ -163,20 +164,18 @@ class ClassificationSingleSupportInputModule(OnlineInputModule[MCAnnotation]):
                             answers: Optional[List[Answer]] = None) -> MCAnnotation:
         has_answers = answers is not None
 
-        q_tokenized, q_ids, q_length, _, _ = preprocessing.nlp_preprocess(
-            question.question, self.shared_resources.vocab,
-            lowercase=self.shared_resources.config.get('lowercase', True))
-        s_tokenized, s_ids, s_length, _, _ = preprocessing.nlp_preprocess(
-            question.support[0], self.shared_resources.vocab,
+        tokens, ids, offsets, _ = preprocessing.nlp_preprocess_batch(
+            [question.question, question.support[0]], self.shared_resources.vocab,
             lowercase=self.shared_resources.config.get('lowercase', True))
+        q_end, s_end = offsets[1], offsets[2]
 
         return MCAnnotation(
-            question_tokens=q_tokenized,
-            question_ids=q_ids,
-            question_length=q_length,
-            support_tokens=s_tokenized,
-            support_ids=s_ids,
-            support_length=s_length,
+            question_tokens=tokens[:q_end],
+            question_ids=ids[:q_end].tolist(),
+            question_length=int(q_end),
+            support_tokens=tokens[q_end:s_end],
+            support_ids=ids[q_end:s_end].tolist(),
+            support_length=int(s_end - q_end),
             answer=self.shared_resources.answer_vocab(answers[0].text) if has_answers else 0,
             id=idd
         )
@@ -204,16 +203,8 @@ class ClassificationSingleSupportInputModule(OnlineInputModule[MCAnnotation]):
         }
 
         if self.shared_resources.config.get("vocab_from_embeddings", False):
-            emb_support = np.zeros([len(annotations), max(s_lengths), self.emb_matrix.shape[1]])
-            emb_question = np.zeros([len(annotations), max(q_lengths), self.emb_matrix.shape[1]])
-            for i, a in enumerate(annotations):
-                for j, k in enumerate(a.support_ids):
-                    emb_support[i, j] = self._get_emb(k)
-                for j, k in enumerate(a.question_ids):
-                    emb_question[i, j] = self._get_emb(k)
-
-            xy_dict[Ports.Input.emb_support] = emb_support
-            xy_dict[Ports.Input.emb_question] = emb_question
+            xy_dict[Ports.Input.emb_support] = self._embed([a.support_ids for a in annotations], max(s_lengths))
+            xy_dict[Ports.Input.emb_question] = self._embed([a.question_ids for a in annotations], max(q_lengths))
         else:
             xy_dict[Ports.Input.support] = [a.support_ids for a in annotations]
             xy_dict[Ports.Input.question] = [a.question_ids for a in annotations]
@@ -222,18 +213,6 @@ class ClassificationSingleSupportInputModule(OnlineInputModule[MCAnnotation]):
             xy_dict[Ports.Target.target_index] = [a.answer for a in annotations]
         return numpify(xy_dict)
 
-    def _get_emb(self, idx):
-        if idx < self.emb_matrix.shape[0]:
-            return self.emb_matrix[idx]
-        else:
-            return self.default_vec
-
-    def setup(self):
-        vocab = self.shared_resources.vocab
-        if vocab.emb is not None:
-            self.emb_matrix = vocab.emb.lookup
-            self.default_vec = np.zeros([vocab.emb_length])
-
     def setup_from_data(self, data: Iterable[Tuple[QASetting, List[Answer]]]):
         vocab = self.shared_resources.vocab
         if not vocab.frozen:
@@ -241,11 +220,11 @@ class ClassificationSingleSupportInputModule(OnlineInputModule[MCAnnotation]):
                 (q for q, _ in data), vocab, lowercase=self.shared_resources.config.get('lowercase', True))
             vocab.freeze()
             if vocab.emb is not None:
-                self.shared_resources.embeddings = np.zeros([len(vocab), vocab.emb_length])
-                for w, i in self.shared_resources.vocab.sym2id.items():
-                    e = vocab.emb.get(w)
-                    if e is not None:
-                        self.shared_resources.embeddings[i] = e
+                # row of each vocab symbol in the pre-trained embeddings, -1 for symbols without embedding
+                emb_ids = np.full([len(vocab)], -1, dtype=np.int64)
+                for w, i in vocab.sym2id.items():
+                    emb_ids[i] = vocab.emb.vocabulary.get(w, -1)
+                self.shared_resources.embeddings = self._embed([emb_ids])[0]
 
         if not hasattr(self.shared_resources, 'answer_vocab') or not self.shared_resources.answer_vocab.frozen:
             self.shared_resources.answer_vocab = util.create_answer_vocab(
@@ -10,7 +10,7 @@ from jack.core import *
 from jack.readers.extractive_qa.util import prepare_data
 from jack.util import preprocessing
 from jack.util.map import numpify
-from jack.util.preprocessing import sort_by_tfidf
+from jack.util.tfidf import TfidfRanker
 
 logger = logging.getLogger(__name__)
 
@@ -65,13 +65,15 @@ XQAAnnotation = NamedTuple('XQAAnnotation', [
     ('support_ids', List[List[int]]),
     ('support_length', List[int]),
     ('word_in_question', List[List[float]]),
-    ('token_offsets', List[List[int]]),
+    ('token_offsets', List[np.ndarray]),
     ('answer_spans', Optional[List[List[Tuple[int, int]]]]),
     ('selected_supports', Optional[List[int]]),
 ])
 
 
 class XQAInputModule(OnlineInputModule[XQAAnnotation]):
+    # number of questions whose texts are processed with spaCy and whose supports are ranked at once
+    _chunk_size = 1000
     _output_ports = [XQAPorts.emb_question, XQAPorts.question_length,
                      XQAPorts.emb_support, XQAPorts.support_length,
                      XQAPorts.support2question,
@@ -86,6 +88,7 @@ class XQAInputModule(OnlineInputModule[XQAAnnotation]):
                      # for output module
                      XQAPorts.token_offsets, XQAPorts.selected_support]
     _training_ports = [XQAPorts.answer_span, XQAPorts.answer2support_training]
+    _preprocessing_config_keys = ['lowercase', 'max_support_length', 'max_num_support', 'spacy_nlp']
 
     def setup_from_data(self, data: Iterable[Tuple[QASetting, List[Answer]]]):
         # create character vocab + word lengths + char ids per word
@@ -99,15 +102,8 @@ class XQAInputModule(OnlineInputModule[XQAAnnotation]):
             logger.error("XQAInputModule needs vocabulary setup from pre-trained embeddings."
                          "Make sure to set vocab_from_embeddings=True.")
             sys.exit(1)
-        self.emb_matrix = self.vocab.emb.lookup
-        self.default_vec = np.zeros([self.vocab.emb_length])
         self.char_vocab = self.shared_resources.char_vocab
-
-    def _get_emb(self, idx):
-        if idx < self.emb_matrix.shape[0]:
-            return self.emb_matrix[idx]
-        else:
-            return self.default_vec
+        self._tfidf_ranker = TfidfRanker()
 
     @property
     def output_ports(self) -> List[TensorPort]:
@@ -117,6 +113,21 @@ class XQAInputModule(OnlineInputModule[XQAAnnotation]):
     def training_ports(self) -> List[TensorPort]:
         return self._training_ports
 
+    def instance_length(self, question: QASetting) -> Tuple[int, int]:
+        support_length, question_length = super(XQAInputModule, self).instance_length(question)
+        max_support_length = self.config.get("max_support_length", None)
+        if max_support_length:
+            support_length = min(support_length, max_support_length)
+        return support_length, question_length
+
+    def num_padded_supports(self, question: QASetting, is_eval: bool) -> int:
+        # see preprocess_instance and create_batch for how supports are selected
+        num_support = min(len(question.support), self.config.get("max_num_support", len(question.support)))
+        max_training_support = self.config.get('max_training_support', 2)
+        if not is_eval and max_training_support > 0:
+            num_support = min(num_support, max_training_support)
+        return max(num_support, 1)
+
     def preprocess(self, questions: List[QASetting],
                    answers: Optional[List[List[Answer]]] = None,
                    is_eval: bool = False) -> List[XQAAnnotation]:
@@ -124,54 +135,80 @@ class XQAInputModule(OnlineInputModule[XQAAnnotation]):
         if answers is None:
             answers = [None] * len(questions)
         preprocessed = []
+        chunks = range(0, len(questions), self._chunk_size)
         if len(questions) > 1000:
             bar = progressbar.ProgressBar(
-                max_value=len(questions),
+                max_value=len(chunks),
                 widgets=[' [', progressbar.Timer(), '] ', progressbar.Bar(), ' (', progressbar.ETA(), ') '])
-            for q, a in bar(zip(questions, answers)):
-                preprocessed.append(self.preprocess_instance(q, a))
-        else:
-            for q, a in zip(questions, answers):
-                preprocessed.append(self.preprocess_instance(q, a))
+            chunks = bar(chunks)
+        for start in chunks:
+            end = start + self._chunk_size
+            self._spacy_prefetch(questions, start)
+            preprocessed.extend(self._preprocess_chunk(questions[start:end], answers[start:end]))
 
         return preprocessed
 
-    def preprocess_instance(self, question: QASetting, answers: Optional[List[Answer]] = None) -> XQAAnnotation:
-        has_answers = answers is not None
+    def _spacy_prefetch(self, questions: List[QASetting], i: int, chunk_size: int = _chunk_size):
+        """Processes the texts of the next `chunk_size` questions at once with spaCy (when enabled), such that
+        `prepare_data` finds them in the cache."""
+        if not self.config.get("spacy_nlp", False) or i % chunk_size != 0:
+            return
+        texts = [t for q in questions[i:i + chunk_size] for t in [q.question] + list(q.support)]
+        if self.config.get("lowercase", False):
+            texts = [t.lower() for t in texts]
+        preprocessing.spacy_preprocess_batch(
+            texts, self.config.get("spacy_batch_size", 1000), self.config.get("spacy_processes", 1))
 
-        q_tokenized, q_ids, _, q_length, s_tokenized, s_ids, _, s_length, \
-        word_in_question, token_offsets, answer_spans = prepare_data(
-            question, answers, self.vocab, self.config.get("lowercase", False),
-            with_answers=has_answers, max_support_length=self.config.get("max_support_length", None))
-
-        max_num_support = self.config.get("max_num_support", len(question.support))  # take all per default
+    def preprocess_instance(self, question: QASetting, answers: Optional[List[Answer]] = None) -> XQAAnnotation:
+        return self._preprocess_chunk([question], [answers])[0]
+
+    def _preprocess_chunk(self, questions: List[QASetting], answers: List[Optional[List[Answer]]]) \
+            -> List[XQAAnnotation]:
+        """Preprocesses several questions, ranking the supports of all of them with a single call of the ranker."""
+        use_spacy = self.config.get("spacy_nlp", False)
+        prepared = [prepare_data(
+            question, question_answers, self.vocab, self.config.get("lowercase", False),
+            with_answers=question_answers is not None,
+            max_support_length=self.config.get("max_support_length", None),
+            spacy_nlp=use_spacy, with_lemmas=use_spacy) for question, question_answers in zip(questions, answers)]
 
         # take max supports by TF-IDF (we subsample to max_num_support in create batch)
         # following https://arxiv.org/pdf/1710.10723.pdf
-        if len(question.support) > 1:
-            scores = sort_by_tfidf(' '.join(q_tokenized), [' '.join(s) for s in s_tokenized])
-            selected_supports = [s_idx for s_idx, _ in scores[:max_num_support]]
-            s_tokenized = [s_tokenized[s_idx] for s_idx in selected_supports]
-            s_ids = [s_ids[s_idx] for s_idx in selected_supports]
-            s_length = [s_length[s_idx] for s_idx in selected_supports]
-            word_in_question = [word_in_question[s_idx] for s_idx in selected_supports]
-            token_offsets = [token_offsets[s_idx] for s_idx in selected_supports]
-            answer_spans = [answer_spans[s_idx] for s_idx in selected_supports]
-        else:
-            selected_supports = list(range(len(question.support)))
-
-        return XQAAnnotation(
-            question_tokens=q_tokenized,
-            question_ids=q_ids,
-            question_length=q_length,
-            support_tokens=s_tokenized,
-            support_ids=s_ids,
-            support_length=s_length,
-            word_in_question=word_in_question,
-            token_offsets=token_offsets,
-            answer_spans=answer_spans if has_answers else None,
-            selected_supports=selected_supports,
-        )
+        ranked = [i for i, question in enumerate(questions) if len(question.support) > 1]
+        rankings = dict(zip(ranked, self._tfidf_ranker.rank(
+            [' '.join(prepared[i][0]) for i in ranked],
+            [[' '.join(s) for s in prepared[i][4]] for i in ranked])))
+
+        annotations = []
+        for i, (question, question_answers) in enumerate(zip(questions, answers)):
+            q_tokenized, q_ids, _, q_length, s_tokenized, s_ids, _, s_length, \
+            word_in_question, token_offsets, answer_spans = prepared[i]
+
+            max_num_support = self.config.get("max_num_support", len(question.support))  # take all per default
+            if i in rankings:
+                selected_supports = [s_idx for s_idx, _ in rankings[i][:max_num_support]]
+                s_tokenized = [s_tokenized[s_idx] for s_idx in selected_supports]
+                s_ids = [s_ids[s_idx] for s_idx in selected_supports]
+                s_length = [s_length[s_idx] for s_idx in selected_supports]
+                word_in_question = [word_in_question[s_idx] for s_idx in selected_supports]
+                token_offsets = [token_offsets[s_idx] for s_idx in selected_supports]
+                answer_spans = [answer_spans[s_idx] for s_idx in selected_supports]
+            else:
+                selected_supports = list(range(len(question.support)))
+
+            annotations.append(XQAAnnotation(
+                question_tokens=q_tokenized,
+                question_ids=q_ids,
+                question_length=q_length,
+                support_tokens=s_tokenized,
+                support_ids=s_ids,
+                support_length=s_length,
+                word_in_question=word_in_question,
+                token_offsets=token_offsets,
+                answer_spans=answer_spans if question_answers is not None else None,
+                selected_supports=selected_supports,
+            ))
+        return annotations
 
     def create_batch(self, annotations: List[XQAAnnotation], is_eval: bool, with_answers: bool) \
             -> Mapping[TensorPort, np.ndarray]:
@@ -220,15 +257,13 @@ class XQAInputModule(OnlineInputModule[XQAAnnotation]):
         word_chars, word_lengths, word_ids, vocab, rev_vocab = \
             preprocessing.unique_words_with_chars(q_tokenized + s_tokenized, self.char_vocab)
 
-        emb_support = np.zeros([len(support_lengths), max(support_lengths), self.vocab.emb_length])
-        emb_question = np.zeros([len(question_lengths), max(question_lengths), self.vocab.emb_length])
+        token_offsets = np.zeros([len(offsets), max(support_lengths)], dtype=np.int32)
+        for j, support_offsets in enumerate(offsets):
+            token_offsets[j, :len(support_offsets)] = support_offsets
 
-        for i, a in enumerate(annotations):
-            for j, q_id in enumerate(a.question_ids):
-                emb_question[i, j] = self._get_emb(q_id)
-        for k, s_ids in enumerate(support_ids):
-            for j, s_id in enumerate(s_ids):
-                emb_support[k, j] = self._get_emb(s_id)
+        # single gather per tensor, OOV ids and padding are embedded as zeros
+        emb_support = self._embed(support_ids, max(support_lengths))
+        emb_question = self._embed([a.question_ids for a in annotations], max(question_lengths))
 
         output = {
             XQAPorts.word_chars: word_chars,
@@ -242,7 +277,7 @@ class XQAInputModule(OnlineInputModule[XQAAnnotation]):
             XQAPorts.word_in_question: wiq,
             XQAPorts.support2question: support2question,
             XQAPorts.is_eval: is_eval,
-            XQAPorts.token_offsets: offsets,
+            XQAPorts.token_offsets: token_offsets,
             XQAPorts.selected_support: selected_support,
             '__vocab': vocab,
             '__rev_vocab': rev_vocab,
@@ -277,8 +312,12 @@ def _np_softmax(x):
 
 def get_answer_and_span(question, doc_idx, start, end, token_offsets, selected_support):
     doc_idx = selected_support[doc_idx]
-    char_start = token_offsets[start]
-    char_end = token_offsets[end + 1] if end < len(token_offsets) - 1 else len(question.support[doc_idx])
+    # token offsets of a batch are padded with zeros, so offsets after the end of the support are not increasing
+    char_start = int(token_offsets[start])
+    if end + 1 < len(token_offsets) and token_offsets[end + 1] > char_start:
+        char_end = int(token_offsets[end + 1])
+    else:
+        char_end = len(question.support[doc_idx])
     answer = question.support[doc_idx][char_start: char_end]
     answer = answer.rstrip()
     char_end = char_start + len(answer)
@@ -1,28 +1,14 @@
 import logging
 import random
-import re
 from typing import List, Optional, Tuple
 
+import numpy as np
+
 from jack.core.data_structures import QASetting, Answer
 from jack.util import preprocessing
+from jack.util.preprocessing import tokenize, token_to_char_offsets
 from jack.util.vocab import Vocab
 
-__pattern = re.compile('\w+|[^\w\s]')
-
-
-def tokenize(text):
-    return __pattern.findall(text)
-
-
-def token_to_char_offsets(text, tokenized_text):
-    offsets = []
-    offset = 0
-    for t in tokenized_text:
-        offset = text.index(t, offset)
-        offsets.append(offset)
-        offset += len(t)
-    return offsets
-
 
 def prepare_data(qa_setting: QASetting,
                  answers: Optional[List[Answer]],
@@ -36,43 +22,59 @@ def prepare_data(qa_setting: QASetting,
                  with_lemmas=False) \
         -> Tuple[List[str], List[int], Optional[List[int]], int,
                  List[List[str]], List[List[int]], Optional[List[List[int]]], List[int],
-                 List[List[float]], List[List[int]], List[List[Tuple[int, int]]]]:
+                 List[List[float]], List[np.ndarray], List[List[Tuple[int, int]]]]:
     """Preprocesses a question and (optionally) answers:
     The steps include tokenization, lower-casing, translation to IDs,
     computing the word-in-question feature, computing token offsets,
-    truncating supports, and computing answer spans.
+    truncating supports, and computing answer spans. Token offsets are returned as one int32 array per support.
     """
     supports = qa_setting.support
     question = qa_setting.question
 
-    question_tokens, question_ids, question_length, question_lemmas, _ = preprocessing.nlp_preprocess(
-        question, vocab, lowercase=lowercase, use_spacy=spacy_nlp,
-        lemmatize=lemmatize, with_lemmas=with_lemmas, with_tokens_offsets=False)
+    if spacy_nlp:
+        question_tokens, question_ids, question_length, question_lemmas, _ = preprocessing.nlp_preprocess(
+            question, vocab, lowercase=lowercase, use_spacy=spacy_nlp,
+            lemmatize=lemmatize, with_lemmas=with_lemmas, with_tokens_offsets=False)
+
+        preprocessed_supports = [
+            preprocessing.nlp_preprocess(
+                support, vocab, lowercase=lowercase, use_spacy=spacy_nlp,
+                lemmatize=lemmatize, with_lemmas=with_lemmas, with_tokens_offsets=True)
+            for support in supports]
+
+        all_support_tokens = [s[0] for s in preprocessed_supports]
+        all_support_ids = [s[1] for s in preprocessed_supports]
+        all_support_length = [s[2] for s in preprocessed_supports]
+        all_support_lemmas = [s[3] for s in preprocessed_supports]
+        all_token_offsets = [s[4] for s in preprocessed_supports]
+    else:
+        # question and supports are tokenized and mapped to ids at once
+        tokens, ids, text_offsets, char_offsets = preprocessing.nlp_preprocess_batch(
+            [question] + list(supports), vocab, lowercase=lowercase, with_tokens_offsets=True)
+        text_offsets = text_offsets.tolist()
+        ids = ids.tolist()
+        spans = list(zip(text_offsets[:-1], text_offsets[1:]))
+        question_tokens, question_ids = tokens[:text_offsets[1]], ids[:text_offsets[1]]
+        question_length, question_lemmas = len(question_tokens), None
+        all_support_tokens = [tokens[start:end] for start, end in spans[1:]]
+        all_support_ids = [ids[start:end] for start, end in spans[1:]]
+        all_support_length = [end - start for start, end in spans[1:]]
+        all_support_lemmas = [None] * len(supports)
+        all_token_offsets = [char_offsets[start:end] for start, end in spans[1:]]
     question_tokens_set = set(t.lower() for t in question_tokens)
 
-    preprocessed_supports = [
-        preprocessing.nlp_preprocess(
-            support, vocab, lowercase=lowercase, use_spacy=spacy_nlp,
-            lemmatize=lemmatize, with_lemmas=with_lemmas, with_tokens_offsets=True)
-        for support in supports]
-
-    all_support_tokens = [s[0] for s in preprocessed_supports]
-    all_support_ids = [s[1] for s in preprocessed_supports]
-    all_support_length = [s[2] for s in preprocessed_supports]
-    all_support_lemmas = [s[3] for s in preprocessed_supports]
-    all_token_offsets = [s[4] for s in preprocessed_supports]
-
     rng = random.Random(12345)
 
     all_word_in_question = []
     if with_lemmas:
         assert all_support_lemmas is not None
+        question_lemmas_set = set(question_lemmas)
         for support_lemmas in all_support_lemmas:
             all_word_in_question.append([])
             if with_lemmas:
                 for lemma in support_lemmas:
                     all_word_in_question[-1].append(float(
-                        lemma in question_lemmas and (not wiq_contentword or (lemma.isalnum() and not lemma.is_stop))))
+                        lemma in question_lemmas_set and (not wiq_contentword or (lemma.isalnum() and not lemma.is_stop))))
     else:
         for support_tokens in all_support_tokens:
             all_word_in_question.append([])
@@ -94,16 +96,11 @@ def prepare_data(qa_setting: QASetting,
                 if a.doc_idx != doc_idx:
                     continue
 
-                start = 0
-                while start < len(token_offsets) and token_offsets[start] < a.span[0]:
-                    start += 1
-
+                # first token starting at or after the answer start, last token starting before the answer end
+                start = int(np.searchsorted(token_offsets, a.span[0]))
                 if start == len(token_offsets):
                     continue
-
-                end = start
-                while end + 1 < len(token_offsets) and token_offsets[end + 1] < a.span[1]:
-                    end += 1
+                end = max(start, int(np.searchsorted(token_offsets, a.span[1])) - 1)
 
                 # validated answer:
                 # answer_text = a.text
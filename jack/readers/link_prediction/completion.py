@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+"""Knowledge base completion with link prediction readers: queries "subject predicate ?" and "? predicate object" are
+answered by the entities with the highest scores."""
+
+import os
+from typing import List, Sequence
+
+import numpy as np
+
+from jack.core.data_structures import Answer, QASetting
+from jack.readers.link_prediction.entity_scores import get_scorer
+from jack.util.ann import IVFIndex, top_k
+
+# placeholder of the entity to predict in a query
+PLACEHOLDER = '?'
+
+
+class EntityPredictor:
+    """Answers queries with the top-k entities, scored all at once with the entity embedding matrix of a link
+    prediction reader, which is taken from the reader when the predictor is created.
+
+    For very large entity sets, the entities can be partitioned into an `IVFIndex`, so that queries are only scored
+    against the entities of the `nprobe` partitions closest to them, which gives approximate results. The index can
+    additionally encode entities by product quantization, and it can be stored and reused as long as the reader does
+    not change.
+    """
+
+    def __init__(self, reader, nb_partitions: int = 0, nprobe: int = 8, nb_subspaces: int = 0, rerank: int = 0,
+                 index_dir: str = None, batch_size: int = 1000):
+        """
+        Args:
+            reader: a trained link prediction reader, e.g., `distmult_reader`.
+            nb_partitions: number of partitions of the entities searched by queries, 0 for exact search.
+            nprobe: number of partitions searched per query.
+            nb_subspaces: number of product quantization subspaces of the index, 0 to score the entity embeddings.
+            rerank: see `IVFIndex.search`.
+            index_dir: directory of an index, which is loaded if it exists, otherwise the index built with
+                `nb_partitions` is stored there.
+            batch_size: number of queries scored at once.
+        """
+        model_module = reader.model_module
+        self.scorer = get_scorer(model_module.model_name, *model_module.embeddings())
+        self.entity_to_index = reader.shared_resources.entity_to_index
+        self.predicate_to_index = reader.shared_resources.predicate_to_index
+        self.entities = sorted(self.entity_to_index, key=self.entity_to_index.get)
+        self.nprobe = nprobe
+        self.rerank = rerank
+        self.batch_size = batch_size
+        self.index = None
+        # the embedding of unknown entities (the last row) is never predicted
+        entity_embeddings = self.scorer.entity_embeddings[:len(self.entities)]
+        if index_dir is not None and os.path.exists(index_dir):
+            self.index = IVFIndex.load(index_dir, entity_embeddings)
+            if self.index.metric != self.scorer.metric:
+                raise ValueError('Index {} with {} metric does not fit {}'.format(
+                    index_dir, self.index.metric, model_module.model_name))
+        elif nb_partitions:
+            self.index = IVFIndex.build(entity_embeddings, nb_partitions, self.scorer.metric, nb_subspaces)
+            if index_dir is not None:
+                self.index.store(index_dir)
+
+    def __call__(self, queries: Sequence[QASetting], k: int = 10) -> List[List[Answer]]:
+        """
+        Args:
+            queries: questions of the form "subject predicate ?" or "? predicate object".
+            k: number of entities per query.
+
+        Returns:
+            for each query, answers with the names and scores of the k highest scoring entities.
+        """
+        unknown = len(self.entity_to_index)
+        ids = np.zeros([len(queries), 3], dtype=np.int64)
+        predict_subject = np.zeros([len(queries)], dtype=bool)
+        for i, q in enumerate(queries):
+            s, p, o = q.question.split()
+            if (s == PLACEHOLDER) == (o == PLACEHOLDER):
+                raise ValueError('Expected either the subject or object to be "{}" in query: {}'.format(
+                    PLACEHOLDER, q.question))
+            predict_subject[i] = s == PLACEHOLDER
+            ids[i] = (self.entity_to_index.get(s, unknown), self.predicate_to_index[p],
+                      self.entity_to_index.get(o, unknown))
+
+        results = [None] * len(queries)
+        for side in np.flatnonzero(predict_subject), np.flatnonzero(~predict_subject):
+            for start in range(0, len(side), self.batch_size):
+                batch = side[start:start + self.batch_size]
+                entity_ids, scores = self._top_k(ids[batch], predict_subject[batch[0]], k)
+                for i, e, s in zip(batch, entity_ids, scores):
+                    results[i] = [Answer(self.entities[j], score=float(score)) for j, score in zip(e, s) if j >= 0]
+        return results
+
+    def _top_k(self, ids, predict_subject, k):
+        s, p, o = ids.T
+        if self.index is not None:
+            if predict_subject:
+                return self.index.search(self.scorer.subject_queries(p, o), k, self.nprobe, self.rerank)
+            return self.index.search(self.scorer.object_queries(s, p), k, self.nprobe, self.rerank)
+        scores = self.scorer.score_subjects(p, o) if predict_subject else self.scorer.score_objects(s, p)
+        return top_k(scores[:, :len(self.entities)], k)
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+"""Numpy implementations of the scoring functions in `jack.readers.link_prediction.scores`, which score a batch of
+(subject, predicate, ?) or (?, predicate, object) queries against all entities at once, e.g., for ranking evaluation."""
+
+import numpy as np
+
+
+class EntityScorer:
+    # similarity of query vectors and entity embeddings that gives the scores, see `jack.util.ann.similarities`
+    metric = 'dot'
+
+    def __init__(self, entity_embeddings: np.ndarray, predicate_embeddings: np.ndarray):
+        """
+        Args:
+            entity_embeddings: (nb_entities, entity_embedding_size) matrix, as looked up by the model.
+            predicate_embeddings: (nb_predicates, predicate_embedding_size) matrix.
+        """
+        self.entity_embeddings = np.asarray(entity_embeddings, dtype=np.float32)
+        self.predicate_embeddings = np.asarray(predicate_embeddings, dtype=np.float32)
+
+    def score(self, subjects: np.ndarray, predicates: np.ndarray, objects: np.ndarray) -> np.ndarray:
+        """
+        :return: (batch_size) scores of the given triples.
+        """
+        raise NotImplementedError
+
+    def score_objects(self, subjects: np.ndarray, predicates: np.ndarray) -> np.ndarray:
+        """
+        :return: (batch_size, nb_entities) scores of all entities as objects of the given subjects and predicates.
+        """
+        raise NotImplementedError
+
+    def score_subjects(self, predicates: np.ndarray, objects: np.ndarray) -> np.ndarray:
+        """
+        :return: (batch_size, nb_entities) scores of all entities as subjects of the given predicates and objects.
+        """
+        raise NotImplementedError
+
+    def object_queries(self, subjects: np.ndarray, predicates: np.ndarray) -> np.ndarray:
+        """
+        :return: (batch_size, entity_embedding_size) vectors whose similarities (by `metric`) to the entity embeddings
+            are the scores of the entities as objects of the given subjects and predicates.
+        """
+        raise NotImplementedError
+
+    def subject_queries(self, predicates: np.ndarray, objects: np.ndarray) -> np.ndarray:
+        """
+        :return: (batch_size, entity_embedding_size) vectors whose similarities (by `metric`) to the entity embeddings
+            are the scores of the entities as subjects of the given predicates and objects.
+        """
+        raise NotImplementedError
+
+
+class TranslatingScorer(EntityScorer):
+    """TransE with negative L1 distance, see `scores.TranslatingModel`. Distances to all entities are computed in
+    chunks of queries, so that at most `max_chunk_size` differences are held in memory at once."""
+
+    max_chunk_size = 1 << 24
+    metric = 'l1'
+
+    def score(self, subjects, predicates, objects):
+        translated = self.entity_embeddings[subjects] + self.predicate_embeddings[predicates]
+        return - np.abs(translated - self.entity_embeddings[objects]).sum(axis=1)
+
+    def score_objects(self, subjects, predicates):
+        translated = self.entity_embeddings[subjects] + self.predicate_embeddings[predicates]
+        return self._in_chunks(len(translated), lambda c: translated[c, None, :] - self.entity_embeddings[None])
+
+    def score_subjects(self, predicates, objects):
+        # same order of operations as in `score`, so that scores of the same triple are equal
+        predicate_embeddings = self.predicate_embeddings[predicates]
+        object_embeddings = self.entity_embeddings[objects]
+        return self._in_chunks(len(object_embeddings), lambda c: (
+            self.entity_embeddings[None] + predicate_embeddings[c, None, :]) - object_embeddings[c, None, :])
+
+    def object_queries(self, subjects, predicates):
+        return self.entity_embeddings[subjects] + self.predicate_embeddings[predicates]
+
+    def subject_queries(self, predicates, objects):
+        # - |s + p - o| = - |s - (o - p)|
+        return self.entity_embeddings[objects] - self.predicate_embeddings[predicates]
+
+    def _in_chunks(self, nb_queries, differences):
+        chunk_size = max(1, self.max_chunk_size // self.entity_embeddings.size)
+        scores = np.empty([nb_queries, self.entity_embeddings.shape[0]], dtype=np.float32)
+        for start in range(0, nb_queries, chunk_size):
+            chunk = slice(start, start + chunk_size)
+            scores[chunk] = - np.abs(differences(chunk)).sum(axis=2)
+        return scores
+
+
+class BilinearDiagonalScorer(EntityScorer):
+    """DistMult, see `scores.BilinearDiagonalModel`."""
+
+    def score(self, subjects, predicates, objects):
+        return (self.entity_embeddings[subjects] * self.predicate_embeddings[predicates] *
+                self.entity_embeddings[objects]).sum(axis=1)
+
+    def score_objects(self, subjects, predicates):
+        return self.object_queries(subjects, predicates).dot(self.entity_embeddings.T)
+
+    def score_subjects(self, predicates, objects):
+        return self.subject_queries(predicates, objects).dot(self.entity_embeddings.T)
+
+    def object_queries(self, subjects, predicates):
+        return self.entity_embeddings[subjects] * self.predicate_embeddings[predicates]
+
+    def subject_queries(self, predicates, objects):
+        return self.predicate_embeddings[predicates] * self.entity_embeddings[objects]
+
+
+class ComplexScorer(EntityScorer):
+    """ComplEx, see `scores.ComplexModel`. Embeddings hold real parts in their first and imaginary parts in their
+    second half."""
+
+    def score(self, subjects, predicates, objects):
+        return (self.object_queries(subjects, predicates) * self.entity_embeddings[objects]).sum(axis=1)
+
+    def object_queries(self, subjects, predicates):
+        es_re, es_im = np.split(self.entity_embeddings[subjects], 2, axis=1)
+        ew_re, ew_im = np.split(self.predicate_embeddings[predicates], 2, axis=1)
+        # coefficients of the real and imaginary parts of the object
+        return np.concatenate([es_re * ew_re - es_im * ew_im, es_re * ew_im + es_im * ew_re], axis=1)
+
+    def score_objects(self, subjects, predicates):
+        return self.object_queries(subjects, predicates).dot(self.entity_embeddings.T)
+
+    def score_subjects(self, predicates, objects):
+        return self.subject_queries(predicates, objects).dot(self.entity_embeddings.T)
+
+    def subject_queries(self, predicates, objects):
+        eo_re, eo_im = np.split(self.entity_embeddings[objects], 2, axis=1)
+        ew_re, ew_im = np.split(self.predicate_embeddings[predicates], 2, axis=1)
+        # coefficients of the real and imaginary parts of the subject
+        return np.concatenate([ew_re * eo_re + ew_im * eo_im, ew_re * eo_im - ew_im * eo_re], axis=1)
+
+
+# Aliases, as in `scores`
+TransE = TranslatingEmbeddings = TranslatingModel = TranslatingScorer
+DistMult = BilinearDiagonal = BilinearDiagonalModel = BilinearDiagonalScorer
+ComplEx = ComplexE = ComplexModel = ComplexScorer
+
+_scorers = {name: scorer for name, scorer in globals().items()
+            if isinstance(scorer, type) and issubclass(scorer, EntityScorer) and scorer is not EntityScorer}
+
+
+def has_scorer(model_name: str) -> bool:
+    return model_name in _scorers
+
+
+def get_scorer(model_name: str, entity_embeddings: np.ndarray, predicate_embeddings: np.ndarray) -> EntityScorer:
+    if model_name not in _scorers:
+        raise ValueError('Unknown model: {}'.format(model_name))
+    return _scorers[model_name](entity_embeddings, predicate_embeddings)
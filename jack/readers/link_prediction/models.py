@@ -1,26 +1,56 @@
 # -*- coding: utf-8 -*-
+import logging
+
 from jack.core import *
 from jack.core.data_structures import *
 from jack.core.tensorflow import TFModelModule
-from jack.util.map import numpify
+from jack.io.triples import TripleDataset
+from jack.util.batch import GeneratorWithRestart
+
+logger = logging.getLogger(__name__)
+
+# batching and preprocessing options of `OnlineInputModule` that link prediction input modules do not support
+_UNSUPPORTED_OPTIONS = ['bucket_window', 'max_batch_tokens', 'num_preprocessing_workers', 'preprocessed_cache_dir']
+
+
+def corrupt_triples(triples: np.ndarray, nb_entities: int, num_negative: int, rng: np.random.RandomState) -> np.ndarray:
+    """Samples negative triples by replacing subjects and objects with random entities.
+
+    Args:
+        triples: int array of shape (n, 3) of (subject, predicate, object) ids.
+        nb_entities: number of entities to sample from.
+        num_negative: number of corrupted subjects and of corrupted objects per triple.
+        rng: random state to sample with.
+
+    Returns:
+        array of shape (n * 2 * num_negative, 3), holding for each triple in turn `num_negative` pairs of a triple with
+        a random subject and a triple with a random object.
+    """
+    negatives = np.repeat(triples, 2 * num_negative, axis=0)
+    random_entities = rng.randint(0, nb_entities, len(negatives))
+    negatives[0::2, 0] = random_entities[0::2]
+    negatives[1::2, 2] = random_entities[1::2]
+    return negatives
 
 
 class KnowledgeGraphEmbeddingInputModule(OnlineInputModule[List[List[int]]]):
+    """Feeds (subject, predicate, object) id triples. Datasets are converted to a `TripleDataset` once, whose int32
+    array is then shuffled, batched and extended with negative triples (see `corrupt_triples`) without creating any
+    Python objects per triple."""
+
     def __init__(self, shared_resources):
-        self._kbp_rng = random.Random(123)
+        self._kbp_rng = np.random.RandomState(123)
         super(KnowledgeGraphEmbeddingInputModule, self).__init__(shared_resources)
 
     def setup_from_data(self, data: Iterable[Tuple[QASetting, List[Answer]]]):
-        triples = [tuple(x[0].question.split()) for x in data]
-
-        entity_set = {s for [s, _, _] in triples} | {o for [_, _, o] in triples}
-        predicate_set = {p for [_, p, _] in triples}
+        if not isinstance(data, TripleDataset):
+            data = TripleDataset.from_qa_settings(data)
+        # entities of the dataset that do not occur in any triple (e.g., of a slice) are dropped
+        entities = np.unique(data.triples[:, [0, 2]])
+        predicates = np.unique(data.triples[:, 1])
 
-        entity_to_index = {entity: index for index, entity in enumerate(entity_set)}
-        predicate_to_index = {predicate: index for index, predicate in enumerate(predicate_set)}
-
-        self.shared_resources.entity_to_index = entity_to_index
-        self.shared_resources.predicate_to_index = predicate_to_index
+        self.shared_resources.entity_to_index = {data.entities[e]: index for index, e in enumerate(entities)}
+        self.shared_resources.predicate_to_index = {data.predicates[p]: index for index, p in enumerate(predicates)}
 
     def preprocess(self, questions: List[QASetting], answers: Optional[List[List[Answer]]] = None,
                    is_eval: bool = False) -> List[List[int]]:
@@ -37,24 +67,36 @@ class KnowledgeGraphEmbeddingInputModule(OnlineInputModule[List[List[int]]]):
 
     def create_batch(self, triples: List[List[int]],
                      is_eval: bool, with_answers: bool) -> Mapping[TensorPort, np.ndarray]:
-        triples = list(triples)
-        if with_answers:
-            target = [1] * len(triples)
-        if with_answers:
-            for i in range(len(triples)):
-                s, p, o = triples[i]
-                for _ in range(self.shared_resources.config.get('num_negative', 1)):
-                    random_subject_index = self._kbp_rng.randint(0, len(self.shared_resources.entity_to_index) - 1)
-                    random_object_index = self._kbp_rng.randint(0, len(self.shared_resources.entity_to_index) - 1)
-                    triples.append([random_subject_index, p, o])
-                    triples.append([s, p, random_object_index])
-                    target.append(0)
-                    target.append(0)
-
+        triples = np.asarray(triples, dtype=np.int32).reshape([-1, 3])
         xy_dict = {Ports.Input.question: triples}
         if with_answers:
-            xy_dict[Ports.Target.target_index] = target
-        return numpify(xy_dict)
+            negatives = corrupt_triples(triples, len(self.shared_resources.entity_to_index),
+                                        self.shared_resources.config.get('num_negative', 1), self._kbp_rng)
+            xy_dict[Ports.Input.question] = np.concatenate([triples, negatives])
+            xy_dict[Ports.Target.target_index] = np.concatenate([np.ones(len(triples), dtype=np.int32),
+                                                                 np.zeros(len(negatives), dtype=np.int32)])
+        return xy_dict
+
+    def batch_generator(self, dataset: Iterable[Tuple[QASetting, List[Answer]]], batch_size: int, is_eval: bool) \
+            -> Iterable[Mapping[TensorPort, np.ndarray]]:
+        """Shuffles and batches the id triples of the dataset, which is converted to a `TripleDataset` if needed.
+        Batches always have `batch_size` triples, options of `OnlineInputModule` batching do not apply."""
+        unsupported = [k for k in _UNSUPPORTED_OPTIONS if self.shared_resources.config.get(k)]
+        if unsupported:
+            logger.warning("Ignoring options not supported by link prediction batches: %s" % ", ".join(unsupported))
+        if not isinstance(dataset, TripleDataset):
+            dataset = TripleDataset.from_qa_settings(dataset)
+        triples = dataset.to_ids(self.shared_resources.entity_to_index, self.shared_resources.predicate_to_index)
+
+        def make_generator():
+            if self._shuffle(is_eval):
+                order = self._kbp_rng.permutation(len(triples))
+            else:
+                order = np.arange(len(triples))
+            for start in range(0, len(triples), batch_size):
+                yield self.create_batch(triples[order[start:start + batch_size]], is_eval, True)
+
+        return GeneratorWithRestart(make_generator)
 
     @property
     def output_ports(self) -> List[TensorPort]:
@@ -133,6 +175,14 @@ class KnowledgeGraphEmbeddingModelModule(TFModelModule):
             Ports.Prediction.logits: logits
         }
 
+    def embeddings(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the entity embeddings (with norms clipped to 1, as they are looked up) and predicate embeddings."""
+        entity_embeddings, = [v for v in self.variables if v.name.endswith('/entity_embeddings:0')]
+        predicate_embeddings, = [v for v in self.variables if v.name.endswith('/predicate_embeddings:0')]
+        entity_embeddings, predicate_embeddings = self.tf_session.run([entity_embeddings, predicate_embeddings])
+        norms = np.linalg.norm(entity_embeddings, axis=1, keepdims=True)
+        return entity_embeddings / np.maximum(norms, 1.0), predicate_embeddings
+
 
 class KnowledgeGraphEmbeddingOutputModule(OutputModule):
     def setup(self):
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import json
 import logging
 import math
 import os
@@ -22,6 +23,23 @@ def train(reader, train_data, test_data, dev_data, configuration: dict, debug=Fa
 
 def train_tensorflow(reader, train_data, test_data, dev_data, configuration: dict, debug=False):
     import tensorflow as tf
+    from jack.core.tensorflow import TFCluster
+
+    cluster = TFCluster.from_config(configuration)
+    if cluster is None:
+        _train_tensorflow(reader, train_data, test_data, dev_data, configuration, debug)
+        return
+    if cluster.job_name == 'ps':
+        cluster.join()
+    logger.info("Training as worker %d of %d" % (cluster.task_index, cluster.num_workers))
+    cluster.join_reader(reader)
+    # variables, e.g., the learning rate, are created on the parameter servers
+    with tf.device(cluster.device_setter()):
+        _train_tensorflow(reader, train_data, test_data, dev_data, configuration, debug, cluster)
+
+
+def _train_tensorflow(reader, train_data, test_data, dev_data, configuration: dict, debug=False, cluster=None):
+    import tensorflow as tf
 
     seed = configuration.get('seed', 0)
 
@@ -44,6 +62,8 @@ def train_tensorflow(reader, train_data, test_data, dev_data, configuration: dic
     reader_type = configuration.get('reader')
     save_dir = configuration.get('save_dir')
     write_metrics_to = configuration.get('write_metrics_to')
+    throughput_file = configuration.get('throughput_file')
+    is_chief = cluster is None or cluster.is_chief
 
     if clip_value != 0.0:
         clip_value = - abs(clip_value), abs(clip_value)
@@ -66,16 +86,18 @@ def train_tensorflow(reader, train_data, test_data, dev_data, configuration: dic
     tf_optimizer = tf_optimizer_class(learning_rate=learning_rate)
 
     sw = None
-    if tensorboard_folder is not None:
+    if tensorboard_folder is not None and is_chief:
         if os.path.exists(tensorboard_folder):
             shutil.rmtree(tensorboard_folder)
         sw = tf.summary.FileWriter(tensorboard_folder)
 
     # Hooks
     iter_interval = 1 if debug else log_interval
+    num_workers = 1 if cluster is None else cluster.num_workers
+    speed_hook = ExamplesPerSecHook(reader, batch_size, iter_interval, sw)
     hooks = [LossHook(reader, iter_interval, summary_writer=sw),
-             ETAHook(reader, iter_interval, int(math.ceil(len(train_data) / batch_size)), epochs),
-             ExamplesPerSecHook(reader, batch_size, iter_interval, sw)]
+             ETAHook(reader, iter_interval, int(math.ceil(len(train_data) / num_workers / batch_size)), epochs),
+             speed_hook]
 
     preferred_metric, best_metric = readers.eval_hooks[reader_type].preferred_metric_and_initial_score()
 
@@ -94,19 +116,22 @@ def train_tensorflow(reader, train_data, test_data, dev_data, configuration: dic
             logger.info("Saving reader_type to: %s" % save_dir)
         return m
 
-    # this is the standard hook for the reader_type
-    hooks.append(readers.eval_hooks[reader_type](
-        reader, dev_data, dev_batch_size, summary_writer=sw, side_effect=side_effect,
-        iter_interval=validation_interval,
-        epoch_interval=(1 if validation_interval is None else None),
-        write_metrics_to=write_metrics_to))
+    # this is the standard hook for the reader_type, only the chief of a cluster evaluates and stores the reader
+    if is_chief:
+        hooks.append(readers.eval_hooks[reader_type](
+            reader, dev_data, dev_batch_size, summary_writer=sw, side_effect=side_effect,
+            iter_interval=validation_interval,
+            epoch_interval=(1 if validation_interval is None else None),
+            write_metrics_to=write_metrics_to))
 
     # Train
     reader.train(tf_optimizer, train_data, batch_size, max_epochs=epochs, hooks=hooks,
-                 l2=l2, clip=clip_value, clip_op=tf.clip_by_value)
+                 l2=l2, clip=clip_value, clip_op=tf.clip_by_value, cluster=cluster)
+    if throughput_file is not None:
+        write_throughput(throughput_file, speed_hook, 0 if cluster is None else cluster.task_index, num_workers)
 
     # Test final reader_type
-    if test_data is not None and save_dir is not None:
+    if test_data is not None and save_dir is not None and is_chief:
         test_eval_hook = readers.eval_hooks[reader_type](
             reader, test_data, batch_size, summary_writer=sw, epoch_interval=1, write_metrics_to=write_metrics_to)
 
@@ -114,14 +139,29 @@ def train_tensorflow(reader, train_data, test_data, dev_data, configuration: dic
         test_eval_hook.at_test_time(1)
 
 
+def write_throughput(path, speed_hook: ExamplesPerSecHook, rank=0, num_workers=1):
+    """Appends the training throughput measured by the hook, as a JSON line, to the file at the given path."""
+    with open(path, 'a') as f:
+        f.write(json.dumps({'rank': rank, 'num_workers': num_workers,
+                            'examples_per_sec': speed_hook.examples_per_sec}) + '\n')
+
+
 def train_pytorch(reader, train_data, test_data, dev_data, configuration: dict, debug=False):
     import torch
+    from jack.core.torch import TorchCluster
     seed = configuration.get('seed')
 
     # make everything deterministic
     random.seed(seed)
     torch.manual_seed(seed)
 
+    if configuration.get('num_threads'):
+        torch.set_num_threads(configuration.get('num_threads'))
+    cluster = TorchCluster.from_config(configuration)
+    is_chief = cluster is None or cluster.is_chief
+    if cluster is not None:
+        logger.info("Training as rank %d of %d" % (cluster.rank, cluster.world_size))
+
     clip_value = configuration.get('clip_value')
     batch_size = configuration.get('batch_size')
     epochs = configuration.get('epochs')
@@ -135,6 +175,7 @@ def train_pytorch(reader, train_data, test_data, dev_data, configuration: dict,
     model = configuration.get('reader')
     save_dir = configuration.get('save_dir')
     write_metrics_to = configuration.get('write_metrics_to')
+    throughput_file = configuration.get('throughput_file')
 
     # need setup here already :(
     reader.setup_from_data(train_data, is_training=True)
@@ -159,7 +200,7 @@ def train_pytorch(reader, train_data, test_data, dev_data, configuration: dict,
     torch_optimizer = torch_optimizer_class(params, lr=learning_rate)
 
     sw = None
-    if tensorboard_folder is not None:
+    if tensorboard_folder is not None and is_chief:
         import tensorflow as tf
         if os.path.exists(tensorboard_folder):
             shutil.rmtree(tensorboard_folder)
@@ -167,8 +208,8 @@ def train_pytorch(reader, train_data, test_data, dev_data, configuration: dict,
 
     # Hooks
     iter_interval = 1 if debug else log_interval
-    hooks = [LossHook(reader, iter_interval, summary_writer=sw),
-             ExamplesPerSecHook(reader, batch_size, iter_interval, sw)]
+    speed_hook = ExamplesPerSecHook(reader, batch_size, iter_interval, sw)
+    hooks = [LossHook(reader, iter_interval, summary_writer=sw), speed_hook]
 
     preferred_metric, best_metric = readers.eval_hooks[model].preferred_metric_and_best_score()
 
@@ -188,19 +229,23 @@ def train_pytorch(reader, train_data, test_data, dev_data, configuration: dict,
             logger.info("Saving model to: %s" % save_dir)
         return m
 
-    # this is the standard hook for the model
-    hooks.append(readers.eval_hooks[model](
-        reader, dev_data, batch_size, summary_writer=sw, side_effect=side_effect,
-        iter_interval=validation_interval,
-        epoch_interval=(1 if validation_interval is None else None),
-        write_metrics_to=write_metrics_to))
+    # this is the standard hook for the model, only rank 0 of a cluster evaluates and stores the model
+    if is_chief:
+        hooks.append(readers.eval_hooks[model](
+            reader, dev_data, batch_size, summary_writer=sw, side_effect=side_effect,
+            iter_interval=validation_interval,
+            epoch_interval=(1 if validation_interval is None else None),
+            write_metrics_to=write_metrics_to))
 
     # Train
     reader.train(torch_optimizer, train_data, batch_size, max_epochs=epochs, hooks=hooks,
-                 l2=l2, clip=clip_value)
+                 l2=l2, clip=clip_value, cluster=cluster)
+    if throughput_file is not None:
+        write_throughput(throughput_file, speed_hook, 0 if cluster is None else cluster.rank,
+                         1 if cluster is None else cluster.world_size)
 
     # Test final model
-    if test_data is not None and save_dir is not None:
+    if test_data is not None and save_dir is not None and is_chief:
         test_eval_hook = readers.eval_hooks[model](
             reader, test_data, summary_writer=sw, epoch_interval=1, write_metrics_to=write_metrics_to)
 
@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+
+"""Exact and approximate search for the rows of an embedding matrix that are most similar to a batch of queries.
+
+An `IVFIndex` can be stored in a directory with the following files, of which ids and codes are memory-mapped
+read-only on load:
+
+    meta.json                  metric and number of vectors, partitions and subspaces
+    centroids.npy              float32 k-means centroids of the partitions
+    ids.npy                    int64 vector ids sorted by partition, partition p holds `ids[offsets[p]:offsets[p + 1]]`
+    offsets.npy                int64 offsets of the partitions in `ids`
+    codebooks.npy              float32 product quantization centroids of each subspace (only with subspaces)
+    codes.npy                  uint8 product quantization codes of the vectors, in the order of `ids`
+
+The vectors themselves are not stored, as they are usually memory-mapped already (e.g., by
+`jack.io.embeddings.memory_map`); they are only needed to search indices without product quantization.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+METRICS = ['dot', 'cosine', 'l1', 'l2']
+
+_META_FILE = 'meta.json'
+
+# maximum number of query-vector differences held in memory at once by `similarities` with the 'l1' metric
+_max_chunk_size = 1 << 24
+
+
+def similarities(queries: np.ndarray, vectors: np.ndarray, metric: str = 'dot') -> np.ndarray:
+    """
+    Args:
+        queries: (nb_queries, dim) matrix.
+        vectors: (nb_vectors, dim) matrix.
+        metric: 'dot' for inner products, 'cosine' for cosine similarities, 'l1' or 'l2' for negative L1 or squared
+            L2 distances.
+
+    Returns:
+        (nb_queries, nb_vectors) similarities, higher is more similar.
+    """
+    if metric == 'dot':
+        return queries.dot(vectors.T)
+    elif metric == 'cosine':
+        return normalize(queries).dot(normalize(vectors).T)
+    elif metric == 'l2':
+        return 2.0 * queries.dot(vectors.T) - (queries * queries).sum(axis=1)[:, None] - (vectors * vectors).sum(axis=1)
+    elif metric == 'l1':
+        result = np.empty([len(queries), len(vectors)], dtype=np.result_type(queries, vectors))
+        chunk_size = max(1, _max_chunk_size // max(1, vectors.size))
+        for start in range(0, len(queries), chunk_size):
+            chunk = queries[start:start + chunk_size]
+            result[start:start + chunk_size] = - np.abs(chunk[:, None, :] - vectors[None]).sum(axis=2)
+        return result
+    raise ValueError('Unknown metric: {}'.format(metric))
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scales rows to unit L2 norm, zero rows are kept."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def top_k(scores: np.ndarray, k: int):
+    """Selects the k highest scores of each row, ties broken by lower column index.
+
+    Returns:
+        (indices, scores) of shape (nb_rows, min(k, nb_columns)), sorted by decreasing score.
+    """
+    k = min(k, scores.shape[1])
+    rows = np.arange(len(scores))[:, None]
+    if k < scores.shape[1]:
+        # the k-th highest score and every column with a higher score are candidates, ties are resolved below
+        kth = -np.partition(-scores, k - 1, axis=1)[:, k - 1:k]
+        candidates = [np.flatnonzero(row >= t) for row, t in zip(scores, kth)]
+    else:
+        candidates = [np.arange(scores.shape[1])] * len(scores)
+    indices = np.zeros([len(scores), k], dtype=np.int64)
+    for i, c in enumerate(candidates):
+        indices[i] = c[np.lexsort((c, -scores[i, c]))[:k]]
+    return indices, scores[rows, indices]
+
+
+def search(queries: np.ndarray, vectors: np.ndarray, k: int, metric: str = 'dot', block_size: int = 1 << 16):
+    """Exact search over blocks of vectors, so that vectors can be memory-mapped (or quantized, like the lookup of
+    `jack.io.embeddings.Embeddings`) and are never copied as a whole.
+
+    Returns:
+        (ids, scores) of shape (nb_queries, min(k, nb_vectors)), sorted by decreasing similarity, ties by id.
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    ids = np.zeros([len(queries), 0], dtype=np.int64)
+    scores = np.zeros([len(queries), 0], dtype=np.float32)
+    for start in range(0, len(vectors), block_size):
+        block = np.asarray(vectors[start:start + block_size], dtype=np.float32)
+        # previous results have lower ids than the block, so that ties are still broken by id
+        ids = np.concatenate([ids, np.broadcast_to(np.arange(start, start + len(block)), [len(queries), len(block)])],
+                             axis=1)
+        best, scores = top_k(np.concatenate([scores, similarities(queries, block, metric)], axis=1), k)
+        ids = np.take_along_axis(ids, best, axis=1)
+    return ids, scores
+
+
+class ProductQuantizer:
+    """Splits vectors into `nb_subspaces` equally sized subvectors, each of which is encoded by the id of its closest
+    of up to 256 k-means centroids of that subspace. Similarities of a query to encoded vectors are sums of the
+    similarities of its subvectors to the centroids, which are computed once per query (asymmetric distance
+    computation)."""
+
+    def __init__(self, codebooks: np.ndarray):
+        """
+        Args:
+            codebooks: (nb_subspaces, nb_centroids, subspace_dim) centroids.
+        """
+        self.codebooks = codebooks
+
+    @staticmethod
+    def train(vectors: np.ndarray, nb_subspaces: int, nb_iterations: int = 10,
+              rng: np.random.RandomState = None) -> 'ProductQuantizer':
+        if vectors.shape[1] % nb_subspaces != 0:
+            raise ValueError('Dimension {} is not divisible into {} subspaces'.format(vectors.shape[1], nb_subspaces))
+        nb_centroids = min(256, len(vectors))
+        return ProductQuantizer(np.stack([kmeans(np.ascontiguousarray(subvectors), nb_centroids, nb_iterations, rng)
+                                          for subvectors in np.split(vectors, nb_subspaces, axis=1)]))
+
+    @property
+    def nb_subspaces(self):
+        return self.codebooks.shape[0]
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Returns:
+            (nb_vectors, nb_subspaces) uint8 codes.
+        """
+        return np.stack([_assign(np.ascontiguousarray(subvectors), codebook).astype(np.uint8)
+                         for subvectors, codebook in zip(np.split(vectors, self.nb_subspaces, axis=1),
+                                                         self.codebooks)], axis=1)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return np.concatenate([codebook[codes[:, j]] for j, codebook in enumerate(self.codebooks)], axis=1)
+
+    def tables(self, queries: np.ndarray, metric: str) -> np.ndarray:
+        """
+        Args:
+            queries: (nb_queries, dim) matrix.
+            metric: 'dot', 'l1' or 'l2', which are sums over subspaces.
+
+        Returns:
+            (nb_queries, nb_subspaces, nb_centroids) similarities of the subvectors of the queries to the centroids.
+        """
+        return np.stack([similarities(np.ascontiguousarray(subqueries), codebook, metric)
+                         for subqueries, codebook in zip(np.split(queries, self.nb_subspaces, axis=1),
+                                                         self.codebooks)], axis=1)
+
+    def similarities(self, table: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Approximate similarities of a query, given by its table, to the encoded vectors."""
+        return table[np.arange(self.nb_subspaces), codes].sum(axis=1)
+
+
+class IVFIndex:
+    """Inverted file index: vectors are partitioned by k-means clustering, and each query is compared only with the
+    vectors of the `nprobe` partitions whose centroids are most similar to it. Results are approximate, as true
+    neighbours in other partitions are missed.
+
+    With `nb_subspaces`, vectors are also encoded by a `ProductQuantizer` (IVF-PQ), so that the index only holds a
+    few bytes per vector and searches do not access the vectors, at the cost of approximate similarities. These can
+    be corrected by re-ranking the best candidates with the vectors, see `search`.
+
+    With the 'cosine' metric, vectors are normalized before they are partitioned and encoded.
+    """
+
+    def __init__(self, vectors: np.ndarray, centroids: np.ndarray, ids: np.ndarray, offsets: np.ndarray,
+                 metric: str = 'dot', quantizer: ProductQuantizer = None, codes: np.ndarray = None):
+        """Use `build` or `load` to create indices."""
+        self.vectors = vectors
+        self.centroids = centroids
+        self.ids = ids
+        self.offsets = offsets
+        self.metric = metric
+        self.quantizer = quantizer
+        self.codes = codes
+
+    @staticmethod
+    def build(vectors: np.ndarray, nb_partitions: int, metric: str = 'dot', nb_subspaces: int = 0,
+              nb_iterations: int = 10, sample_size: int = 64, seed: int = 0, block_size: int = 1 << 16):
+        """
+        Args:
+            vectors: (nb_vectors, dim) matrix to index, e.g., memory-mapped, which is read in blocks.
+            nb_partitions: number of k-means clusters.
+            metric: one of `METRICS`.
+            nb_subspaces: number of product quantization subspaces, 0 to search the vectors themselves.
+            nb_iterations: number of k-means iterations.
+            sample_size: number of vectors per partition (and per product quantization centroid) that k-means is
+                trained on.
+            seed: seed of the random initialization and sample.
+            block_size: number of vectors that are assigned and encoded at once.
+        """
+        if metric not in METRICS:
+            raise ValueError('Unknown metric: {}'.format(metric))
+        rng = np.random.RandomState(seed)
+        nb_partitions = max(1, min(nb_partitions, len(vectors)))
+        nb_samples = max(nb_partitions, 256 if nb_subspaces else 0) * sample_size
+        sample_ids = np.arange(len(vectors))
+        if len(vectors) > nb_samples:
+            sample_ids = np.sort(rng.choice(len(vectors), nb_samples, replace=False))
+        sample = _prepare(vectors[sample_ids], metric)
+        centroids = kmeans(sample, nb_partitions, nb_iterations, rng)
+        quantizer = ProductQuantizer.train(sample, nb_subspaces, nb_iterations, rng) if nb_subspaces else None
+
+        assignment, codes = [], []
+        for start in range(0, len(vectors), block_size):
+            block = _prepare(vectors[start:start + block_size], metric)
+            assignment.append(_assign(block, centroids))
+            if quantizer is not None:
+                codes.append(quantizer.encode(block))
+        assignment = np.concatenate(assignment) if assignment else np.zeros([0], dtype=np.int64)
+        ids = np.argsort(assignment, kind='mergesort')
+        offsets = np.searchsorted(assignment[ids], np.arange(nb_partitions + 1))
+        if quantizer is not None:
+            codes = np.concatenate(codes)[ids] if codes else np.zeros([0, nb_subspaces], dtype=np.uint8)
+        else:
+            codes = None
+        return IVFIndex(vectors, centroids, ids, offsets, metric, quantizer, codes)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def store(self, path: str):
+        """Stores the index in a new directory at `path`, which is written to a temporary location first."""
+        parent = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(parent):
+            os.makedirs(parent)
+        tmp_dir = tempfile.mkdtemp(dir=parent, prefix='.tmp_ann_')
+        try:
+            np.save(os.path.join(tmp_dir, 'centroids.npy'), self.centroids)
+            np.save(os.path.join(tmp_dir, 'ids.npy'), self.ids)
+            np.save(os.path.join(tmp_dir, 'offsets.npy'), self.offsets)
+            if self.quantizer is not None:
+                np.save(os.path.join(tmp_dir, 'codebooks.npy'), self.quantizer.codebooks)
+                np.save(os.path.join(tmp_dir, 'codes.npy'), self.codes)
+            with open(os.path.join(tmp_dir, _META_FILE), 'w') as f:
+                json.dump({'metric': self.metric, 'num_vectors': len(self), 'num_partitions': len(self.centroids),
+                           'num_subspaces': self.quantizer.nb_subspaces if self.quantizer is not None else 0}, f)
+            os.rename(tmp_dir, path)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    @staticmethod
+    def load(path: str, vectors: np.ndarray = None) -> 'IVFIndex':
+        """Loads an index stored by `store`.
+
+        Args:
+            path: directory of the index.
+            vectors: the indexed vectors, which are required for searches without product quantization and for
+                re-ranking.
+        """
+        with open(os.path.join(path, _META_FILE)) as f:
+            meta = json.load(f)
+        if vectors is not None and len(vectors) != meta['num_vectors']:
+            raise ValueError('Index {} of {} vectors does not match {} vectors'.format(
+                path, meta['num_vectors'], len(vectors)))
+        quantizer, codes = None, None
+        if meta['num_subspaces']:
+            quantizer = ProductQuantizer(np.load(os.path.join(path, 'codebooks.npy')))
+            codes = np.load(os.path.join(path, 'codes.npy'), mmap_mode='r')
+        return IVFIndex(vectors, np.load(os.path.join(path, 'centroids.npy')),
+                        np.load(os.path.join(path, 'ids.npy'), mmap_mode='r'),
+                        np.load(os.path.join(path, 'offsets.npy')), meta['metric'], quantizer, codes)
+
+    def search(self, queries: np.ndarray, k: int, nprobe: int = 8, rerank: int = 0):
+        """
+        Args:
+            queries: (nb_queries, dim) matrix.
+            k: number of results per query.
+            nprobe: number of partitions searched per query.
+            rerank: with product quantization, the `rerank * k` best candidates by approximate similarity are
+                re-ranked by their exact similarity, which requires the vectors.
+
+        Returns:
+            (ids, scores) of shape (nb_queries, k) sorted by decreasing similarity. If fewer than k vectors are
+            searched for a query, its remaining ids are -1 and scores -inf.
+        """
+        queries = _prepare(np.asarray(queries, dtype=np.float32), self.metric)
+        metric = 'dot' if self.metric == 'cosine' else self.metric
+        if self.quantizer is None or rerank:
+            if self.vectors is None:
+                raise ValueError('Searching without product quantization or re-ranking requires the vectors')
+        probes, _ = top_k(similarities(queries, self.centroids, metric), nprobe)
+        tables = self.quantizer.tables(queries, metric) if self.quantizer is not None else None
+        ids = np.full([len(queries), k], -1, dtype=np.int64)
+        scores = np.full([len(queries), k], -np.inf, dtype=np.float32)
+        for i, query in enumerate(queries):
+            partitions = [slice(self.offsets[p], self.offsets[p + 1]) for p in probes[i]]
+            candidates = np.concatenate([self.ids[p] for p in partitions])
+            if len(candidates) == 0:
+                continue
+            # candidates in increasing order, so that ties are broken by id as in exact search
+            order = np.argsort(candidates, kind='mergesort')
+            candidates = candidates[order]
+            if self.quantizer is None:
+                candidate_scores = similarities(query[None], self._vectors(candidates), metric)
+            else:
+                codes = np.concatenate([self.codes[p] for p in partitions])[order]
+                candidate_scores = self.quantizer.similarities(tables[i], codes)[None]
+                if rerank:
+                    best, _ = top_k(candidate_scores, rerank * k)
+                    candidates = np.sort(candidates[best[0]])
+                    candidate_scores = similarities(query[None], self._vectors(candidates), metric)
+            best, best_scores = top_k(candidate_scores, k)
+            ids[i, :best.shape[1]] = candidates[best[0]]
+            scores[i, :best.shape[1]] = best_scores[0]
+        return ids, scores
+
+    def _vectors(self, ids):
+        return _prepare(np.asarray(self.vectors[ids], dtype=np.float32), self.metric)
+
+
+def kmeans(vectors: np.ndarray, nb_clusters: int, nb_iterations: int = 10, rng: np.random.RandomState = None):
+    """Lloyd's k-means with centroids initialized to random vectors; empty clusters keep their previous centroid.
+
+    Returns:
+        (nb_clusters, dim) centroids.
+    """
+    rng = rng or np.random.RandomState(0)
+    centroids = vectors[rng.choice(len(vectors), nb_clusters, replace=False)].copy()
+    for _ in range(nb_iterations):
+        assignment = _assign(vectors, centroids)
+        counts = np.bincount(assignment, minlength=nb_clusters)
+        non_empty = counts > 0
+        starts = np.cumsum(counts) - counts
+        sums = np.add.reduceat(vectors[np.argsort(assignment, kind='mergesort')], starts[non_empty], axis=0)
+        centroids[non_empty] = sums / counts[non_empty, None]
+    return centroids
+
+
+def _assign(vectors, centroids, batch_size=4096):
+    """Index of the closest centroid (by L2 distance) of each vector."""
+    assignment = np.empty([len(vectors)], dtype=np.int64)
+    # the squared norm of the vector does not change which centroid is closest
+    half_norms = 0.5 * (centroids * centroids).sum(axis=1)
+    for start in range(0, len(vectors), batch_size):
+        scores = vectors[start:start + batch_size].dot(centroids.T)
+        scores -= half_norms
+        assignment[start:start + batch_size] = scores.argmax(axis=1)
+    return assignment
+
+
+def _prepare(vectors, metric):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return normalize(vectors) if metric == 'cosine' else vectors
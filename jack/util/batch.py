@@ -1,15 +1,21 @@
 # -*- coding: utf-8 -*-
 
+import logging
+import queue
 import random
-
+import threading
+from contextlib import contextmanager
 from itertools import islice
-from typing import TypeVar, List, Iterator, Optional
+from time import time
+from typing import TypeVar, List, Iterator, Optional, Iterable, Callable
 
 import numpy as np
 
 from jack.util.map import numpify
 from jack.util.random import DefaultRandomState
 
+logger = logging.getLogger(__name__)
+
 rs = DefaultRandomState(1337)
 
 
@@ -21,6 +27,106 @@ class GeneratorWithRestart(object):
         return self.iterator()
 
 
+class BatchPrefetcher(object):
+    """Creates batches ahead of time in a background thread and hands them out through a bounded queue.
+
+    Each pass through the prefetcher is one pass through `batches`. Timing statistics of the last pass tell whether
+    training is input bound or compute bound:
+    - `empty_time`: seconds the consumer waited because no batch was ready (input is the bottleneck)
+    - `full_time`: seconds the producer waited because the queue was full (compute is the bottleneck)
+
+    Batches are usually created by an input module, which is not thread-safe (e.g., its random state and
+    vocabulary). Code that uses the input module while batches are prefetched, such as evaluation hooks, must run
+    within `paused()`.
+    """
+
+    def __init__(self, batches: Iterable, depth: int = 2, transform: Optional[Callable] = None):
+        """
+        Args:
+            batches: iterable of batches (can be restartable, like `GeneratorWithRestart`).
+            depth: maximum number of ready batches held in the queue.
+            transform: optional function applied to each batch in the background thread, e.g., conversion to
+                feed dicts.
+        """
+        self.batches = batches
+        self.depth = depth
+        self.transform = transform
+        self.empty_time = 0.0
+        self.full_time = 0.0
+        self.num_batches = 0
+        # held by the producer while it creates a batch
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def paused(self):
+        """Context in which no batches are created, it is entered once the batch in progress is done."""
+        with self._lock:
+            yield
+
+    def __iter__(self):
+        self.empty_time = self.full_time = 0.0
+        self.num_batches = 0
+        q = queue.Queue(self.depth)
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                batches = iter(self.batches)
+                while True:
+                    with self._lock:
+                        batch = next(batches, _EndOfBatches)
+                        if batch is _EndOfBatches:
+                            break
+                        if self.transform is not None:
+                            batch = self.transform(batch)
+                    start = time()
+                    if not put(batch):
+                        return
+                    self.full_time += time() - start
+                put(_EndOfBatches)
+            except Exception as e:
+                put(_PrefetchError(e))
+
+        thread = threading.Thread(target=produce, name='BatchPrefetcher', daemon=True)
+        thread.start()
+        try:
+            while True:
+                start = time()
+                item = q.get()
+                self.empty_time += time() - start
+                if item is _EndOfBatches:
+                    break
+                if isinstance(item, _PrefetchError):
+                    raise item.error
+                self.num_batches += 1
+                yield item
+        finally:
+            stop.set()
+            thread.join()
+
+    def log_stats(self):
+        logger.info("Input pipeline: %d batches, waited %.2fs for input (queue empty), %.2fs for compute "
+                    "(queue full)" % (self.num_batches, self.empty_time, self.full_time))
+
+
+class _EndOfBatches(object):
+    pass
+
+
+class _PrefetchError(object):
+    def __init__(self, error):
+        self.error = error
+
+
 def get_buckets(data, order, structure):
     """
     Generates mapping between data instances and bucket-ID's.
@@ -195,3 +301,80 @@ def shuffle_and_batch(items: List[T], batch_size: int,
         todo = todo[batch_size:]
         items_batch = [items[i] for i in indices]
         yield items_batch
+
+
+def bucket_and_batch(items: List[T], batch_size: int, lengths: List, rng: Optional[random.Random] = None,
+                     window: int = 100) -> Iterator[List[T]]:
+    """Batches items of similar length together.
+
+    Items are (optionally) shuffled, split into windows of `window * batch_size` items, and sorted by length within
+    each window before batching. The order of the resulting batches is shuffled again, so that neither batch
+    composition nor batch order is determined by length alone.
+
+    Args:
+        - items: List of items to batch.
+        - batch_size: size of batches.
+        - lengths: sort key (e.g., a length or a tuple of lengths) of each item.
+        - rng: random number generator if items should be shuffled, else None.
+        - window: number of batches per sorting window.
+
+    Returns: Batch iterator
+    """
+    todo = list(range(len(items)))
+    if rng is not None:
+        rng.shuffle(todo)
+    window_size = max(window, 1) * batch_size
+    batches = []
+    for start in range(0, len(todo), window_size):
+        sorted_window = sorted(todo[start:start + window_size], key=lambda i: lengths[i])
+        batches.extend(sorted_window[i:i + batch_size] for i in range(0, len(sorted_window), batch_size))
+    if rng is not None:
+        rng.shuffle(batches)
+    for indices in batches:
+        yield [items[i] for i in indices]
+
+
+def padding_efficiency(batch_lengths: Iterable[List[int]]) -> float:
+    """Fraction of real (non-padding) elements in batches that are padded to their longest sequence.
+
+    Args:
+        - batch_lengths: for each batch, the lengths of its sequences.
+
+    Returns: total length of all sequences divided by the total size of the padded batches.
+    """
+    real, padded = 0, 0
+    for lengths in batch_lengths:
+        if lengths:
+            real += sum(lengths)
+            padded += max(lengths) * len(lengths)
+    return real / padded if padded > 0 else 1.0
+
+
+def batch_by_tokens(items: List[T], max_tokens: int, lengths: List[int],
+                    num_rows: Optional[List[int]] = None) -> Iterator[List[T]]:
+    """Batches items in their given order, such that padded batches stay within a budget of tokens.
+
+    The padded size of a batch is its total number of rows times the length of its longest item, where an item can
+    span several rows (e.g., one per support document). Items that exceed the budget on their own form a batch of
+    their own.
+
+    Args:
+        - items: List of items to batch.
+        - max_tokens: maximum padded size of a batch.
+        - lengths: length of each item.
+        - num_rows: number of rows of each item, defaults to 1.
+
+    Returns: Batch iterator
+    """
+    batch, rows, max_length = [], 0, 0
+    for i, item in enumerate(items):
+        item_rows = num_rows[i] if num_rows is not None else 1
+        new_max_length = max(max_length, lengths[i])
+        if batch and (rows + item_rows) * new_max_length > max_tokens:
+            yield batch
+            batch, rows, new_max_length = [], 0, lengths[i]
+        batch.append(item)
+        rows += item_rows
+        max_length = new_max_length
+    if batch:
+        yield batch
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+
+"""On-disk inverted index of paragraphs with BM25 scoring, to retrieve supports for open-domain QA.
+
+An index is a directory with the following files, all memory-mapped read-only on load:
+
+    meta.json                  number of paragraphs, average paragraph length and BM25 parameters
+    terms.table                string table (see `jack.util.string_table`) from terms to term ids
+    term_offsets.npy           int64, the postings of term t are at `term_offsets[t]:term_offsets[t + 1]`
+    postings.npy               int32 paragraph ids, sorted per term
+    impacts.npy                float32 BM25 term frequency component of each posting
+    paragraph_offsets.npy      int64, paragraph i is at `paragraph_offsets[i]:paragraph_offsets[i + 1]`
+    paragraphs.bin             utf-8 encoded paragraphs
+
+As the term frequency component of BM25 only depends on the paragraph, it is computed when the index is built, so
+scoring a query only multiplies the impacts of the postings of its terms with their IDF.
+"""
+
+import json
+import os
+import re
+import shutil
+import tempfile
+from collections import Counter
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from jack.core.data_structures import QASetting
+from jack.util.string_table import StringTable, store_string_table
+
+_META_FILE = 'meta.json'
+_pattern = re.compile('\w+')
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens of `text` as indexed and queried by `BM25Index`."""
+    return _pattern.findall(text.lower())
+
+
+def corpus_paragraphs(dataset) -> List[str]:
+    """Collects the distinct supports of a dataset (e.g., as streamed by `jack.io.load.stream_squad`) in order of their
+    first occurrence."""
+    paragraphs = dict()
+    for qa_setting, _ in dataset:
+        for support in qa_setting.support or ():
+            paragraphs.setdefault(support, len(paragraphs))
+    return list(paragraphs)
+
+
+def build_bm25_index(path: str, paragraphs: Iterable[str], k1: float = 1.2, b: float = 0.75,
+                     block_size: int = 1 << 22):
+    """Builds a BM25 index of paragraphs in a new directory at `path`.
+
+    Paragraphs are streamed to disk; (term, paragraph) pairs are counted in blocks of about `block_size` tokens and
+    sorted into postings at the end. The directory is written to a temporary location first and then moved to `path`.
+
+    Args:
+        path: directory to create.
+        paragraphs: paragraphs to index, their ids are their positions.
+        k1: BM25 term frequency saturation.
+        b: BM25 length normalization.
+        block_size: number of tokens whose (term, paragraph) pairs are counted at once.
+    """
+    parent = os.path.dirname(os.path.abspath(path))
+    if not os.path.exists(parent):
+        os.makedirs(parent)
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix='.tmp_bm25_')
+    try:
+        terms = dict()
+        lengths, paragraph_offsets = [], [0]
+        keys, counts = [], []
+        block_terms, block_paragraphs = [], []
+
+        def count_block():
+            block_keys = (np.array(block_terms, dtype=np.int64) << 32) | np.array(block_paragraphs, dtype=np.int64)
+            block_keys, block_counts = np.unique(block_keys, return_counts=True)
+            keys.append(block_keys)
+            counts.append(block_counts.astype(np.int32))
+            del block_terms[:], block_paragraphs[:]
+
+        with open(os.path.join(tmp_dir, 'paragraphs.bin'), 'wb') as f:
+            for i, paragraph in enumerate(paragraphs):
+                encoded = paragraph.encode('utf-8')
+                f.write(encoded)
+                paragraph_offsets.append(paragraph_offsets[-1] + len(encoded))
+                tokens = tokenize(paragraph)
+                lengths.append(len(tokens))
+                block_terms.extend(terms.setdefault(t, len(terms)) for t in tokens)
+                block_paragraphs.extend([i] * len(tokens))
+                # blocks end at paragraph boundaries, so (term, paragraph) pairs are unique across blocks
+                if len(block_terms) >= block_size:
+                    count_block()
+        count_block()
+
+        keys, counts = np.concatenate(keys), np.concatenate(counts)
+        order = np.argsort(keys, kind='mergesort')
+        keys, counts = keys[order], counts[order]
+        postings = (keys & 0xffffffff).astype(np.int32)
+        term_offsets = np.zeros([len(terms) + 1], dtype=np.int64)
+        np.cumsum(np.bincount(keys >> 32, minlength=len(terms)), out=term_offsets[1:])
+
+        lengths = np.array(lengths, dtype=np.float32)
+        avg_length = float(lengths.mean()) if len(lengths) and lengths.sum() > 0 else 1.0
+        norms = k1 * (1.0 - b + b * lengths / avg_length)
+        impacts = (counts * (k1 + 1.0) / (counts + norms[postings])).astype(np.float32)
+
+        store_string_table(os.path.join(tmp_dir, 'terms.table'), terms)
+        np.save(os.path.join(tmp_dir, 'term_offsets.npy'), term_offsets)
+        np.save(os.path.join(tmp_dir, 'postings.npy'), postings)
+        np.save(os.path.join(tmp_dir, 'impacts.npy'), impacts)
+        np.save(os.path.join(tmp_dir, 'paragraph_offsets.npy'), np.array(paragraph_offsets, dtype=np.int64))
+        with open(os.path.join(tmp_dir, _META_FILE), 'w') as f:
+            json.dump({'num_paragraphs': len(lengths), 'avg_length': avg_length, 'k1': k1, 'b': b}, f)
+        os.rename(tmp_dir, path)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+class BM25Index:
+    """Read-only BM25 index written by `build_bm25_index`."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, _META_FILE)) as f:
+            self.meta = json.load(f)
+        self._terms = StringTable(os.path.join(path, 'terms.table'))
+        self._term_offsets = np.load(os.path.join(path, 'term_offsets.npy'), mmap_mode='r')
+        self._postings = np.load(os.path.join(path, 'postings.npy'), mmap_mode='r')
+        self._impacts = np.load(os.path.join(path, 'impacts.npy'), mmap_mode='r')
+        self._paragraph_offsets = np.load(os.path.join(path, 'paragraph_offsets.npy'), mmap_mode='r')
+        paragraphs_file = os.path.join(path, 'paragraphs.bin')
+        if os.path.getsize(paragraphs_file) > 0:
+            self._paragraphs = np.memmap(paragraphs_file, dtype=np.uint8, mode='r')
+        else:
+            self._paragraphs = np.zeros([0], dtype=np.uint8)
+
+    def __len__(self):
+        return self.meta['num_paragraphs']
+
+    def paragraph(self, i: int) -> str:
+        return self._paragraphs[self._paragraph_offsets[i]:self._paragraph_offsets[i + 1]].tobytes().decode('utf-8')
+
+    def idf(self, term_ids: np.ndarray) -> np.ndarray:
+        """Non-negative BM25 IDF of the given term ids."""
+        df = self._term_offsets[term_ids + 1] - self._term_offsets[term_ids]
+        return np.log(1.0 + (len(self) - df + 0.5) / (df + 0.5))
+
+    def search(self, queries: Sequence[str], k: int = 10) -> List[List[Tuple[int, float]]]:
+        """Retrieves the top-k paragraphs for each query.
+
+        Scores are accumulated term by term in a dense buffer of paragraph scores that is shared by all queries of the
+        batch. Only the paragraphs in the postings of a query are ranked and reset, unless the postings cover a large
+        part of the index.
+
+        Args:
+            queries: queries, e.g., questions.
+            k: number of paragraphs to retrieve per query.
+
+        Returns:
+            for each query, up to k (paragraph id, BM25 score) pairs sorted by decreasing score, ties by paragraph id.
+        """
+        scores = np.zeros([len(self)], dtype=np.float32)
+        results = []
+        for query in queries:
+            term_ids, term_counts = [], []
+            for term, count in Counter(tokenize(query)).items():
+                term_id = self._terms.get(term)
+                if term_id is not None:
+                    term_ids.append(term_id)
+                    term_counts.append(count)
+            if not term_ids or k <= 0:
+                results.append([])
+                continue
+            term_ids = np.array(term_ids, dtype=np.int64)
+            weights = (self.idf(term_ids) * term_counts).astype(np.float32)
+            starts, ends = self._term_offsets[term_ids], self._term_offsets[term_ids + 1]
+            # postings of a term are unique, so scores of each term can be added with fancy indexing
+            for start, end, weight in zip(starts, ends, weights):
+                scores[self._postings[start:end]] += weight * self._impacts[start:end]
+
+            dense = (ends - starts).sum() > len(self) // 8
+            if dense:
+                candidates = np.flatnonzero(scores)
+            else:
+                candidates = np.unique(np.concatenate([self._postings[s:e] for s, e in zip(starts, ends)]))
+            candidate_scores = scores[candidates]
+            if len(candidates) > k:
+                # keep all paragraphs tied with the k-th best, so that ties are broken by paragraph id
+                threshold = np.partition(candidate_scores, len(candidates) - k)[len(candidates) - k]
+                top = candidate_scores >= threshold
+                candidates, candidate_scores = candidates[top], candidate_scores[top]
+            order = np.lexsort((candidates, -candidate_scores))[:k]
+            results.append([(int(candidates[j]), float(candidate_scores[j])) for j in order])
+
+            if dense:
+                scores.fill(0.0)
+            else:
+                for start, end in zip(starts, ends):
+                    scores[self._postings[start:end]] = 0.0
+        return results
+
+    def retrieve(self, qa_settings: Sequence[QASetting], k: int = 10, batch_size: int = 1000) -> List[QASetting]:
+        """Returns copies of the given QA settings whose supports are the top-k paragraphs for their questions.
+
+        Args:
+            qa_settings: questions to retrieve supports for, their own supports are ignored.
+            k: number of supports per question.
+            batch_size: number of questions searched at once.
+        """
+        result = []
+        for start in range(0, len(qa_settings), batch_size):
+            batch = qa_settings[start:start + batch_size]
+            for qa_setting, hits in zip(batch, self.search([q.question for q in batch], k)):
+                result.append(QASetting(qa_setting.question, [self.paragraph(i) for i, _ in hits], id=qa_setting.id,
+                                        candidates=qa_setting.candidates))
+        return result
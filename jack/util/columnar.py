@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+"""Columnar, memory-mapped storage for preprocessed annotations.
+
+Annotations (named tuples, lists or tuples of possibly nested lists of ints, floats and strings) are stored column by
+column as flat numpy arrays plus offset arrays for every level of nesting. Integers are stored as int32, floats as
+float32 and strings as utf-8 bytes. All arrays are saved as `.npy` files and memory-mapped read-only on load, so
+that several processes reading the same store share its pages.
+"""
+
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Sequence, List, Any
+
+import numpy as np
+
+_META_FILE = 'meta.json'
+
+
+def fingerprint(*parts) -> str:
+    """Returns a hex digest of the string representations of `parts`."""
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(repr(part).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def store_columnar(path: str, annotations: Sequence[Any]):
+    """Stores a list of annotations in a new directory at `path`.
+
+    All annotations must have the same structure, i.e., be instances of the same named tuple, or lists/tuples
+    whose elements have the same structure. The directory is written to a temporary location first and then
+    moved to `path`, so concurrent readers never see partially written stores. If `path` already exists, e.g.,
+    because it was written concurrently by another process, it is left untouched.
+
+    Args:
+        path: directory to create.
+        annotations: list of annotations.
+    """
+    first = annotations[0] if annotations else None
+    if hasattr(first, '_fields'):
+        annotation_type = [type(first).__module__, type(first).__qualname__]
+        fields = list(first._fields)
+        columns = [[a[i] for a in annotations] for i in range(len(fields))]
+    else:
+        annotation_type = None
+        fields = ['value']
+        columns = [list(annotations)]
+
+    parent = os.path.dirname(os.path.abspath(path))
+    if not os.path.exists(parent):
+        os.makedirs(parent)
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix='.tmp_columnar_')
+    try:
+        specs = []
+        for field, column in zip(fields, columns):
+            arrays = {}
+            specs.append(_encode(column, field, arrays))
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp_dir, name + '.npy'), array)
+        with open(os.path.join(tmp_dir, _META_FILE), 'w') as f:
+            json.dump({'size': len(annotations), 'type': annotation_type, 'fields': fields, 'specs': specs}, f)
+        os.rename(tmp_dir, path)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.exists(os.path.join(path, _META_FILE)):
+            raise
+
+
+def load_columnar(path: str) -> 'ColumnarAnnotations':
+    """Opens a store written by `store_columnar`, memory-mapping all of its arrays read-only."""
+    return ColumnarAnnotations(path)
+
+
+class ColumnarAnnotations(Sequence):
+    """Read-only sequence of annotations backed by memory-mapped columns. Annotations are decoded on access."""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, _META_FILE)) as f:
+            meta = json.load(f)
+        self.path = path
+        self._size = meta['size']
+        self._fields = meta['fields']
+        if meta['type'] is not None:
+            module, name = meta['type']
+            self._constructor = getattr(importlib.import_module(module), name)
+        else:
+            self._constructor = None
+        self._columns = [_Column(spec, path) for spec in meta['specs']]
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._size))]
+        if i < 0:
+            i += self._size
+        if not 0 <= i < self._size:
+            raise IndexError(i)
+        values = [c.decode(i) for c in self._columns]
+        return self._constructor(*values) if self._constructor is not None else values[0]
+
+
+def _encode(values: List[Any], name: str, arrays: dict) -> dict:
+    """Encodes a column of values with the same structure into flat arrays, returns the structure spec."""
+    present = [v for v in values if v is not None]
+    if not present:
+        return {'kind': 'none'}
+    if len(present) < len(values):
+        arrays[name + '.mask'] = np.array([v is not None for v in values], dtype=np.bool_)
+        return {'kind': 'optional', 'mask': name + '.mask', 'child': _encode(present, name + '.v', arrays)}
+
+    first = present[0]
+    if isinstance(first, (list, tuple, np.ndarray)):
+        offsets = np.zeros([len(values) + 1], dtype=np.int64)
+        np.cumsum([len(v) for v in values], out=offsets[1:])
+        arrays[name + '.offsets'] = offsets
+        flat = [x for v in values for x in v]
+        return {'kind': 'tuple' if isinstance(first, tuple) else 'list', 'offsets': name + '.offsets',
+                'child': _encode(flat, name + '.c', arrays)}
+    if isinstance(first, str):
+        encoded = [v.encode('utf-8') for v in values]
+        offsets = np.zeros([len(values) + 1], dtype=np.int64)
+        np.cumsum([len(v) for v in encoded], out=offsets[1:])
+        arrays[name + '.offsets'] = offsets
+        arrays[name + '.data'] = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return {'kind': 'str', 'offsets': name + '.offsets', 'data': name + '.data'}
+
+    array = np.asarray(values)
+    if array.dtype.kind in 'biu':
+        if array.size and (array.min() < np.iinfo(np.int32).min or array.max() > np.iinfo(np.int32).max):
+            array = array.astype(np.int64)
+        else:
+            array = array.astype(np.int32)
+        kind = 'int'
+    elif array.dtype.kind == 'f':
+        array = array.astype(np.float32)
+        kind = 'float'
+    else:
+        raise ValueError('Cannot store values of type %s in columnar format.' % type(first))
+    arrays[name] = array
+    return {'kind': kind, 'values': name}
+
+
+class _Column:
+    """Decoder for one (possibly nested) column."""
+
+    def __init__(self, spec: dict, path: str):
+        self.kind = spec['kind']
+
+        def load(key):
+            return np.load(os.path.join(path, spec[key] + '.npy'), mmap_mode='r')
+
+        if self.kind in ('int', 'float'):
+            self.values = load('values')
+        elif self.kind == 'str':
+            self.offsets = load('offsets')
+            self.data = load('data')
+        elif self.kind in ('list', 'tuple'):
+            self.offsets = load('offsets')
+            self.child = _Column(spec['child'], path)
+        elif self.kind == 'optional':
+            mask = load('mask')
+            # position of each present value among all present values
+            self.index = np.cumsum(mask) - 1
+            self.mask = mask
+            self.child = _Column(spec['child'], path)
+
+    def decode(self, i):
+        if self.kind == 'none':
+            return None
+        if self.kind in ('int', 'float'):
+            return self.values[i].item()
+        if self.kind == 'str':
+            return bytes(self.data[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
+        if self.kind == 'optional':
+            return self.child.decode(int(self.index[i])) if self.mask[i] else None
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        decoded = self.child.decode_range(start, end)
+        return tuple(decoded) if self.kind == 'tuple' else decoded
+
+    def decode_range(self, start, end):
+        if self.kind in ('int', 'float'):
+            return self.values[start:end].tolist()
+        if self.kind == 'str':
+            offsets = self.offsets[start:end + 1]
+            data = bytes(self.data[offsets[0]:offsets[-1]])
+            offsets = (offsets - offsets[0]).tolist()
+            return [data[offsets[j]:offsets[j + 1]].decode('utf-8') for j in range(end - start)]
+        return [self.decode(j) for j in range(start, end)]
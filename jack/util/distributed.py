@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+
+"""Helpers for data-parallel training with several processes, shared by the TensorFlow and PyTorch readers."""
+
+from typing import List, Sequence, Union
+
+
+def parse_hosts(hosts: Union[str, Sequence[str], None]) -> List[str]:
+    """Parses comma separated host:port addresses, e.g., "localhost:2222,localhost:2223", as given in the
+    `ps_hosts` and `worker_hosts` options of the configuration.
+    """
+    if not hosts:
+        return []
+    if isinstance(hosts, str):
+        hosts = hosts.split(',')
+    return [h.strip() for h in hosts if h.strip()]
+
+
+def shard(dataset: Sequence, num_shards: int, index: int) -> Sequence:
+    """Returns every `num_shards`-th instance of the dataset starting at `index`. All shards have the same size (the
+    remaining `len(dataset) % num_shards` instances are dropped), so that processes training on different shards run
+    the same number of steps per epoch.
+    """
+    if not 0 <= index < num_shards:
+        raise ValueError('Shard index {} is not in [0, {})'.format(index, num_shards))
+    if not hasattr(dataset, '__getitem__'):
+        dataset = list(dataset)
+    size = len(dataset) // num_shards
+    return dataset[index:size * num_shards:num_shards]
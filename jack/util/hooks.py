@@ -169,6 +169,9 @@ class ExamplesPerSecHook(TraceHook):
         self._iter = 0
         self.num_examples = iter_interval * batch_size
         self.reset = True
+        # totals over all measured intervals
+        self.total_examples = 0
+        self.total_time = 0.0
 
     def __tag__(self):
         return "Speed"
@@ -186,11 +189,18 @@ class ExamplesPerSecHook(TraceHook):
             self.reset = False
         elif self._iter % self._iter_interval == 0:
             diff = time() - self.t0
+            self.total_examples += self.num_examples
+            self.total_time += diff
             speed = "%.2f" % (self.num_examples / diff)
             logger.info("Epoch {}\tIter {}\tExamples/s {}".format(str(epoch), str(self._iter), str(speed)))
             self.update_summary(self._iter, self.__tag__(), float(speed))
             self.t0 = time()
 
+    @property
+    def examples_per_sec(self):
+        """Average speed over all measured intervals, 0 if none has been measured yet."""
+        return self.total_examples / self.total_time if self.total_time > 0 else 0.0
+
 
 class ETAHook(TraceHook):
     """Estimates ETA to next checkpoint, epoch end and training end."""
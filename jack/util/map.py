@@ -59,3 +59,30 @@ def numpify(xs, pad=0, keys=None, dtypes=None):
             logger.error('Error numpifying value ' + str(x) + ' of key ' + str(key))
             raise e
     return xs_np
+
+
+def gather_embeddings(ids, lookup, max_length=None, dtype=np.float32):
+    """Embeds a list of id sequences with a single gather into a padded tensor.
+
+    Args:
+        ids: list of id sequences (lists or 1D arrays).
+        lookup: embedding matrix of shape [num_embeddings, dim] (may be a memory map or a quantized matrix).
+        max_length: length of the padded time dimension, defaults to the length of the longest sequence.
+        dtype: dtype of the returned tensor.
+
+    Returns:
+        A tensor of shape [len(ids), max_length, dim]. Padding positions and ids that are not covered by `lookup`
+        (e.g., out-of-vocabulary ids) are embedded as zero vectors.
+    """
+    num_embeddings, dim = lookup.shape
+    if max_length is None:
+        max_length = max((len(x) for x in ids), default=0)
+    # padding positions point to `num_embeddings`, i.e., just past the last valid row
+    id_matrix = np.full([len(ids), max_length], num_embeddings, dtype=np.int64)
+    for i, x in enumerate(ids):
+        id_matrix[i, :len(x)] = x
+    invalid = (id_matrix < 0) | (id_matrix >= num_embeddings)
+    embedded = np.take(lookup, np.clip(id_matrix, 0, num_embeddings - 1), axis=0)
+    embedded = np.asarray(embedded).astype(dtype, copy=False)
+    embedded[invalid] = 0.0
+    return embedded
@@ -1,13 +1,13 @@
 # -*- coding: utf-8 -*-
 
+import hashlib
 import re
-from typing import Mapping, List, Any, Union, Tuple, Optional
+from collections import OrderedDict
+from typing import Mapping, List, Any, Union, Tuple, Optional, NamedTuple, Sequence
 
 import numpy as np
-import spacy
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics import pairwise_distances
 
+from jack.util.tfidf import TfidfRanker
 from jack.util.vocab import Vocab
 
 
@@ -15,9 +15,12 @@ def fill_vocab(qa_settings, vocab=None, lowercase=False, lemmatize=False, spacy_
     vocab = vocab or Vocab(unk=None)
     assert not vocab.frozen, 'Filling frozen vocabs does not make a lot fo sense...'
     for qa_setting in qa_settings:
-        nlp_preprocess(qa_setting.question, vocab, lowercase, lemmatize, use_spacy=spacy_nlp)
-        for s in qa_setting.support:
-            nlp_preprocess(s, vocab, lowercase, lemmatize, use_spacy=spacy_nlp)
+        if spacy_nlp or lemmatize:
+            nlp_preprocess(qa_setting.question, vocab, lowercase, lemmatize, use_spacy=spacy_nlp)
+            for s in qa_setting.support:
+                nlp_preprocess(s, vocab, lowercase, lemmatize, use_spacy=spacy_nlp)
+        else:
+            nlp_preprocess_batch([qa_setting.question] + list(qa_setting.support), vocab, lowercase)
     return vocab
 
 
@@ -28,7 +31,39 @@ def tokenize(text, pattern=__pattern):
     return __pattern.findall(text)
 
 
+def dataset_tokens(datasets) -> set:
+    """Collects all tokens (and their lowercased forms) of questions, supports and candidates in the given datasets.
+
+    Args:
+        datasets: iterable of datasets, i.e., of lists of (QASetting, answers) pairs.
+
+    Returns:
+        set of tokens, e.g., to restrict pre-trained embeddings to.
+    """
+    tokens = set()
+    for dataset in datasets:
+        for qa_setting, _ in dataset:
+            texts = [qa_setting.question]
+            texts.extend(qa_setting.support or ())
+            texts.extend(c for c in qa_setting.candidates or () if isinstance(c, str))
+            for text in texts:
+                tokens.update(tokenize(text))
+    tokens.update([t.lower() for t in tokens])
+    return tokens
+
+
+def tokenize_with_offsets(text, pattern=__pattern) -> Tuple[List[str], np.ndarray]:
+    """Tokenizes `text` in a single pass, returns the tokens and their character offsets as int32 array."""
+    tokens, offsets = [], []
+    for match in pattern.finditer(text):
+        tokens.append(match.group())
+        offsets.append(match.start())
+    return tokens, np.array(offsets, dtype=np.int32)
+
+
 def token_to_char_offsets(text, tokenized_text):
+    """Character offsets of the given tokens of `text`, use `tokenize_with_offsets` to tokenize and compute offsets
+    at once."""
     offsets = []
     offset = 0
     for t in tokenized_text:
@@ -38,6 +73,64 @@ def token_to_char_offsets(text, tokenized_text):
     return offsets
 
 
+TokenizedTexts = NamedTuple('TokenizedTexts', [
+    ('tokens', List[str]),
+    ('ids', np.ndarray),
+    ('text_offsets', np.ndarray),
+    ('char_offsets', Optional[np.ndarray]),
+])
+
+
+def nlp_preprocess_batch(texts: Sequence[str],
+                         vocab: Vocab,
+                         lowercase: bool = False,
+                         with_tokens_offsets: bool = False,
+                         pattern=__pattern) -> TokenizedTexts:
+    """Tokenizes many texts at once and maps all of their tokens to ids with a single vocab lookup.
+
+    Args:
+        texts: texts to preprocess.
+        vocab: vocab to map tokens to ids, which adds new tokens if it is not frozen.
+        lowercase: whether to lowercase texts.
+        with_tokens_offsets: whether to compute the character offsets of tokens (in the possibly lowercased texts).
+        pattern: compiled regex of tokens.
+
+    Returns:
+        TokenizedTexts with the tokens of all texts as flat list, their ids as flat int64 array, the boundaries of the
+        tokens of each text (the tokens of text i are at `text_offsets[i]:text_offsets[i + 1]`) and, optionally, the
+        character offset of each token within its text as flat int32 array. Like in `nlp_preprocess`, ids are
+        non-negative; for unfrozen vocabs, ids of pre-trained tokens are normalized with respect to the vocab after
+        adding all tokens of the batch. Tokens unknown to a frozen vocab without unknown symbol get id None, as in
+        `nlp_preprocess`, in which case ids are an object array.
+    """
+    tokens = []
+    char_offsets = [] if with_tokens_offsets else None
+    text_offsets = np.zeros([len(texts) + 1], dtype=np.int64)
+    for i, text in enumerate(texts):
+        if lowercase:
+            text = text.lower()
+        if with_tokens_offsets:
+            for match in pattern.finditer(text):
+                tokens.append(match.group())
+                char_offsets.append(match.start())
+        else:
+            tokens.extend(pattern.findall(text))
+        text_offsets[i + 1] = len(tokens)
+
+    ids = vocab.get_ids(tokens)
+    if None in ids:
+        # unknown to a frozen vocab without unknown symbol
+        ids = np.array(ids, dtype=object)
+    else:
+        ids = np.array(ids, dtype=np.int64)
+    if not vocab.frozen:
+        # make sure ids are non-negative
+        ids = np.where(ids < 0, vocab.next_pos - ids - 1, ids)
+    if with_tokens_offsets:
+        char_offsets = np.array(char_offsets, dtype=np.int32)
+    return TokenizedTexts(tokens, ids, text_offsets, char_offsets)
+
+
 def nlp_preprocess_all(qa_settings,
                        vocab: Vocab,
                        lowercase: bool = False,
@@ -58,6 +151,8 @@ def nlp_preprocess_all(qa_settings,
 
 
 __spacy_nlp = None
+__spacy_cache = OrderedDict()
+__tfidf_ranker = None
 
 
 def spacy_nlp(parser=False, entity=False, matcher=False):
@@ -68,6 +163,52 @@ def spacy_nlp(parser=False, entity=False, matcher=False):
     return __spacy_nlp
 
 
+SpacyTokens = NamedTuple('SpacyTokens', [
+    ('tokens', List[str]),
+    ('lemmas', List[str]),
+    ('lemma_ids', List[int]),
+    ('offsets', List[int]),
+])
+
+
+def spacy_preprocess_batch(texts: Sequence[str],
+                           batch_size: int = 1000,
+                           n_process: int = 1,
+                           cache_size: int = 100000) -> List[SpacyTokens]:
+    """Processes texts with spaCy, streaming them through `nlp.pipe`.
+
+    Results are cached per text hash for the `cache_size` most recently used texts, so repeated texts (e.g., supports
+    shared by several questions) are processed only once, and `nlp_preprocess` reuses results of texts that were
+    processed in a batch before.
+
+    Args:
+        texts: texts to process.
+        batch_size: number of texts spaCy processes at once.
+        n_process: number of processes spaCy uses (requires spaCy >= 2.2 if larger than 1).
+        cache_size: maximum number of cached texts.
+
+    Returns:
+        tokens, lemmas, lemma ids and character offsets of tokens for each text.
+    """
+    keys = [hashlib.sha1(text.encode('utf-8')).digest() for text in texts]
+    missing = OrderedDict()
+    for key, text in zip(keys, texts):
+        if key in __spacy_cache:
+            __spacy_cache.move_to_end(key)
+        else:
+            missing[key] = text
+    if missing:
+        kwargs = {'n_process': n_process} if n_process > 1 else {}
+        docs = spacy_nlp().pipe(missing.values(), batch_size=batch_size, **kwargs)
+        for key, doc in zip(missing, docs):
+            __spacy_cache[key] = SpacyTokens([t.orth_ for t in doc], [t.lemma_ for t in doc],
+                                             [t.lemma for t in doc], [t.idx for t in doc])
+    results = [__spacy_cache[key] for key in keys]
+    while len(__spacy_cache) > cache_size:
+        __spacy_cache.popitem(last=False)
+    return results
+
+
 def nlp_preprocess(text: str,
                    vocab: Vocab,
                    lowercase: bool = False,
@@ -76,7 +217,7 @@ def nlp_preprocess(text: str,
                    with_tokens_offsets: bool = False,
                    use_spacy: bool = False) \
         -> Tuple[List[str], List[int], int, Optional[List[str]],
-                 Optional[List[int]]]:
+                 Optional[np.ndarray]]:
     """Preprocesses a question and support:
     The steps include tokenization, lower-casing. It also includes the computation of token-to-character offsets for
     the support. Lemmatization is supported in 2 ways. If lemmatize is True then the returned tokens are lemmatized
@@ -84,41 +225,35 @@ def nlp_preprocess(text: str,
     of the lemmatized token in string form is returned.
 
     Returns:
-        tokens, ids, length, lemmas or None, token_offsets or None
+        tokens, ids, length, lemmas or None, token_offsets (int32 array) or None
     """
     assert not with_lemmas or use_spacy, "enable spacy when using lemmas"
     assert not lemmatize or use_spacy, "enable spacy when using lemmas"
 
-    if use_spacy:
-        import spacy
-        nlp = spacy_nlp()
-        thistokenize = lambda t: nlp(t)
-    else:
-        thistokenize = tokenize
     if lowercase:
         text = text.lower()
-    tokens = thistokenize(text)
 
     token_offsets = None
     lemmas = None
     if use_spacy:
+        processed = spacy_preprocess_batch([text])[0]
         if with_lemmas:
-            lemmas = [t.lemma_ for t in tokens]
+            lemmas = list(processed.lemmas)
         if with_tokens_offsets:
-            token_offsets = [t.idx for t in tokens]
-        tokens = [t.lemma for t in tokens] if lemmatize else [t.orth_ for t in tokens]
+            token_offsets = np.array(processed.offsets, dtype=np.int32)
+        tokens = list(processed.lemma_ids) if lemmatize else list(processed.tokens)
+    elif with_tokens_offsets:
+        tokens, token_offsets = tokenize_with_offsets(text)
     else:
-        # char to token offsets
-        if with_tokens_offsets:
-            token_offsets = token_to_char_offsets(text, tokens)
+        tokens = tokenize(text)
 
     length = len(tokens)
 
-    ids = vocab(tokens)
+    ids = vocab.get_ids(tokens)
     # make sure ids are non-negative
     if not vocab.frozen:
-        for i in range(len(ids)):
-            ids[i] = vocab.normalize(ids[i])
+        next_pos = vocab.next_pos
+        ids = [id if id >= 0 else next_pos - id - 1 for id in ids]
 
     return tokens, ids, length, lemmas, token_offsets
 
@@ -185,14 +320,12 @@ def unique_words_with_chars(tokens, char_vocab, char_limit=20):
 
 
 def sort_by_tfidf(question, paragraphs):
-    tfidf = TfidfVectorizer(strip_accents="unicode", stop_words=spacy.en.STOP_WORDS, decode_error='replace')
-    try:
-        para_features = tfidf.fit_transform(paragraphs)
-        q_features = tfidf.transform([question])
-    except ValueError:
-        return [(i, 0.0) for i in range(len(paragraphs))]
-
-    dists = pairwise_distances(q_features, para_features, "cosine").ravel()
-    sorted_ix = np.lexsort((paragraphs, dists))  # in case of ties, use the earlier paragraph
+    """Ranks paragraphs by the TF-IDF cosine similarity to the question, see `jack.util.tfidf.TfidfRanker`.
 
-    return [(i, 1.0 - dists[i]) for i in sorted_ix]
+    Returns:
+        (paragraph index, similarity) pairs sorted by decreasing similarity.
+    """
+    global __tfidf_ranker
+    if __tfidf_ranker is None:
+        __tfidf_ranker = TfidfRanker()
+    return __tfidf_ranker.rank([question], [paragraphs])[0]
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+"""Read-only, memory-mapped mapping from strings to integers.
+
+The table is a single file of native int64 arrays followed by the utf-8 encoded strings:
+
+    magic (8 bytes) | n | offsets (n + 1) | values (n) | order (n) | string data
+
+Strings are sorted by their utf-8 bytes and looked up by binary search, `offsets` delimit the strings in the string
+data, `values` holds the value of each string and `order` holds the positions of the strings in the order in which
+they were stored. The file is memory-mapped on load, so several processes opening the same table share one
+page-cached copy of it and nothing has to be parsed.
+"""
+
+import bisect
+import mmap
+import os
+import shutil
+import tempfile
+from collections.abc import Mapping, ItemsView, KeysView, ValuesView
+
+import numpy as np
+
+_MAGIC = b'JACKSTR1'
+_HEADER_SIZE = 16
+
+
+def store_string_table(path: str, mapping: Mapping):
+    """Stores a mapping from strings to (64 bit) integers as string table file at `path`."""
+    keys, values = [], []
+    for k, v in mapping.items():
+        keys.append(k.encode('utf-8'))
+        values.append(v)
+    n = len(keys)
+    positions = sorted(range(n), key=keys.__getitem__)
+    offsets = np.zeros([n + 1], dtype=np.int64)
+    np.cumsum([len(keys[i]) for i in positions], out=offsets[1:])
+    order = np.empty([n], dtype=np.int64)
+    order[positions] = np.arange(n)
+
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.tmp_string_table_')
+    try:
+        tmp_file = os.path.join(tmp_dir, 'table')
+        with open(tmp_file, 'wb') as f:
+            f.write(_MAGIC)
+            f.write(np.array([n], dtype=np.int64).tobytes())
+            f.write(offsets.tobytes())
+            f.write(np.array([values[i] for i in positions], dtype=np.int64).tobytes())
+            f.write(order.tobytes())
+            f.write(b''.join([keys[i] for i in positions]))
+        os.replace(tmp_file, path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+class StringTable(Mapping):
+    """Read-only mapping backed by a memory-mapped string table file written by `store_string_table`.
+
+    Iteration follows the order in which the strings were stored. Lookups take O(log n) string comparisons.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(_MAGIC)] != _MAGIC:
+            raise ValueError('%s is not a string table.' % path)
+        view = memoryview(self._mmap)
+        n = view[len(_MAGIC):_HEADER_SIZE].cast('q')[0]
+        start = _HEADER_SIZE
+        self._offsets = view[start:start + 8 * (n + 1)].cast('q')
+        start += 8 * (n + 1)
+        self._values = view[start:start + 8 * n].cast('q')
+        start += 8 * n
+        self._order = view[start:start + 8 * n].cast('q')
+        self._data_start = start + 8 * n
+        self._keys = _SortedKeys(self)
+        self._size = n
+
+    def _key(self, i) -> bytes:
+        return self._mmap[self._data_start + self._offsets[i]:self._data_start + self._offsets[i + 1]]
+
+    def __getitem__(self, key):
+        if not isinstance(key, str):
+            raise KeyError(key)
+        try:
+            encoded = key.encode('utf-8')
+        except UnicodeEncodeError:
+            raise KeyError(key)
+        i = bisect.bisect_left(self._keys, encoded)
+        if i < self._size and self._key(i) == encoded:
+            return self._values[i]
+        raise KeyError(key)
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for i in self._order:
+            yield self._key(i).decode('utf-8')
+
+    def keys(self):
+        return _Keys(self)
+
+    def values(self):
+        return _Values(self)
+
+    def items(self):
+        return _Items(self)
+
+    def __reduce__(self):
+        return StringTable, (self.path,)
+
+    def __repr__(self):
+        return 'StringTable(%r)' % self.path
+
+
+class _SortedKeys:
+    """Sequence view of the sorted, encoded strings of a table, used for binary search."""
+
+    def __init__(self, table: StringTable):
+        self._table = table
+
+    def __len__(self):
+        return len(self._table)
+
+    def __getitem__(self, i):
+        return self._table._key(i)
+
+
+class _Keys(KeysView):
+
+    def __iter__(self):
+        table = self._mapping
+        for i in table._order:
+            yield table._key(i).decode('utf-8')
+
+
+class _Values(ValuesView):
+
+    def __iter__(self):
+        table = self._mapping
+        return iter(np.asarray(table._values)[np.asarray(table._order)].tolist())
+
+
+class _Items(ItemsView):
+
+    def __iter__(self):
+        table = self._mapping
+        for i in table._order:
+            yield table._key(i).decode('utf-8'), table._values[i]
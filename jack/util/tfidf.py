@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+from collections import OrderedDict
+from typing import List, Sequence, Tuple, NamedTuple, Optional, Dict
+
+import numpy as np
+import spacy
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+_Document = NamedTuple('_Document', [
+    ('terms', Dict[str, int]),
+    ('idf', np.ndarray),
+    ('weights', Optional[sparse.csr_matrix]),
+])
+
+
+class TfidfRanker:
+    """Ranks the paragraphs of documents (e.g., the supports of a question) by the cosine similarity of their TF-IDF
+    vectors to a question.
+
+    As when fitting a `TfidfVectorizer` on the paragraphs of each document, terms and IDF are specific to a document.
+    They are computed once per document together with the normalized paragraph vectors, and cached by document hash
+    for the `cache_size` most recently used documents, so documents shared by several questions are analyzed only once.
+    All questions passed to `rank` are scored with a single sparse matrix product.
+    """
+
+    def __init__(self, cache_size: int = 10000):
+        self.cache_size = cache_size
+        self._analyzer = TfidfVectorizer(strip_accents="unicode", stop_words=list(spacy.en.STOP_WORDS),
+                                         decode_error='replace').build_analyzer()
+        self._cache = OrderedDict()
+
+    def rank(self, questions: Sequence[str], documents: Sequence[Sequence[str]]) -> List[List[Tuple[int, float]]]:
+        """Ranks the paragraphs of each document with respect to its question.
+
+        Args:
+            questions: questions to rank paragraphs for.
+            documents: list of paragraphs per question.
+
+        Returns:
+            for each question, (paragraph index, cosine similarity) pairs sorted by decreasing similarity; ties are
+            broken like in `sort_by_tfidf`. Paragraphs of documents without any terms are returned in their original
+            order with similarity 0.
+        """
+        keys = [self._key(paragraphs) for paragraphs in documents]
+        docs = OrderedDict()
+        for key, paragraphs in zip(keys, documents):
+            if key not in docs:
+                docs[key] = self._document(key, paragraphs)
+
+        # documents occupy disjoint blocks of columns (terms) and rows (paragraphs)
+        column_offsets, row_offsets = dict(), dict()
+        num_columns = num_rows = 0
+        blocks = []
+        for key, doc in docs.items():
+            if doc.weights is not None:
+                column_offsets[key], row_offsets[key] = num_columns, num_rows
+                num_columns += len(doc.idf)
+                num_rows += doc.weights.shape[0]
+                blocks.append(doc.weights)
+
+        if blocks:
+            data, indices, indptr = [], [], [0]
+            for question, key in zip(questions, keys):
+                doc = docs[key]
+                if doc.weights is not None:
+                    counts = dict()
+                    for term in self._analyzer(question):
+                        j = doc.terms.get(term)
+                        if j is not None:
+                            counts[j] = counts.get(j, 0) + 1
+                    for j, count in counts.items():
+                        data.append(count * doc.idf[j])
+                        indices.append(column_offsets[key] + j)
+                indptr.append(len(indices))
+            queries = normalize(sparse.csr_matrix((data, indices, indptr), shape=(len(questions), num_columns)))
+            scores = queries.dot(sparse.block_diag(blocks, format='csr').T).tocsr()
+
+        results = []
+        for i, (key, paragraphs) in enumerate(zip(keys, documents)):
+            if docs[key].weights is None:
+                results.append([(j, 0.0) for j in range(len(paragraphs))])
+                continue
+            similarities = np.zeros([len(paragraphs)])
+            start, end = scores.indptr[i], scores.indptr[i + 1]
+            similarities[scores.indices[start:end] - row_offsets[key]] = scores.data[start:end]
+            dists = np.clip(1.0 - similarities, 0.0, 2.0)
+            sorted_ix = np.lexsort((paragraphs, dists))  # in case of ties, use the earlier paragraph
+            results.append([(j, 1.0 - dists[j]) for j in sorted_ix])
+        return results
+
+    @staticmethod
+    def _key(paragraphs: Sequence[str]) -> bytes:
+        h = hashlib.sha1()
+        for p in paragraphs:
+            h.update(p.encode('utf-8', 'surrogatepass'))
+            h.update(b'\0')
+        return h.digest()
+
+    def _document(self, key: bytes, paragraphs: Sequence[str]) -> _Document:
+        doc = self._cache.get(key)
+        if doc is not None:
+            self._cache.move_to_end(key)
+            return doc
+        terms = dict()
+        indices, indptr = [], [0]
+        for p in paragraphs:
+            for term in self._analyzer(p):
+                j = terms.get(term)
+                if j is None:
+                    j = terms[term] = len(terms)
+                indices.append(j)
+            indptr.append(len(indices))
+        if terms:
+            counts = sparse.csr_matrix((np.ones([len(indices)]), indices, indptr), shape=(len(paragraphs), len(terms)))
+            counts.sum_duplicates()
+            # smoothed IDF, as computed by TfidfVectorizer
+            idf = np.log((1.0 + len(paragraphs)) / (1.0 + np.bincount(counts.indices, minlength=len(terms)))) + 1.0
+            weights = normalize(counts.multiply(idf[None, :]).tocsr())
+        else:
+            idf, weights = np.zeros([0]), None
+        doc = self._cache[key] = _Document(terms, idf, weights)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return doc
@@ -1,10 +1,11 @@
 # -*- coding: utf-8 -*-
 
+import hashlib
 import operator
 import os
 import pickle
 import sys
-from collections import OrderedDict
+from collections.abc import Mapping
 
 import numpy as np
 from sacred.optional import yaml
@@ -33,32 +34,25 @@ class Vocab:
         self.next_neg = -1
         self.unk = unk
         self.emb = emb  # if emb is not None else lambda _:None #if emb is None: same behavior as for o-o-v words
+        # symbols with their internal ids (non-negative for out-of-vocab symbols, negative for pre-trained ones)
+        self._symbols = _Symbols()
 
         if init_from_embeddings and emb is not None:
-            self.sym2id = dict(emb.vocabulary)
-            self.id2sym = {v: k for k, v in emb.vocabulary.items()}
-            if unk is not None and unk not in self.sym2id:
-                self.sym2id[unk] = len(self.sym2id)
-                self.id2sym[len(self.id2sym)] = unk
-            self.sym2freqs = {w: None for w in self.sym2id}
+            syms = list(emb.vocabulary.keys())
+            ids = np.fromiter(emb.vocabulary.values(), dtype=np.int64, count=len(syms))
+            self._symbols = _Symbols.build(syms, -1 - ids, np.full([len(syms)], -1))
+            if unk is not None and unk not in self._symbols.index:
+                self._symbols.add(unk, -1 - len(self._symbols.index), None)
             self.frozen = True
             self.next_pos = 0
-            self.next_neg = -1 * len(self.sym2id)
+            self.next_neg = -1 * len(self._symbols.index)
         else:
-            self.sym2id = {}
-            # with pos and neg indices
-            self.id2sym = {}
-            self.next_pos = 0
-            self.sym2freqs = OrderedDict()
             if unk is not None:
-                self.sym2id[unk] = 0
-                # with pos and neg indices
-                self.id2sym[0] = unk
+                self._symbols.add(unk, 0, 0)
                 self.next_pos = 1
-                self.sym2freqs[unk] = 0
             self.frozen = False
 
-        if emb is not None and hasattr(emb, "lookup") and isinstance(emb.lookup, np.ndarray):
+        if emb is not None and hasattr(emb, "lookup") and hasattr(emb.lookup, "shape"):
             self.emb_length = emb.lookup.shape[1]
         else:
             self.emb_length = None
@@ -66,6 +60,34 @@ class Vocab:
     def _get_emb(self, word):
         return self.emb(word) if self.emb is not None else None
 
+    @property
+    def sym2id(self) -> Mapping:
+        """Read-only mapping from symbols to their ids (consistent with the `self.frozen` state)."""
+        return _Sym2Id(self)
+
+    @property
+    def id2sym(self) -> Mapping:
+        """Read-only mapping from ids (consistent with the `self.frozen` state) to symbols."""
+        return _Id2Sym(self)
+
+    @property
+    def sym2freqs(self) -> '_Sym2Freqs':
+        """Mapping from symbols to their frequencies, in which frequencies of existing symbols can be set."""
+        return _Sym2Freqs(self)
+
+    def fingerprint(self) -> str:
+        """Returns a hex digest of the mapping between symbols and ids, computed from the compact symbol storage
+        without building `sym2id`."""
+        h = hashlib.sha1(repr((self.unk, self.frozen, self.next_pos, self.next_neg)).encode('utf-8'))
+        for syms in self._symbols._syms:
+            try:
+                joined = '\0'.join(syms)
+            except TypeError:
+                joined = '\0'.join(s if isinstance(s, str) else '\1' + repr(s) for s in syms)
+            h.update(b'\1')
+            h.update(joined.encode('utf-8', 'surrogatepass'))
+        return h.hexdigest()
+
     def freeze(self):
         """Freeze current Vocab object (set `self.frozen` to True).
         To be used after loading symbols from a given corpus;
@@ -76,12 +98,7 @@ class Vocab:
         - id's of symbols with pre-trained embeddings are converted to positive integer id's,
           counting up from the all out-of-vocab id's.
         """
-        # if any pretrained have been encountered
-        if not self.frozen and self.next_neg < -1:
-            sym2id = {sym: self.normalize(id) for sym, id in self.sym2id.items()}
-            id2sym = {self.normalize(id): sym for id, sym in self.id2sym.items()}
-            self.sym2id = sym2id
-            self.id2sym = id2sym
+        # internal ids are kept, ids are normalized on access while frozen
         self.frozen = True
 
     def unfreeze(self):
@@ -92,11 +109,6 @@ class Vocab:
         - maps all normalized id's to the original internal id's.
         - additional calls to __call__ will allow adding new symbols to the vocabulary.
         """
-        if self.frozen and self.next_neg < -1:
-            sym2id = {sym: self._denormalize(id) for sym, id in self.sym2id.items()}
-            id2sym = {self._denormalize(id): sym for id, sym in self.id2sym.items()}
-            self.sym2id = sym2id
-            self.id2sym = id2sym
         self.frozen = False
 
     def get_id(self, sym):
@@ -117,34 +129,44 @@ class Vocab:
         Args:
             `sym`: symbol (e.g., token)
         """
+        id = self._symbols.index.get(sym)
         if not self.frozen:
-            vec = self._get_emb(sym)
-            if self.emb_length is None and vec is not None:
-                self.emb_length = len(vec) if isinstance(vec, list) else vec.shape[0]
-            if sym not in self.sym2id:
+            if id is None:
+                vec = self._get_emb(sym)
+                if self.emb_length is None and vec is not None:
+                    self.emb_length = len(vec) if isinstance(vec, list) else vec.shape[0]
                 if vec is None:
-                    self.sym2id[sym] = self.next_pos
-                    self.id2sym[self.next_pos] = sym
+                    id = self.next_pos
                     self.next_pos += 1
                 else:
-                    self.sym2id[sym] = self.next_neg
-                    self.id2sym[self.next_neg] = sym
+                    id = self.next_neg
                     self.next_neg -= 1
-                self.sym2freqs[sym] = 1
+                self._symbols.add(sym, id, 1)
             else:
-                self.sym2freqs[sym] += 1
-        if sym in self.sym2id:
-            return self.sym2id[sym]
-        else:
-            if self.unk in self.sym2id:
-                return self.sym2id[self.unk]
+                self._symbols.increment(id)
+            return id
+        if id is None:
+            id = self._symbols.index.get(self.unk)
             # can happen for `Vocab` initialized with `unk` argument set to `None`
-            else:
+            if id is None:
                 return None
+        return self.normalize(id)
 
-    def get_sym(self, id):
-        """returns symbol for a given id (consistent with the `self.frozen` state), and None if not found."""
-        return None if not id in self.id2sym else self.id2sym[id]
+    def get_ids(self, symbols):
+        """Batched version of `get_id`, returns the list of ids of the given symbols."""
+        if not self.frozen:
+            return [self.get_id(sym) for sym in symbols]
+        index = self._symbols.index
+        unk_id = self.get_id(self.unk) if self.unk in index else None
+        next_pos = self.next_pos
+        ids = [index.get(sym) for sym in symbols]
+        return [unk_id if id is None else id if id >= 0 else next_pos - id - 1 for id in ids]
+
+    def get_sym(self, id, default=None):
+        """returns symbol for a given id (consistent with the `self.frozen` state), and `default` if not found."""
+        if not isinstance(id, (int, np.integer)) or (self.frozen and id < 0):
+            return default
+        return self._symbols.symbol(self._denormalize(id) if self.frozen else id, default)
 
     def __call__(self, *args, **kwargs):
         """
@@ -160,15 +182,15 @@ class Vocab:
                 symbols = args[0]
             else:
                 return self.get_id(args[0])
-        return [self.get_id(sym) for sym in symbols]
+        return self.get_ids(symbols)
 
     def __len__(self):
         """returns number of unique symbols (including the unknown symbol)"""
-        return len(self.id2sym)
+        return len(self._symbols.index)
 
     def __contains__(self, sym):
         """checks if `sym` already in the Vocab object"""
-        return sym in self.sym2id
+        return sym in self._symbols.index
 
     def normalize(self, id):
         """map original (pos/neg) ids to normalized (non-neg) ids: first new symbols, then those in emb"""
@@ -231,7 +253,7 @@ class Vocab:
                     pickle.dump(self.emb, f)
         remaining = {k: self.__dict__[k] for k in self.__dict__ if k != "emb"}
         with open(remainder_file, "wb") as f:
-            pickle.dump(remaining, f)
+            pickle.dump(remaining, f, pickle.HIGHEST_PROTOCOL)
 
     def load(self, path: str):
         conf_file = os.path.join(path, "conf.yaml")
@@ -255,5 +277,176 @@ class Vocab:
         with open(remainder_file, "rb") as f:
             remaining = pickle.load(f)
 
+        if "sym2id" in remaining:
+            # stored by older versions as dicts
+            remaining = _from_dicts(remaining)
         self.__dict__ = remaining
         self.__dict__["emb"] = emb
+
+
+_MISSING = object()
+
+
+def _from_dicts(state):
+    """Converts the state of a `Vocab` with symbols stored in dicts."""
+    state = dict(state)
+    sym2id, sym2freqs = state.pop("sym2id"), state.pop("sym2freqs")
+    del state["id2sym"]
+    ids = np.fromiter(sym2id.values(), dtype=np.int64, count=len(sym2id))
+    if state["frozen"]:
+        next_pos = state["next_pos"]
+        ids = np.where(ids >= next_pos, -1 - (ids - next_pos), ids)
+    freqs = [sym2freqs.get(sym) for sym in sym2id]
+    state["_symbols"] = _Symbols.build(list(sym2id), ids, [-1 if f is None else f for f in freqs])
+    return state
+
+
+class _Symbols:
+    """Compact storage of the symbols of a `Vocab`.
+
+    Symbols are mapped to their internal ids by a single dict. Internal ids are mapped back to symbols by two lists,
+    one for non-negative ids and one for negative ids (id -1 at position 0, -2 at 1, ...). Frequencies are kept in
+    numpy arrays aligned with these lists, where -1 stands for an unknown frequency. Symbols are pickled as a single
+    string (if possible) with numpy arrays of their ids and frequencies, which is faster to store and load than dicts.
+    """
+
+    def __init__(self):
+        self.index = dict()
+        self._syms = ([], [])
+        self._freqs = (np.zeros([0], dtype=np.int64), np.zeros([0], dtype=np.int64))
+
+    @classmethod
+    def build(cls, syms, ids, freqs) -> '_Symbols':
+        """Creates the storage of the given symbols with their internal ids and frequencies (-1 if unknown)."""
+        symbols = cls()
+        ids = np.asarray(ids, dtype=np.int64)
+        freqs = np.asarray(freqs, dtype=np.int64)
+        symbols.index = dict(zip(syms, ids.tolist()))
+        sides = []
+        non_negative, negative = np.flatnonzero(ids >= 0), np.flatnonzero(ids < 0)
+        for rows, positions in [(non_negative, ids[non_negative]), (negative, -1 - ids[negative])]:
+            size = int(positions.max()) + 1 if len(positions) else 0
+            if size == len(rows):
+                side_syms = [syms[i] for i in rows[np.argsort(positions)].tolist()]
+            else:
+                side_syms = [None] * size
+                for i, position in zip(rows.tolist(), positions.tolist()):
+                    side_syms[position] = syms[i]
+            side_freqs = np.full([size], -1, dtype=np.int64)
+            side_freqs[positions] = freqs[rows]
+            sides.append((side_syms, side_freqs))
+        symbols._syms = (sides[0][0], sides[1][0])
+        symbols._freqs = (sides[0][1], sides[1][1])
+        return symbols
+
+    def add(self, sym, id, freq):
+        side, i = (0, id) if id >= 0 else (1, -1 - id)
+        syms = self._syms[side]
+        if i >= len(syms):
+            syms.extend([None] * (i + 1 - len(syms)))
+        syms[i] = sym
+        freqs = self._freqs[side]
+        if i >= len(freqs):
+            freqs = np.concatenate([freqs, np.full([max(len(freqs), i + 1 - len(freqs), 16)], -1, dtype=np.int64)])
+            self._freqs = (freqs, self._freqs[1]) if side == 0 else (self._freqs[0], freqs)
+        freqs[i] = -1 if freq is None else freq
+        self.index[sym] = id
+
+    def symbol(self, id, default=None):
+        syms = self._syms[0] if id >= 0 else self._syms[1]
+        i = id if id >= 0 else -1 - id
+        if i >= len(syms) or (syms[i] is None and self.index.get(None, default) != id):
+            return default
+        return syms[i]
+
+    def freq(self, id):
+        freq = self._freqs[0][id] if id >= 0 else self._freqs[1][-1 - id]
+        return None if freq < 0 else int(freq)
+
+    def set_freq(self, id, freq):
+        if id >= 0:
+            self._freqs[0][id] = -1 if freq is None else freq
+        else:
+            self._freqs[1][-1 - id] = -1 if freq is None else freq
+
+    def increment(self, id):
+        if id >= 0:
+            self._freqs[0][id] += 1
+        else:
+            self._freqs[1][-1 - id] += 1
+
+    def _used_freqs(self):
+        return [self._freqs[0][:len(self._syms[0])], self._freqs[1][:len(self._syms[1])]]
+
+    def __eq__(self, other):
+        return isinstance(other, _Symbols) and self.index == other.index and all(
+            np.array_equal(a, b) for a, b in zip(self._used_freqs(), other._used_freqs()))
+
+    def __getstate__(self):
+        syms = list(self.index)
+        ids = np.fromiter(self.index.values(), dtype=np.int64, count=len(syms))
+        freqs = np.where(ids >= 0, self._freqs[0][np.maximum(ids, 0)] if len(self._freqs[0]) else -1,
+                         self._freqs[1][np.maximum(-1 - ids, 0)] if len(self._freqs[1]) else -1)
+        state = {"ids": ids, "freqs": freqs}
+        if all(type(sym) is str and "\0" not in sym for sym in syms):
+            state["text"] = "\0".join(syms)
+            state["size"] = len(syms)
+        else:
+            state["syms"] = syms
+        return state
+
+    def __setstate__(self, state):
+        if "text" in state:
+            syms = state["text"].split("\0") if state["size"] else []
+        else:
+            syms = state["syms"]
+        self.__dict__ = _Symbols.build(syms, state["ids"], state["freqs"]).__dict__
+
+
+class _View(Mapping):
+    """Read-only view of the symbols of a vocab."""
+
+    def __init__(self, vocab: Vocab):
+        self._vocab = vocab
+
+    def __contains__(self, sym):
+        return sym in self._vocab._symbols.index
+
+    def __iter__(self):
+        return iter(self._vocab._symbols.index)
+
+    def __len__(self):
+        return len(self._vocab._symbols.index)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class _Sym2Id(_View):
+    def __getitem__(self, sym):
+        id = self._vocab._symbols.index[sym]
+        return self._vocab.normalize(id) if self._vocab.frozen else id
+
+
+class _Id2Sym(_View):
+    def __getitem__(self, id):
+        sym = self._vocab.get_sym(id, _MISSING)
+        if sym is _MISSING:
+            raise KeyError(id)
+        return sym
+
+    def __contains__(self, id):
+        return self._vocab.get_sym(id, _MISSING) is not _MISSING
+
+    def __iter__(self):
+        vocab = self._vocab
+        for id in vocab._symbols.index.values():
+            yield vocab.normalize(id) if vocab.frozen else id
+
+
+class _Sym2Freqs(_View):
+    def __getitem__(self, sym):
+        return self._vocab._symbols.freq(self._vocab._symbols.index[sym])
+
+    def __setitem__(self, sym, freq):
+        self._vocab._symbols.set_freq(self._vocab._symbols.index[sym], freq)
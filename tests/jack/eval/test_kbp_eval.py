@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+import numpy as np
+
 from jack.eval.link_prediction import compute_ranks
 
 triple_to_score_map = {
@@ -28,3 +30,30 @@ def test_kbp_eval():
 
     assert f_ranks_l == ranks_l
     assert f_ranks_r == ranks_r
+
+
+def test_compute_ranks_batched():
+    from jack.eval.link_prediction import compute_ranks_batched, triples_to_ids
+    from jack.readers.link_prediction.entity_scores import get_scorer
+
+    rng = np.random.RandomState(0)
+    entities = ['e%d' % i for i in range(30)]
+    entity_to_index = {e: i for i, e in enumerate(entities)}
+    predicate_to_index = {'p': 0, 'q': 1}
+    true_triples = {(entities[s], 'pq'[p], entities[o]) for s, p, o in zip(
+        rng.randint(0, 30, 200), rng.randint(0, 2, 200), rng.randint(0, 30, 200))}
+    test_triples = sorted(true_triples)[:20] + [('unknown', 'p', 'e1')]
+
+    for model_name in ['DistMult', 'ComplEx', 'TransE']:
+        # last row is the embedding of unknown entities
+        scorer = get_scorer(model_name, rng.randn(31, 8), rng.randn(2, 8))
+
+        def scoring_function(triples):
+            return scorer.score(*triples_to_ids(triples, entity_to_index, predicate_to_index).T)
+
+        expected = compute_ranks(scoring_function, test_triples, entities, true_triples)
+        ranks = compute_ranks_batched(scorer, triples_to_ids(test_triples, entity_to_index, predicate_to_index),
+                                      len(entities), triples_to_ids(true_triples, entity_to_index, predicate_to_index),
+                                      batch_size=7)
+        assert [list(r) for r in ranks[0]] == [list(r) for r in expected[0]]
+        assert [list(r) for r in ranks[1]] == [list(r) for r in expected[1]]
@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
 
+import json
 import subprocess
 
+import numpy as np
 import pytest
 
-from jack.io import SNLI2jtr
+from jack.core.data_structures import jack_to_qasetting
+from jack.io import SNLI2jtr, load
+from jack.io.triples import TripleDataset
 
 
 def pytest_collection_modifyitems(items):
@@ -97,4 +101,97 @@ def test_snli_converter():
 @pytest.mark.data_loaders
 def test_snli_schema():
     data_file_name = "jack/tests/test_data/SNLI/2000_samples_train_jtr_v1.json"
-    check_file_adheres_to_schema(data_file_name)
\ No newline at end of file
+    check_file_adheres_to_schema(data_file_name)
+
+
+@pytest.mark.data_loaders
+def test_stream_jack(tmpdir):
+    path = 'tests/test_data/SNLI/train.json'
+    with open(path) as f:
+        jtr_data = json.load(f)
+    expected = jack_to_qasetting(jtr_data)
+
+    def as_tuples(data):
+        return [(q.question, q.support, q.candidates, [a.text for a in answers]) for q, answers in data]
+
+    assert as_tuples(load.stream_jack(path)) == as_tuples(expected)
+    assert as_tuples(load.stream_jack(path, max_count=5)) == as_tuples(expected[:5])
+
+    jsonl_path = str(tmpdir.join('train.jsonl'))
+    with open(jsonl_path, 'w') as f:
+        f.write(json.dumps({'globals': jtr_data['globals']}) + '\n')
+        for instance in jtr_data['instances']:
+            f.write(json.dumps(instance) + '\n')
+    assert as_tuples(load.load_jack(jsonl_path, max_count=5)) == as_tuples(expected[:5])
+
+
+@pytest.mark.data_loaders
+def test_load_jack_globals_after_instances():
+    path = 'tests/test_data/SNLI/1000_samples_dev_jtr_v1.json'
+    with open(path) as f:
+        expected = jack_to_qasetting(json.load(f))
+    loaded = load.load_jack(path)
+    assert loaded[0][0].candidates == ['entailment', 'neutral', 'contradiction']
+    assert [(q.question, q.support, q.candidates, [a.text for a in answers]) for q, answers in loaded] == \
+        [(q.question, q.support, q.candidates, [a.text for a in answers]) for q, answers in expected]
+
+
+@pytest.mark.data_loaders
+def test_stream_jack_globals_after_instances(tmpdir, monkeypatch):
+    from jack.io import json_stream
+    jtr_data = {'instances': [{'support': ['support %d' % i], 'questions': [{'question': 'question %d' % i}]}
+                              for i in range(20)],
+                'globals': {'candidates': ['yes', 'no']}}
+    path = str(tmpdir.join('globals_after_instances.json'))
+    with open(path, 'w') as f:
+        json.dump(jtr_data, f)
+    decoded = []
+    decode = json_stream._JSONReader.decode
+    monkeypatch.setattr(json_stream._JSONReader, 'decode', lambda self: decoded.append(1) or decode(self))
+
+    loaded = load.load_jack(path, max_count=1)
+    # the key "instances" and the first instance
+    assert len(decoded) == 2
+    assert loaded[0][0].candidates == ['yes', 'no']
+
+    del decoded[:]
+    loaded = load.load_jack(path)
+    # all instances are parsed once before their global candidates are accessed
+    assert len(decoded) == 1 + 20 + 2
+    assert all(q.candidates == ['yes', 'no'] for q, _ in loaded)
+    assert len(decoded) == 1 + 20 + 2
+
+
+@pytest.mark.data_loaders
+def test_stream_squad(tmpdir):
+    squad = {'version': '1.1', 'data': [{'title': 'Title', 'paragraphs': [
+        {'context': 'Jack reads text.', 'qas': [
+            {'id': '1', 'question': 'Who reads?', 'answers': [{'text': 'Jack', 'answer_start': 0}]},
+            {'id': '2', 'question': 'What does Jack read?', 'answers': [{'text': 'text', 'answer_start': 11}]}]}]}]}
+    path = str(tmpdir.join('squad.json'))
+    with open(path, 'w') as f:
+        json.dump(squad, f)
+    data = list(load.stream_squad(path))
+    assert [q.id for q, _ in data] == ['1', '2']
+    assert data[1][1][0].span == (11, 15)
+    assert len(load.load_squad(path, max_count=1)) == 1
+
+
+@pytest.mark.data_loaders
+def test_load_triples(tmpdir):
+    path = str(tmpdir.join('train.txt'))
+    with open(path, 'w') as f:
+        f.write('b\tr2\ta\n\na\tr1\tc\nc\tr2\tb\n')
+    data = load.load_triples(path)
+    assert data.entities == ['a', 'b', 'c'] and data.predicates == ['r1', 'r2']
+    assert data.triples.dtype == np.int32
+    assert data.triples.tolist() == [[1, 1, 0], [0, 0, 2], [2, 1, 1]]
+    assert [q.question for q, _ in data] == ['b r2 a', 'a r1 c', 'c r2 b']
+    assert all(a[0].text == 'True' for _, a in data)
+    assert len(load.load_triples(path, max_count=2)) == 2
+    assert data[1:].triples.tolist() == [[0, 0, 2], [2, 1, 1]]
+
+    # unknown entities are mapped to the number of known entities
+    assert data.to_ids({'c': 0, 'b': 1}, {'r1': 1, 'r2': 0}).tolist() == [[1, 0, 2], [2, 1, 0], [0, 0, 1]]
+    assert TripleDataset.from_qa_settings(data).triples.tolist() == data.triples.tolist()
+    assert len(TripleDataset.from_names([])) == 0
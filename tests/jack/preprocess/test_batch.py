@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 
+import random
+import time
+
 from jack.util import batch
 
 
@@ -53,3 +56,58 @@ def test_get_batches():
     batches = list(batch_generator)
 
     assert len(batches) == 3
+
+
+def test_batch_prefetcher():
+    batches = batch.GeneratorWithRestart(lambda: iter(range(10)))
+    prefetcher = batch.BatchPrefetcher(batches, depth=2, transform=lambda b: b * 2)
+
+    for _ in range(2):
+        assert list(prefetcher) == [2 * i for i in range(10)]
+        assert prefetcher.num_batches == 10
+
+    # stops producing when the consumer stops early
+    for i, b in enumerate(prefetcher):
+        if i == 3:
+            break
+    assert prefetcher.num_batches == 4
+
+    # no batches are created while paused
+    created = []
+    prefetcher = batch.BatchPrefetcher(batches, depth=2, transform=lambda b: created.append(b) or b)
+    for b in prefetcher:
+        with prefetcher.paused():
+            num_created = len(created)
+            time.sleep(0.01)
+            assert len(created) == num_created
+
+
+def test_bucket_and_batch():
+    rng = random.Random(0)
+    items = list(range(100))
+    lengths = [(i * 37) % 100 for i in items]
+    batches = list(batch.bucket_and_batch(items, 10, lengths, rng, window=5))
+    assert sorted(i for b in batches for i in b) == items
+    assert all(len(b) == 10 for b in batches)
+
+    shuffled = list(batch.shuffle_and_batch(items, 10, random.Random(0)))
+    bucketed_efficiency = batch.padding_efficiency([lengths[i] for i in b] for b in batches)
+    shuffled_efficiency = batch.padding_efficiency([lengths[i] for i in b] for b in shuffled)
+    assert bucketed_efficiency > shuffled_efficiency
+
+    # without rng, windows are sorted and batches stay in window order
+    batches = list(batch.bucket_and_batch(items, 10, lengths, None, window=10))
+    assert [i for b in batches for i in b] == sorted(items, key=lambda i: lengths[i])
+
+
+def test_padding_efficiency():
+    assert batch.padding_efficiency([[1, 3], [2, 2]]) == 0.8
+    assert batch.padding_efficiency([]) == 1.0
+
+
+def test_batch_by_tokens():
+    lengths = [2, 3, 10, 1, 1, 4]
+    batches = list(batch.batch_by_tokens(list(range(6)), 8, lengths))
+    assert batches == [[0, 1], [2], [3, 4], [5]]
+    batches = list(batch.batch_by_tokens(list(range(6)), 8, lengths, num_rows=[2, 1, 1, 1, 1, 1]))
+    assert batches == [[0], [1], [2], [3, 4], [5]]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+from typing import List, NamedTuple, Optional, Tuple
+
+from jack.util.columnar import store_columnar, load_columnar
+
+Annotation = NamedTuple('Annotation', [
+    ('tokens', List[str]),
+    ('ids', List[int]),
+    ('length', int),
+    ('features', List[List[float]]),
+    ('spans', Optional[List[Tuple[int, int]]]),
+])
+
+
+def test_columnar_roundtrip(tmpdir):
+    annotations = [
+        Annotation(['What', 'is', 'jack', '?'], [3, 4, 5, 6], 4, [[0.5, 1.0], []], [(0, 2), (1, 1)]),
+        Annotation(['Ünïcode', ''], [2, 0], 2, [[1.0]], None),
+        Annotation([], [], 0, [], []),
+    ]
+    path = str(tmpdir.join('store'))
+    store_columnar(path, annotations)
+    loaded = load_columnar(path)
+    assert len(loaded) == 3
+    assert list(loaded) == annotations
+    assert isinstance(loaded[0], Annotation)
+
+    triples = [[1, 2, 3], [4, 5, 6]]
+    store_columnar(str(tmpdir.join('triples')), triples)
+    assert list(load_columnar(str(tmpdir.join('triples')))) == triples
@@ -4,6 +4,7 @@ import numpy as np
 
 from jack.util import map
 from jack.util import preprocessing
+from jack.util.vocab import Vocab
 
 text = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore et ' \
        'dolore magna aliqua. Ut enim ad minim veniam, quis nostrud exercitation ullamco laboris nisi ut aliquip ex ' \
@@ -28,6 +29,74 @@ def test_tokenize():
     assert preprocessing.tokenize(question_text) == desired_tokenised_question
 
 
+def test_tokenize_with_offsets():
+    tokens, offsets = preprocessing.tokenize_with_offsets(text)
+    assert tokens == tokenized_text
+    assert offsets.dtype == np.int32
+    assert offsets.tolist() == preprocessing.token_to_char_offsets(text, tokenized_text)
+    tokens, offsets = preprocessing.tokenize_with_offsets('')
+    assert tokens == [] and len(offsets) == 0
+
+
+def test_nlp_preprocess_batch():
+    v = Vocab()
+    texts = ["It is B.", "", "Is it A?"]
+    tokens, ids, text_offsets, char_offsets = preprocessing.nlp_preprocess_batch(
+        texts, v, lowercase=True, with_tokens_offsets=True)
+    assert tokens == ['it', 'is', 'b', '.', 'is', 'it', 'a', '?']
+    assert ids.tolist() == [1, 2, 3, 4, 2, 1, 5, 6]
+    assert text_offsets.tolist() == [0, 4, 4, 8]
+    assert char_offsets.tolist() == [0, 3, 6, 7, 0, 3, 6, 7]
+    for text, start, end in zip(texts, text_offsets[:-1], text_offsets[1:]):
+        expected_tokens, expected_ids, _, _, expected_offsets = preprocessing.nlp_preprocess(
+            text, v, lowercase=True, with_tokens_offsets=True)
+        assert tokens[start:end] == expected_tokens
+        assert ids[start:end].tolist() == expected_ids
+        assert char_offsets[start:end].tolist() == expected_offsets.tolist()
+    v.freeze()
+    assert preprocessing.nlp_preprocess_batch(["B c"], v).ids.tolist() == [0, 0]
+
+
+def test_nlp_preprocess_batch_without_unk():
+    v = Vocab(unk=None)
+    preprocessing.nlp_preprocess_batch(["It is B."], v)
+    v.freeze()
+    texts = ["It is C?", "It is B."]
+    _, ids, text_offsets, _ = preprocessing.nlp_preprocess_batch(texts, v)
+    assert ids.tolist() == [0, 1, None, None, 0, 1, 2, 3]
+    for text, start, end in zip(texts, text_offsets[:-1], text_offsets[1:]):
+        assert ids[start:end].tolist() == preprocessing.nlp_preprocess(text, v)[1]
+
+
+def test_spacy_preprocess_batch():
+    import spacy
+
+    class CountingNLP:
+        def __init__(self):
+            self.nlp = spacy.blank('en')
+            self.texts = []
+
+        def pipe(self, texts, batch_size=1000):
+            texts = list(texts)
+            self.texts.extend(texts)
+            return self.nlp.pipe(texts, batch_size=batch_size)
+
+    nlp = CountingNLP()
+    setattr(preprocessing, '__spacy_nlp', nlp)
+    try:
+        processed = preprocessing.spacy_preprocess_batch(["It is B.", "Is it?", "It is B."])
+        assert processed[0].tokens == ['It', 'is', 'B.']
+        assert processed[0] == processed[2]
+        assert processed[1].offsets == [0, 3, 5]
+        v = Vocab()
+        tokens, ids, length, _, offsets = preprocessing.nlp_preprocess(
+            "Is it?", v, use_spacy=True, with_tokens_offsets=True)
+        assert tokens == ['Is', 'it', '?'] and ids == [1, 2, 3] and length == 3 and offsets.tolist() == [0, 3, 5]
+        assert nlp.texts == ["It is B.", "Is it?"]
+    finally:
+        setattr(preprocessing, '__spacy_nlp', None)
+
+
 def test_get_list_shape():
     data = [[1, 2, 3], [4, 5]]
     assert map.get_list_shape(data) == [2, 3]
@@ -57,3 +126,20 @@ def test_numpify():
     for ak, bk in zip(data.keys(), data_np.keys()):
         a, b = data[ak], data_np[bk]
         assert (_fillna(a) == b).all()
+
+
+def test_gather_embeddings():
+    lookup = np.arange(12, dtype=np.float64).reshape([4, 3])
+    ids = [[0, 2, 4], [3]]  # 4 is out of vocabulary
+
+    embedded = map.gather_embeddings(ids, lookup)
+
+    assert embedded.dtype == np.float32
+    assert embedded.shape == (2, 3, 3)
+    assert np.array_equal(embedded[0, 0], lookup[0])
+    assert np.array_equal(embedded[0, 1], lookup[2])
+    assert not embedded[0, 2].any()
+    assert np.array_equal(embedded[1, 0], lookup[3])
+    assert not embedded[1, 1:].any()
+
+    assert map.gather_embeddings(ids, lookup, max_length=5).shape == (2, 5, 3)
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from jack.util.preprocessing import sort_by_tfidf
+from jack.util.tfidf import TfidfRanker
+
+paragraphs = ['The dog is sleeping in the garden.',
+              'Where is the cat? The cat is hiding.',
+              'A cat sat on the mat.',
+              'It is raining.']
+
+
+def test_tfidf_ranker():
+    ranker = TfidfRanker(cache_size=1)
+    ranking, = ranker.rank(['where is the cat?'], [paragraphs])
+    # paragraphs 0 and 3 tie, ties are sorted by paragraph text
+    assert [i for i, _ in ranking] == [1, 2, 3, 0]
+    assert ranking[0][1] > ranking[1][1] > 0.0
+    assert np.isclose(ranking[-1][1], 0.0)
+
+    # documents of several questions are ranked at once, repeated documents are analyzed once
+    other = ['Dogs bark.', 'Cats purr.']
+    rankings = ranker.rank(['where is the cat?', 'what do dogs do?', 'what do cats do?'],
+                           [paragraphs, other, other])
+    assert rankings[0] == ranking
+    assert [i for i, _ in rankings[1]] == [0, 1]
+    assert [i for i, _ in rankings[2]] == [1, 0]
+    assert len(ranker._cache) == 1
+
+    # documents without terms keep their order
+    assert ranker.rank(['cat'], [['the', 'a']]) == [[(0, 0.0), (1, 0.0)]]
+    assert sort_by_tfidf('where is the cat?', paragraphs) == ranking
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+import numpy as np
+
 from jack.util import vocab
 
 
@@ -25,3 +27,41 @@ def test_vocab():
 
     assert v.get_ids_pretrained() == []
     assert v.get_ids_oov() == [0, 1, 2, 3, 4, 5]
+
+
+def test_vocab_get_ids():
+    v = vocab.Vocab()
+    assert v.get_ids(['A', 'B', 'A']) == [1, 2, 1]
+    assert v.sym2freqs == {'<UNK>': 0, 'A': 2, 'B': 1}
+    v.freeze()
+    assert v.get_ids(['B', 'E', 'A']) == [2, 0, 1]
+    assert v(['B', 'E', 'A']) == [2, 0, 1]
+
+
+def test_vocab_store_load():
+    import os
+    import pickle
+    import tempfile
+    from jack.io.embeddings import Embeddings
+    emb = Embeddings({'the': 0, 'a': 1}, np.ones([2, 3], dtype=np.float32))
+    v = vocab.Vocab(emb=emb)
+    v(['x', 'the', 'y', 'a', 'the'])
+    v.freeze()
+    assert v.sym2id == {'<UNK>': 0, 'x': 1, 'the': 3, 'y': 2, 'a': 4}
+    assert v.id2sym == {0: '<UNK>', 1: 'x', 3: 'the', 2: 'y', 4: 'a'}
+    assert v.get_ids_pretrained() == [3, 4]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        v.store(tmp_dir + "/vocab")
+        loaded = vocab.Vocab()
+        loaded.load(tmp_dir + "/vocab")
+        assert loaded.sym2id == v.sym2id and loaded.sym2freqs == v.sym2freqs and loaded('the') == 3
+
+        # vocabs stored by older versions
+        with open(os.path.join(tmp_dir, "vocab", "remainder.pkl"), "wb") as f:
+            pickle.dump({'unk': v.unk, 'frozen': True, 'next_pos': 3, 'next_neg': -3, 'emb_length': 3,
+                         'sym2id': dict(v.sym2id), 'id2sym': dict(v.id2sym), 'sym2freqs': dict(v.sym2freqs)}, f)
+        loaded = vocab.Vocab()
+        loaded.load(tmp_dir + "/vocab")
+        assert loaded.sym2id == v.sym2id and loaded.sym2freqs == v.sym2freqs
+        loaded.unfreeze()
+        assert loaded.sym2id == {'<UNK>': 0, 'x': 1, 'the': -1, 'y': 2, 'a': -2}
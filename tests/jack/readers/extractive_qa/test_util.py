@@ -27,5 +27,5 @@ def test_prepare_data():
     assert support_lemmas == [None, None]
     assert support_length == [5, 4]
     assert word_in_question == [[0.0, 1.0, 0.0, 0.0, 0.0], [0.0, 1.0, 0.0, 0.0]]
-    assert token_offsets == [[0, 3, 6, 10, 11], [0, 3, 6, 7]]
+    assert [o.tolist() for o in token_offsets] == [[0, 3, 6, 10, 11], [0, 3, 6, 7]]
     assert answer_spans == [[], [(2, 2)]]
@@ -1,9 +1,18 @@
 # -*- coding: utf-8 -*-
 
+from collections import namedtuple
+
+import numpy as np
+import pytest
 import tensorflow as tf
 
 import jack.readers as readers
+from jack.core import Ports, QASetting, SharedResources
 from jack.io.load import loaders
+from jack.io.triples import TripleDataset
+from jack.readers.link_prediction.completion import EntityPredictor
+from jack.readers.link_prediction.entity_scores import get_scorer
+from jack.readers.link_prediction.models import KnowledgeGraphEmbeddingInputModule, corrupt_triples
 
 
 def test_kbp():
@@ -26,3 +35,82 @@ def test_kbp():
             assert len(answers) == 5000
 
             assert answers, 'KBP reader should produce answers'
+
+
+def test_kbp_triple_batches():
+    data = loaders['jack']('tests/test_data/WN18/wn18-snippet.jack.json')
+    triples = TripleDataset.from_qa_settings(data)
+    assert [q.question for q, _ in triples[:3]] == [q.question for q, _ in data[:3]]
+
+    rng = np.random.RandomState(0)
+    negatives = corrupt_triples(triples.triples[:4], 10, 2, rng)
+    assert negatives.shape == (16, 3)
+    assert np.array_equal(negatives[:, 1], np.repeat(triples.triples[:4, 1], 4))
+    assert np.array_equal(negatives[1::2, 0], np.repeat(triples.triples[:4, 0], 2))
+    assert np.array_equal(negatives[0::2, 2], np.repeat(triples.triples[:4, 2], 2))
+    assert negatives[0::2, 0].max() < 10 and negatives[1::2, 2].max() < 10
+
+    shared_resources = SharedResources(config={'num_negative': 2})
+    input_module = KnowledgeGraphEmbeddingInputModule(shared_resources)
+    input_module.setup_from_data(triples)
+    assert sorted(shared_resources.entity_to_index.values()) == list(range(len(triples.entities)))
+    batches = list(input_module.batch_generator(triples, 64, is_eval=False))
+    assert len(batches) == int(np.ceil(len(triples) / 64))
+    positives = []
+    for batch in batches:
+        # each triple is followed by 2 * num_negative corrupted triples
+        nb_positives = len(batch[Ports.Input.question]) // 5
+        assert batch[Ports.Target.target_index].tolist() == [1] * nb_positives + [0] * (4 * nb_positives)
+        positives.extend(map(tuple, batch[Ports.Input.question][:nb_positives]))
+    triple_ids = triples.to_ids(shared_resources.entity_to_index, shared_resources.predicate_to_index)
+    assert sorted(positives) == sorted(map(tuple, triple_ids))
+
+    # datasets of input-answer pairs give the same vocabularies
+    setup_from_questions = KnowledgeGraphEmbeddingInputModule(SharedResources(config={'num_negative': 2}))
+    setup_from_questions.setup_from_data(data)
+    assert setup_from_questions.shared_resources.entity_to_index == shared_resources.entity_to_index
+    assert setup_from_questions.shared_resources.predicate_to_index == shared_resources.predicate_to_index
+
+
+def test_entity_predictor(tmpdir):
+    rng = np.random.RandomState(0)
+    entity_to_index = {'e{}'.format(i): i for i in range(50)}
+    predicate_to_index = {'p0': 0, 'p1': 1}
+
+    for model_name in ['TransE', 'DistMult', 'ComplEx']:
+        entity_embeddings, predicate_embeddings = rng.randn(51, 6), rng.randn(2, 6)
+
+        class ModelModule:
+            def embeddings(self):
+                return entity_embeddings, predicate_embeddings
+
+        model_module = ModelModule()
+        model_module.model_name = model_name
+        reader = namedtuple('Reader', ['model_module', 'shared_resources'])(
+            model_module, SharedResources(config={}))
+        reader.shared_resources.entity_to_index = entity_to_index
+        reader.shared_resources.predicate_to_index = predicate_to_index
+
+        queries = [QASetting('e3 p1 ?'), QASetting('? p0 e7'), QASetting('unknown p0 ?')]
+        scorer = get_scorer(model_name, entity_embeddings, predicate_embeddings)
+        entities = np.arange(50)
+        expected = [scorer.score(np.full([50], 3), np.full([50], 1), entities),
+                    scorer.score(entities, np.full([50], 0), np.full([50], 7)),
+                    scorer.score(np.full([50], 50), np.full([50], 0), entities)]
+
+        index_dir = str(tmpdir.join(model_name))
+        # with all partitions searched and all candidates re-ranked, results are exact
+        predictors = [EntityPredictor(reader), EntityPredictor(reader, nb_partitions=5, nprobe=5),
+                      EntityPredictor(reader, nb_partitions=5, nprobe=5, nb_subspaces=3, rerank=50,
+                                      index_dir=index_dir),
+                      EntityPredictor(reader, nprobe=5, rerank=50, index_dir=index_dir)]
+        assert predictors[-1].index.quantizer is not None
+        for predictor in predictors:
+            answers = predictor(queries, k=4)
+            for query_answers, scores in zip(answers, expected):
+                top = np.argsort(-scores, kind='mergesort')[:4]
+                assert [a.text for a in query_answers] == ['e{}'.format(i) for i in top]
+                assert np.allclose([a.score for a in query_answers], scores[top], rtol=1e-4)
+
+        with pytest.raises(ValueError):
+            EntityPredictor(reader)([QASetting('e1 p0 e2')])
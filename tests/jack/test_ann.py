@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from jack.util.ann import IVFIndex, ProductQuantizer, search, similarities, top_k
+
+
+def test_top_k():
+    scores = np.array([[0.5, 2.0, 1.0, 2.0], [3.0, 1.0, 2.0, 0.0]])
+    indices, top_scores = top_k(scores, 3)
+    assert indices.tolist() == [[1, 3, 2], [0, 2, 1]]
+    assert top_scores.tolist() == [[2.0, 2.0, 1.0], [3.0, 2.0, 1.0]]
+    assert top_k(scores, 10)[0].tolist() == [[1, 3, 2, 0], [0, 2, 1, 3]]
+
+
+def test_ivf_index():
+    rng = np.random.RandomState(0)
+    vectors = rng.randn(500, 8).astype(np.float32)
+    queries = rng.randn(20, 8).astype(np.float32)
+    for metric in ['dot', 'cosine', 'l1', 'l2']:
+        index = IVFIndex.build(vectors, 10, metric)
+        assert len(index) == 500
+        assert sorted(index.ids.tolist()) == list(range(500))
+        expected, expected_scores = top_k(similarities(queries, vectors, metric), 5)
+
+        # searching all partitions is exact
+        ids, scores = index.search(queries, 5, nprobe=10)
+        assert ids.tolist() == expected.tolist()
+        assert np.allclose(scores, expected_scores, rtol=1e-4)
+
+        exact_ids, exact_scores = search(queries, vectors, 5, metric, block_size=64)
+        assert exact_ids.tolist() == expected.tolist()
+        assert np.allclose(exact_scores, expected_scores, rtol=1e-4)
+
+        ids, _ = index.search(queries, 5, nprobe=3)
+        recall = np.mean([len(set(i) & set(e)) / 5 for i, e in zip(ids.tolist(), expected.tolist())])
+        assert recall > 0.3
+
+    # fewer vectors than requested results
+    ids, scores = IVFIndex.build(vectors[:3], 2).search(queries[:1], 5, nprobe=2)
+    assert sorted(ids[0, :3].tolist()) == [0, 1, 2] and ids[0, 3:].tolist() == [-1, -1]
+    assert np.isinf(scores[0, 3:]).all()
+
+
+def test_product_quantization(tmpdir):
+    rng = np.random.RandomState(0)
+    vectors = rng.randn(2000, 16).astype(np.float32)
+    queries = rng.randn(20, 16).astype(np.float32)
+
+    quantizer = ProductQuantizer.train(vectors, 4, rng=rng)
+    codes = quantizer.encode(vectors)
+    assert codes.shape == (2000, 4) and codes.dtype == np.uint8
+    decoded = quantizer.decode(codes)
+    assert np.mean((decoded - vectors) ** 2) < 0.5 * np.mean(vectors ** 2)
+    for metric in ['dot', 'l1', 'l2']:
+        tables = quantizer.tables(queries, metric)
+        assert np.allclose(quantizer.similarities(tables[0], codes), similarities(queries[:1], decoded, metric)[0],
+                           rtol=1e-3, atol=1e-3)
+
+    for metric in ['cosine', 'l1']:
+        index = IVFIndex.build(vectors, 8, metric, nb_subspaces=4)
+        expected, expected_scores = search(queries, vectors, 10, metric)
+        ids, _ = index.search(queries, 10, nprobe=8)
+        recall = np.mean([len(set(i) & set(e)) / 10 for i, e in zip(ids.tolist(), expected.tolist())])
+        assert recall > 0.3
+        # re-ranking all candidates gives exact results
+        ids, scores = index.search(queries, 10, nprobe=8, rerank=200)
+        assert ids.tolist() == expected.tolist()
+        assert np.allclose(scores, expected_scores, rtol=1e-4)
+
+        path = str(tmpdir.join(metric))
+        index.store(path)
+        loaded = IVFIndex.load(path)
+        assert loaded.metric == metric and len(loaded) == 2000
+        assert loaded.search(queries, 10, nprobe=3)[0].tolist() == index.search(queries, 10, nprobe=3)[0].tolist()
+        with pytest.raises(ValueError):
+            loaded.search(queries, 10, nprobe=3, rerank=2)
+        with pytest.raises(ValueError):
+            IVFIndex.load(path, vectors[:10])
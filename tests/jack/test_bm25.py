@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+import math
+
+from jack.core.data_structures import QASetting
+from jack.util.bm25 import BM25Index, build_bm25_index, corpus_paragraphs
+
+paragraphs = ['The cat sat on the mat.',
+              'Dogs and cats are pets. The cat is a small animal.',
+              'Paris is the capital of France.',
+              'Ünïcode text about the capital.']
+
+
+def test_bm25_index(tmpdir):
+    path = str(tmpdir.join('index'))
+    build_bm25_index(path, iter(paragraphs), block_size=4)
+    index = BM25Index(path)
+    assert len(index) == 4
+    assert [index.paragraph(i) for i in range(4)] == paragraphs
+
+    results = index.search(['Where is the cat?', 'What is the capital of France?', 'unknown words', 'ünïcode'], k=2)
+    assert [i for i, _ in results[0]] == [1, 0]  # 'is' and 'cat'
+    assert [i for i, _ in results[1]] == [2, 3]
+    assert results[2] == []
+    assert [i for i, _ in results[3]] == [3]
+
+    # single term query: idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_length))
+    avg_length = (6 + 11 + 6 + 5) / 4
+    idf = math.log(1.0 + (4 - 1 + 0.5) / (1 + 0.5))
+    expected = idf * 2.2 / (1 + 1.2 * (0.25 + 0.75 * 6 / avg_length))
+    assert math.isclose(index.search(['paris'])[0][0][1], expected, rel_tol=1e-5)
+
+    dataset = [(QASetting('Which animal sat on the mat?', [paragraphs[1], paragraphs[0]], id='q1'), None),
+               (QASetting('What is the capital of France?', [paragraphs[2], paragraphs[0]], id='q2'), None)]
+    assert corpus_paragraphs(dataset) == [paragraphs[1], paragraphs[0], paragraphs[2]]
+    retrieved = index.retrieve([q for q, _ in dataset], k=1)
+    assert [q.id for q in retrieved] == ['q1', 'q2']
+    assert [q.support for q in retrieved] == [[paragraphs[0]], [paragraphs[2]]]
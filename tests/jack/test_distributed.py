@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from jack.io.triples import TripleDataset
+from jack.util.distributed import parse_hosts, shard
+
+
+def test_parse_hosts():
+    assert parse_hosts(None) == []
+    assert parse_hosts('localhost:2222, localhost:2223') == ['localhost:2222', 'localhost:2223']
+    assert parse_hosts(['host1:2222']) == ['host1:2222']
+
+
+def test_shard():
+    dataset = list(range(11))
+    shards = [shard(dataset, 3, i) for i in range(3)]
+    assert shards == [[0, 3, 6], [1, 4, 7], [2, 5, 8]]
+    assert shard(iter(dataset), 3, 1) == [1, 4, 7]
+
+    triples = TripleDataset(np.arange(21).reshape([7, 3]), [str(i) for i in range(21)], ['p'])
+    triple_shard = shard(triples, 2, 1)
+    assert isinstance(triple_shard, TripleDataset)
+    assert triple_shard.triples[:, 0].tolist() == [3, 9, 15]
@@ -16,3 +16,209 @@ def test_memory_map_dir():
         assert loaded_embeddings.vocabulary["the"] == 0
         assert "foo" not in loaded_embeddings.vocabulary
         assert np.isclose(loaded_embeddings.get("the"), embeddings.get("the"), 1.e-5).all()
+        assert not loaded_embeddings.lookup.flags.writeable
+
+
+def test_memory_map_dir_with_json_vocab():
+    import json
+    import tempfile
+    from jack.io.embeddings.memory_map import save_as_memory_map_dir, load_memory_map_dir
+    embeddings = load_embeddings("tests/test_data/glove.500.50d.txt", 'glove')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        save_as_memory_map_dir(tmp_dir, embeddings)
+        # directories written by older versions store the vocabulary in the meta file
+        with open(tmp_dir + "/meta.json") as f:
+            meta = json.load(f)
+        with open(tmp_dir + "/meta.json", "w") as f:
+            json.dump({"vocab": embeddings.vocabulary, "shape": meta["shape"]}, f)
+        loaded_embeddings = load_memory_map_dir(tmp_dir)
+        assert loaded_embeddings.vocabulary == embeddings.vocabulary
+        assert np.array_equal(loaded_embeddings.lookup, embeddings.lookup)
+
+
+def test_load_glove():
+    embeddings_file = "tests/test_data/glove.500.50d.txt"
+    embeddings = load_embeddings(embeddings_file, 'glove')
+    assert embeddings.shape == (500, 50)
+    assert embeddings.lookup.dtype == np.float32
+    with open(embeddings_file, 'rb') as f:
+        for i, line in enumerate(f):
+            word, vector = line.rstrip().split(maxsplit=1)
+            assert embeddings.vocabulary[word.decode('utf-8')] == i
+            assert np.allclose(embeddings.lookup[i], np.array(vector.split(), dtype=np.float32))
+
+
+def test_embedding_cache():
+    import os
+    import shutil
+    import tempfile
+    from jack.io.embeddings.memory_map import verify_memory_map_dir
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        embeddings_file = os.path.join(tmp_dir, "glove.500.50d.txt")
+        shutil.copy("tests/test_data/glove.500.50d.txt", embeddings_file)
+        embeddings = load_embeddings(embeddings_file, 'glove', cache=True)
+        assert os.path.exists(embeddings_file + '.memory_map_dir')
+        assert verify_memory_map_dir(embeddings_file + '.memory_map_dir')
+        cached = load_embeddings(embeddings_file, 'glove', cache=True)
+        assert cached.emb_format == 'memory_map_dir'
+        assert cached.vocabulary == embeddings.vocabulary
+        assert np.array_equal(cached.lookup, embeddings.lookup)
+
+
+def test_embedding_cache_verify():
+    import os
+    import shutil
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        embeddings_file = os.path.join(tmp_dir, "glove.500.50d.txt")
+        shutil.copy("tests/test_data/glove.500.50d.txt", embeddings_file)
+        embeddings = load_embeddings(embeddings_file, 'glove', cache=True)
+        mem_map = np.memmap(os.path.join(embeddings_file + '.memory_map_dir', 'memory_map'), dtype='float32',
+                            mode='r+', shape=embeddings.shape)
+        mem_map[0] += 1.0
+        mem_map.flush()
+        del mem_map
+        assert not np.array_equal(load_embeddings(embeddings_file, 'glove', cache=True).lookup, embeddings.lookup)
+        # corrupted caches are converted again
+        verified = load_embeddings(embeddings_file, 'glove', cache=True, verify_cache=True)
+        assert np.array_equal(verified.lookup, embeddings.lookup)
+        assert np.array_equal(load_embeddings(embeddings_file, 'glove', cache=True).lookup, embeddings.lookup)
+
+
+def test_restricted_embeddings():
+    import tempfile
+    from jack.io.embeddings.memory_map import save_as_memory_map_dir
+    embeddings_file = "tests/test_data/glove.500.50d.txt"
+    embeddings = load_embeddings(embeddings_file, 'glove')
+    words = sorted(embeddings.vocabulary, key=embeddings.vocabulary.get)
+    vocab = {words[3], words[42], words[7], 'not-a-word-in-glove'}
+    restricted = load_embeddings(embeddings_file, 'glove', vocab=vocab)
+    assert restricted.shape == (3, 50)
+    assert restricted.filename is None
+    for w in [words[3], words[7], words[42]]:
+        assert np.array_equal(restricted.get(w), embeddings.get(w))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        save_as_memory_map_dir(tmp_dir + "/glove", embeddings)
+        restricted_mmap = load_embeddings(tmp_dir + "/glove", 'memory_map_dir', vocab=vocab)
+        assert restricted_mmap.vocabulary == restricted.vocabulary
+        assert np.array_equal(restricted_mmap.lookup, restricted.lookup)
+
+
+def _write_word2vec(path, words, vectors):
+    import gzip
+    with gzip.open(path, 'wb') as f:
+        f.write(('%d %d\n' % vectors.shape).encode('utf-8'))
+        for word, vector in zip(words, vectors):
+            f.write(word.encode('utf-8') + b' ' + vector.astype(np.float32).tobytes() + b'\n')
+
+
+def test_load_word2vec():
+    import os
+    import tempfile
+    from jack.io.embeddings.word_to_vec import load_word2vec
+    rng = np.random.RandomState(0)
+    words = ['w%d' % i for i in range(1000)] + ['ünïcode']
+    vectors = rng.randn(len(words), 20).astype(np.float32)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        embeddings_file = os.path.join(tmp_dir, "vectors.bin.gz")
+        _write_word2vec(embeddings_file, words, vectors)
+        vocab, lookup = load_word2vec(embeddings_file, normalise=False, block_size=1000)
+        assert lookup.shape == vectors.shape
+        assert all(vocab[w] == i for i, w in enumerate(words))
+        assert np.array_equal(lookup, vectors)
+
+        vocab, lookup = load_word2vec(embeddings_file, vocab={'w3', 'ünïcode', 'foo'},
+                                      memory_map=os.path.join(tmp_dir, "memory_map"))
+        assert isinstance(lookup, np.memmap)
+        assert vocab == {'w3': 0, 'ünïcode': 1}
+        assert np.allclose(lookup, vectors[[3, -1]] / np.linalg.norm(vectors[[3, -1]], axis=1, keepdims=True))
+        assert os.path.getsize(os.path.join(tmp_dir, "memory_map")) == 2 * 20 * 4
+
+
+def test_string_table():
+    import os
+    import pickle
+    import tempfile
+    from jack.util.string_table import StringTable, store_string_table
+    vocab = {'the': 3, 'a': 0, 'ünïcode': 1, '': 2, 'zebra': 4}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store_string_table(os.path.join(tmp_dir, "vocab.table"), vocab)
+        table = StringTable(os.path.join(tmp_dir, "vocab.table"))
+        assert len(table) == 5
+        assert list(table) == list(vocab)
+        assert list(table.items()) == list(vocab.items())
+        assert table == vocab
+        assert table['ünïcode'] == 1 and table.get('') == 2
+        assert 'foo' not in table and b'the' not in table and table.get('b') is None
+        assert pickle.loads(pickle.dumps(table)) == vocab
+        assert list(table.keys()) == list(vocab.keys())
+        assert list(table.values()) == list(vocab.values())
+
+
+def test_vocab_from_string_table(monkeypatch):
+    import os
+    import tempfile
+    from jack.io.embeddings.embeddings import Embeddings
+    from jack.util.string_table import StringTable, store_string_table
+    from jack.util.vocab import Vocab
+    words = {'the': 0, 'a': 1, 'ünïcode': 2}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store_string_table(os.path.join(tmp_dir, "vocab.table"), words)
+        table = StringTable(os.path.join(tmp_dir, "vocab.table"))
+        embeddings = Embeddings(table, np.random.rand(3, 4).astype(np.float32))
+
+        def lookup(self, key):
+            raise AssertionError('looked up %s' % key)
+
+        # building a vocabulary only iterates the table
+        monkeypatch.setattr(StringTable, '__getitem__', lookup)
+        vocab = Vocab(emb=embeddings, init_from_embeddings=True, unk=None)
+        monkeypatch.undo()
+        assert [vocab.get_id(w) for w in words] == [0, 1, 2]
+
+
+def test_quantized_memory_map_dir():
+    import tempfile
+    from jack.io.embeddings.memory_map import save_as_memory_map_dir, load_memory_map_dir, verify_memory_map_dir
+    from jack.util.map import gather_embeddings
+    embeddings = load_embeddings("tests/test_data/glove.500.50d.txt", 'glove')
+    ids = [[0, 10, 499], [3, 600]]
+    expected = gather_embeddings(ids, embeddings.lookup)
+    for dtype, tolerance in [('float16', 1e-3), ('int8', 1e-2)]:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            save_as_memory_map_dir(tmp_dir, embeddings, dtype=dtype, block_size=128)
+            assert verify_memory_map_dir(tmp_dir)
+            quantized = load_memory_map_dir(tmp_dir)
+            assert quantized.shape == embeddings.shape
+            scale = np.abs(embeddings.lookup).max()
+            assert quantized.get("the").dtype == np.float32
+            assert np.allclose(quantized.get("the"), embeddings.get("the"), atol=tolerance * scale)
+            assert np.allclose(quantized.lookup[5:9], embeddings.lookup[5:9], atol=tolerance * scale)
+            assert np.allclose(gather_embeddings(ids, quantized.lookup), expected, atol=tolerance * scale)
+
+
+def test_nearest_neighbours():
+    import tempfile
+    from jack.io.embeddings.memory_map import save_as_memory_map_dir, load_memory_map_dir, build_ann_index
+    embeddings = load_embeddings("tests/test_data/glove.500.50d.txt", 'glove')
+    neighbours = embeddings.nearest_neighbours(['the', 'of', 'unknown-word'], k=5)
+    assert [w for w, _ in neighbours[0]][0] == 'the' and np.isclose(neighbours[0][0][1], 1.0, atol=1e-5)
+    assert len(neighbours[1]) == 5 and neighbours[2] == []
+    similarities = [s for _, s in neighbours[1]]
+    assert similarities == sorted(similarities, reverse=True)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        save_as_memory_map_dir(tmp_dir, embeddings, dtype='float16')
+        index = build_ann_index(tmp_dir, 4, nb_subspaces=10)
+        assert len(index) == embeddings.shape[0]
+        loaded_embeddings = load_memory_map_dir(tmp_dir)
+        assert loaded_embeddings.index is not None and loaded_embeddings.index.metric == 'cosine'
+        # all partitions and candidates searched give the exact neighbours
+        exact = loaded_embeddings.nearest_neighbours(['the', 'of'], k=5, nprobe=4, rerank=100)
+        assert [[w for w, _ in n] for n in exact] == [[w for w, _ in n] for n in neighbours[:2]]
+        approximate = loaded_embeddings.nearest_neighbours(np.stack([embeddings.get('of')]), k=5, nprobe=1)
+        assert len(approximate[0]) == 5
+
+        # the index of replaced embeddings is removed
+        save_as_memory_map_dir(tmp_dir, embeddings)
+        assert load_memory_map_dir(tmp_dir).index is None
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+from typing import List, Optional, Mapping
+
+import numpy as np
+
+from jack.core import OnlineInputModule, SharedResources, QASetting, Answer, TensorPort, Ports
+from jack.util.batch import GeneratorWithRestart
+from jack.util.map import numpify
+
+
+class LengthInputModule(OnlineInputModule[List[int]]):
+    """Toy input module whose annotations are the lengths of question and support."""
+
+    @property
+    def output_ports(self) -> List[TensorPort]:
+        return [Ports.Input.question_length, Ports.Input.support_length]
+
+    @property
+    def training_ports(self) -> List[TensorPort]:
+        return []
+
+    def preprocess(self, questions: List[QASetting], answers: Optional[List[List[Answer]]] = None,
+                   is_eval: bool = False) -> List[List[int]]:
+        return [[len(q.question.split()), len(q.support[0].split())] for q in questions]
+
+    def create_batch(self, annotations: List[List[int]],
+                     is_eval: bool, with_answers: bool) -> Mapping[TensorPort, np.ndarray]:
+        return numpify({Ports.Input.question_length: [a[0] for a in annotations],
+                        Ports.Input.support_length: [a[1] for a in annotations]})
+
+
+def _dataset(n=50):
+    return [(QASetting(question=' '.join(['q'] * (i % 7 + 1)), support=[' '.join(['s'] * (i % 13 + 1))]),
+             [Answer('s')]) for i in range(n)]
+
+
+def _collect(config, is_eval):
+    input_module = LengthInputModule(SharedResources(config=config), seed=1)
+    batches = input_module.batch_generator(_dataset(), 8, is_eval=is_eval)
+    return [[b[Ports.Input.question_length].tolist(), b[Ports.Input.support_length].tolist()]
+            for _ in range(2) for b in batches]
+
+
+def test_parallel_preprocessing():
+    for is_eval in [True, False]:
+        inline = _collect({}, is_eval)
+        parallel = _collect({'num_preprocessing_workers': 2}, is_eval)
+        assert inline == parallel
+
+
+def test_preprocessed_cache(tmpdir):
+    config = {'preprocessed_cache_dir': str(tmpdir)}
+    for is_eval in [True, False]:
+        assert _collect({}, is_eval) == _collect(config, is_eval)
+    assert len(tmpdir.listdir()) == 1
+
+    # a second run reads the annotations from the cache instead of preprocessing
+    input_module = LengthInputModule(SharedResources(config=config), seed=1)
+    input_module.preprocess = None
+    batches = input_module.batch_generator(_dataset(), 8, is_eval=True)
+    assert sum(len(b[Ports.Input.question_length]) for b in batches) == 50
+
+    # preprocessing configuration is part of the cache key
+    _collect(dict(config, lowercase=True), True)
+    assert len(tmpdir.listdir()) == 2
+
+
+def test_preprocessing_fingerprint():
+    from jack.io.load import LoadedDataset
+    from jack.util.vocab import Vocab
+    vocab = Vocab()
+    vocab('a')
+    input_module = LengthInputModule(SharedResources(vocab, config={}), seed=1)
+    dataset = _dataset()
+    fingerprint = input_module._preprocessing_fingerprint(dataset)
+    assert input_module._preprocessing_fingerprint(_dataset()) == fingerprint
+    assert input_module._preprocessing_fingerprint(dataset[1:]) != fingerprint
+
+    # datasets loaded from file are identified by their source instead of their content
+    source = ('jack', '/data/train.json', 0, 1000, None)
+    loaded = input_module._preprocessing_fingerprint(LoadedDataset(dataset, source))
+    assert loaded != fingerprint
+    assert input_module._preprocessing_fingerprint(LoadedDataset(dataset[1:], source)) == loaded
+
+    vocab('b')
+    assert input_module._preprocessing_fingerprint(dataset) != fingerprint
+
+
+def test_length_bucketing():
+    input_module = LengthInputModule(SharedResources(config={'bucket_window': 2}), seed=1)
+    dataset = _dataset()
+    batches = list(input_module.batch_generator(dataset, 8, is_eval=False))
+    assert sum(len(b[Ports.Input.support_length]) for b in batches) == len(dataset)
+    # instances of each window of 2 batches are sorted by support length
+    assert sum(b[Ports.Input.support_length].max() - b[Ports.Input.support_length].min() for b in batches) < 50
+
+
+def test_token_budget_batching():
+    for config in [{'max_batch_tokens': 40}, {'max_batch_tokens': 40, 'bucket_window': 2}]:
+        input_module = LengthInputModule(SharedResources(config=config), seed=1)
+        for is_eval in [True, False]:
+            batches = list(input_module.batch_generator(_dataset(), 8, is_eval=is_eval))
+            assert sum(len(b[Ports.Input.support_length]) for b in batches) == 50
+            for b in batches:
+                support_length = b[Ports.Input.support_length]
+                assert len(support_length) == 1 or len(support_length) * support_length.max() <= 40
+
+
+def test_streamed_dataset():
+    dataset = _dataset()
+    stream = GeneratorWithRestart(lambda: iter(dataset))
+    for config in [{}, {'num_preprocessing_workers': 2}]:
+        input_module = LengthInputModule(SharedResources(config=config), seed=1)
+        expected = [b[Ports.Input.support_length].tolist()
+                    for b in input_module.batch_generator(dataset, 8, is_eval=True)]
+        for _ in range(2):
+            streamed = [b[Ports.Input.support_length].tolist()
+                        for b in input_module.batch_generator(stream, 8, is_eval=True)]
+            assert streamed == expected
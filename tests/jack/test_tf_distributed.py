@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+import socket
+
+import pytest
+
+tf = pytest.importorskip('tensorflow')
+
+import multiprocessing as mp
+
+
+def _free_ports(n):
+    sockets = [socket.socket() for _ in range(n)]
+    for s in sockets:
+        s.bind(('localhost', 0))
+    ports = [s.getsockname()[1] for s in sockets]
+    for s in sockets:
+        s.close()
+    return ['localhost:{}'.format(p) for p in ports]
+
+
+def _run_task(job_name, task_index, ps_hosts, worker_hosts, results):
+    import tensorflow as tf
+    from jack.core.tensorflow import TFCluster
+    cluster = TFCluster(ps_hosts, worker_hosts, job_name, task_index, sync_replicas=True, num_threads=1)
+    if job_name == 'ps':
+        cluster.join()
+    with tf.device(cluster.device_setter()):
+        global_step = tf.train.create_global_step()
+        weights = tf.get_variable('weights', initializer=tf.zeros([3]))
+        # the gradient of worker i is -(i + 1), so every averaged update adds 1.5 * learning rate to the weights
+        loss = -tf.reduce_sum(weights) * (task_index + 1)
+        optimizer = cluster.optimizer(tf.train.GradientDescentOptimizer(0.1))
+        min_op = optimizer.minimize(loss, global_step)
+    session = tf.Session(cluster.server.target, config=cluster.session_config)
+    cluster.start(session, tf.global_variables())
+    for _ in range(3):
+        session.run(min_op)
+    results.put((task_index, session.run(weights).tolist(), session.run(global_step)))
+
+
+def test_tf_cluster():
+    hosts = _free_ports(3)
+    ps_hosts, worker_hosts = hosts[:1], hosts[1:]
+
+    ctx = mp.get_context('spawn')
+    results = ctx.Queue()
+    ps = ctx.Process(target=_run_task, args=('ps', 0, ps_hosts, worker_hosts, results))
+    ps.start()
+    workers = [ctx.Process(target=_run_task, args=('worker', i, ps_hosts, worker_hosts, results)) for i in range(2)]
+    for p in workers:
+        p.start()
+    try:
+        outputs = sorted(results.get(timeout=120) for _ in workers)
+        for p in workers:
+            p.join()
+    finally:
+        ps.terminate()
+
+    (_, weights0, step0), (_, weights1, step1) = outputs
+    assert weights0 == weights1
+    assert step0 == step1 == 3
+    for w in weights0:
+        assert abs(w - 0.45) < 1e-5
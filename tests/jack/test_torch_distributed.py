@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+import socket
+
+import pytest
+
+torch = pytest.importorskip('torch')
+
+import torch.multiprocessing as mp
+from torch import nn
+from torch.autograd import Variable
+
+from jack.core.torch import TorchCluster
+
+
+def _run_rank(rank, init_method, results):
+    cluster = TorchCluster(init_method, 2, rank)
+    torch.manual_seed(rank)
+    module = nn.Linear(3, 2)
+    optimizer = torch.optim.SGD(module.parameters(), lr=0.1 * (rank + 1))
+    params = cluster.trainable_parameters(module)
+    cluster.broadcast_parameters(params)
+    # gradients of rank r are all (r + 1) / 4
+    loss = (module(Variable(torch.ones(1, 3))) * (rank + 1) / 4.0).sum()
+    loss.backward()
+    cluster.broadcast_learning_rates(optimizer)
+    cluster.average_gradients(params)
+    results.put((rank, module.weight.data.tolist(), module.weight.grad.data.tolist(),
+                 optimizer.param_groups[0]['lr']))
+
+
+def test_torch_cluster():
+    s = socket.socket()
+    s.bind(('localhost', 0))
+    init_method = 'tcp://localhost:{}'.format(s.getsockname()[1])
+    s.close()
+
+    ctx = mp.get_context('spawn')
+    results = ctx.Queue()
+    processes = [ctx.Process(target=_run_rank, args=(rank, init_method, results)) for rank in range(2)]
+    for p in processes:
+        p.start()
+    outputs = sorted(results.get(timeout=60) for _ in processes)
+    for p in processes:
+        p.join()
+
+    (_, weight0, grad0, lr0), (_, weight1, grad1, lr1) = outputs
+    assert weight0 == weight1
+    assert grad0 == grad1
+    for row in grad0:
+        for g in row:
+            assert abs(g - 0.375) < 1e-6
+    assert lr0 == lr1 == 0.1